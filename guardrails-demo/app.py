@@ -1,33 +1,49 @@
 # app.py
-from guardrails import Guard
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
 
 from predict import (
-    load_symptom_data,
+    extract_symptom_mentions,
     extract_symptoms_from_text,
     predict_disease_percent
 )
+from knowledge_base import KnowledgeBase, pinned
 from health_prompt_template import get_health_prompt_template
+from lazy_resources import lazy
+from local_validation import guarded_llm_call
+from llm_client import DEFAULT_MODEL, LLMClient
+from symptom_session import clear_session_symptoms, split_negated, update_session_symptoms
 
 # โหลด .env
 load_dotenv()
 
-TYPHOON_API_KEY = os.getenv("TYPHOON_API_KEY")
-TYPHOON_API_URL = "https://api.opentyphoon.ai/v1"
+# ไคลเอนต์ LLM ตัวกลาง (pool / timeout / retry / rate limit ตั้งค่าด้วย TYPHOON_* ดู llm_client.py)
+get_llm_client = lazy("llm_client", LLMClient.from_env)
 
-client = OpenAI(
-    api_key=TYPHOON_API_KEY,
-    base_url=TYPHOON_API_URL
-)
+GUARD_RAIL = "guardrails_spec.rail"
+LLM_PARAMS = {"model": os.getenv("TYPHOON_MODEL", DEFAULT_MODEL), "temperature": 0.3, "max_new_tokens": 512}
+
+def _load_guard():
+    from guardrails import Guard
+    return Guard.from_rail(GUARD_RAIL)
 
 SYMPTOM_CSV = "./data/full_onehot_disease.csv"
-df, known_symptoms, disease_col = load_symptom_data(SYMPTOM_CSV)
+SYMPTOMS_JSON = "./symptoms_data.json"
+# ฐานความรู้แบบมีเวอร์ชัน (ตารางอาการ mmap) โหลดตอนใช้ครั้งแรก แก้ไฟล์แล้วสลับชุดใหม่ให้เองโดยไม่ต้องรีสตาร์ต
+get_knowledge_base = lazy("knowledge_base", lambda: KnowledgeBase(SYMPTOM_CSV, SYMPTOMS_JSON).start_watcher())
+
+def get_symptom_table():
+    snapshot = get_knowledge_base().current()
+    return snapshot.symptom_table, snapshot.known_symptoms, snapshot.disease_col
 
-guard = Guard.from_rail("guardrails_spec.rail")
+get_guard = lazy("guard", _load_guard)
+
+@pinned(get_knowledge_base)
+def ask_bot(user_message, n_results=1, greeted=False, llm_api=None, state=None, reset=False):
+    # state: dict ของ session ถ้าส่งมา อาการจะสะสมข้ามเทิร์น (ดู symptom_session.py) reset=True เริ่มนับอาการใหม่
+    if reset:
+        clear_session_symptoms(state)
 
-def ask_bot(user_message, n_results=1, greeted=False):
     # ทักทายครั้งแรก
     greet_words = {"สวัสดี", "hello", "hi", "ดีครับ", "ดีค่ะ"}
     msg_lower = user_message.lower().strip()
@@ -44,14 +60,25 @@ def ask_bot(user_message, n_results=1, greeted=False):
             "หากมีอาการผิดปกติควรปรึกษาเภสัชกรหรือแพทย์โดยตรงนะคะ"
         )
 
-    matched_symptoms = extract_symptoms_from_text(user_message, known_symptoms)
+    symptom_table, known_symptoms, disease_col = get_symptom_table()
+    accumulator = None
+    if state is None:
+        matched_symptoms = extract_symptoms_from_text(user_message, known_symptoms)
+    else:
+        present, negated = split_negated(user_message, extract_symptom_mentions(user_message, known_symptoms))
+        accumulator = update_session_symptoms(state, symptom_table, get_knowledge_base().current().version,
+                                              present, negated)
+        matched_symptoms = list(accumulator.symptoms)
     if not matched_symptoms:
         return (
             "ขออภัยค่ะ ดิฉันไม่เข้าใจอาการที่ระบุ กรุณาพิมพ์อาการให้ชัดเจน เช่น ปวดหัว มีไข้ ไอ หรืออื่นๆ "
             "ถ้าอาการไม่ดีขึ้น ควรไปพบแพทย์นะคะ"
         )
 
-    results = predict_disease_percent(matched_symptoms, df, disease_col)
+    if accumulator is not None:
+        results = accumulator.rank()
+    else:
+        results = predict_disease_percent(matched_symptoms, symptom_table, disease_col)
     n_show = 1 if n_results < 1 else n_results
     results = results[:n_show]
 
@@ -65,53 +92,37 @@ def ask_bot(user_message, n_results=1, greeted=False):
         disease_ranking=disease_rank_str
     )
 
-    response = guard(
-        prompt=prompt,
-        llm_api=typhoon_wrapper,
-        llm_params={"model": "typhoon-v2.1-12b-instruct", "temperature": 0.3, "max_new_tokens": 512}
-    )
-    if response.validated_output and isinstance(response.validated_output, dict):
-        answer = response.validated_output.get("answer")
-        if answer:
-            # ตัดสวัสดีที่ AI ตอบมาเอง (ตัดประโยคต้นทางถ้ามี "สวัสดี" หรือ "สวัสดีค่ะ" หรือ "สวัสดีครับ")
-            lines = answer.strip().split("\n")
-            if lines and ("สวัสดี" in lines[0]):
-                return "\n".join(lines[1:]).strip()
-            return answer.strip()
-    if hasattr(response, "error") and response.error:
-        return f"[ERROR] {response.error}"
-    if hasattr(response, "raw_llm_output"):
-        print("LLM raw output:", response.raw_llm_output)
+    # ตรวจ/ซ่อมผลในโปรเซสก่อน ส่งต่อ Guard (reask) เฉพาะที่ซ่อมไม่ได้
+    output = guarded_llm_call(GUARD_RAIL, get_guard, prompt, llm_api or typhoon_wrapper, LLM_PARAMS)
+    answer = output.get("answer") if isinstance(output, dict) else None
+    if answer:
+        # ตัดสวัสดีที่ AI ตอบมาเอง (ตัดประโยคต้นทางถ้ามี "สวัสดี" หรือ "สวัสดีค่ะ" หรือ "สวัสดีครับ")
+        lines = answer.strip().split("\n")
+        if lines and ("สวัสดี" in lines[0]):
+            return "\n".join(lines[1:]).strip()
+        return answer.strip()
     return (
         "ขออภัยค่ะ ดิฉันไม่สามารถตอบคำถามนี้ได้ หากคุณมีอาการผิดปกติควรปรึกษาแพทย์นะคะ"
     )
 
 def typhoon_wrapper(prompt, **kwargs):
-    model = kwargs.get("model", "typhoon-v2.1-12b-instruct")
-    temperature = kwargs.get("temperature", 0.3)
-    max_tokens = kwargs.get("max_new_tokens", 512)
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content":
-                "คุณเป็นผู้ช่วย AI สุขภาพเบื้องต้น พูดจาอ่อนโยน ให้ข้อมูลเหมือนผู้หญิงไทย สุภาพ เป็นมิตร ไม่พูด 'สวัสดี' ทุกครั้ง (พูดแค่ทักทายครั้งแรกเท่านั้น) และห้ามวินิจฉัยหรือสั่งยา ต้องแนะนำให้พบแพทย์เสมอ"},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=max_tokens,
-        temperature=temperature
-    )
-    return response.choices[0].message.content
+    return get_llm_client().complete(prompt, **kwargs)
 
 if __name__ == "__main__":
-    print("=== AI Health Symptom Advisor (พิมพ์ exit เพื่อออก) ===")
+    print("=== AI Health Symptom Advisor (พิมพ์ exit เพื่อออก, reset เพื่อเริ่มเล่าอาการใหม่) ===")
     greeted = False
+    state = {}
     while True:
         user_input = input("You: ")
         if user_input.strip().lower() in {"exit", "quit"}:
             break
+        if user_input.strip().lower() == "reset":
+            clear_session_symptoms(state)
+            print("Bot: ล้างอาการที่บันทึกไว้แล้วค่ะ")
+            continue
         if not greeted and user_input.strip():
-            bot_reply = ask_bot(user_input, n_results=1, greeted=False)
+            bot_reply = ask_bot(user_input, n_results=1, greeted=False, state=state)
             greeted = True
         else:
-            bot_reply = ask_bot(user_input, n_results=1, greeted=True)
+            bot_reply = ask_bot(user_input, n_results=1, greeted=True, state=state)
         print("Bot:", bot_reply)
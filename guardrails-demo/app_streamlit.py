@@ -1,229 +1,27 @@
+import uuid
+
 import streamlit as st
-from guardrails import Guard
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
-import random
-import json
-from predict import (
-    load_symptom_data,
-    extract_symptoms_from_text,
-    predict_disease_percent
-)
-from health_prompt_template import (
-    get_ai1_consistency_template,
-    get_ai2_summary_template,
-    get_ai3_doctor_reply_template,
-    get_skin_image_summary_template,
+from chatbot import (
+    ask_bot_streamlit_stream,
+    ai_chain_skin_doctor_reply_stream,
+    format_ai3_bullet_stream,
+    typhoon_wrapper_stream,
+    start_warm_up,
 )
 from skin_model_predict import predict_skin_disease
+from skin_cache import get_skin_result_cache
+from skin_inference_service import get_skin_inference_service
+from session_store import get_session_store
+from symptom_session import clear_session_symptoms, session_symptoms
 import warnings
 from PIL import Image
 
 warnings.filterwarnings("ignore", category=UserWarning)
+# ทรัพยากรหนักโหลดเมื่อใช้ครั้งแรก ถ้าตั้ง WARM_UP จะเริ่มโหลดครั้งเดียวต่อ process
+start_warm_up()
 
-# โหลด .env
-load_dotenv()
-
-TYPHOON_API_KEY = os.getenv("TYPHOON_API_KEY")
-TYPHOON_API_URL = "https://api.opentyphoon.ai/v1"
-
-client = OpenAI(
-    api_key=TYPHOON_API_KEY,
-    base_url=TYPHOON_API_URL
-)
-
-SYMPTOM_CSV = "./data/full_onehot_disease.csv"
-df, known_symptoms, disease_col = load_symptom_data(SYMPTOM_CSV)
-known_diseases = list(df[disease_col].unique())  # สำหรับตรวจชื่อโรค
-
-# ===== Guardrails หลายไฟล์ สำหรับแต่ละ AI
-guard_ai1 = Guard.from_rail("guardrails_spec_ai1.rail")
-guard_ai2 = Guard.from_rail("guardrails_spec_ai2.rail")
-guard = Guard.from_rail("guardrails_spec.rail")
-
-# =========================
-# กลุ่มคำสนทนาทั่วไป
-# =========================
-THANK_WORDS = {"ขอบคุณ", "ขอบคุณค่ะ", "ขอบคุณครับ", "thank you", "ขอบใจ", "ซาบซึ้ง"}
-THANK_REPLIES = [
-    "ยินดีค่ะ 😊 หากมีอะไรให้ช่วยเหลือเพิ่มเติม แจ้งได้เลยนะคะ",
-    "ด้วยความยินดีนะคะ ดูแลสุขภาพด้วยค่ะ",
-    "ขอบคุณเช่นกันค่ะ หากมีคำถามเกี่ยวกับสุขภาพหรืออยากพูดคุยเพิ่มเติม สามารถทักมาได้ตลอดนะคะ",
-    "ขอบคุณที่พูดคุยกับดิฉันค่ะ ขอให้สุขภาพแข็งแรงนะคะ"
-]
-
-GENERAL_GREET_WORDS = {"สวัสดี", "hello", "hi", "ดีครับ", "ดีค่ะ"}
-GENERAL_GREET_REPLIES = [
-    "สวัสดีค่ะ ดิฉันเป็นผู้ช่วย AI ด้านสุขภาพเบื้องต้นของคุณ พร้อมให้คำแนะนำและดูแลสุขภาพคุณเสมอนะคะ หากมีอาการไม่สบายหรืออยากปรึกษาเรื่องสุขภาพ พิมพ์เข้ามาได้เลยค่ะ 💖",
-    "สวัสดีค่ะ ดิฉันคือ AI ผู้ช่วยดูแลสุขภาพเบื้องต้นค่ะ หากต้องการข้อมูลเกี่ยวกับสุขภาพหรือมีอาการที่อยากสอบถาม สามารถพูดคุยกับดิฉันได้ตลอดเวลานะคะ 😊",
-    "สวัสดีค่ะ ดิฉันเป็น AI ผู้ช่วยสุขภาพของคุณ พร้อมรับฟังและให้คำแนะนำสุขภาพเบื้องต้น หากมีข้อสงสัยหรืออยากพูดคุย สามารถสอบถามได้เลยค่ะ 💬",
-    "สวัสดีค่ะ ดิฉันเป็น AI ผู้ช่วยด้านสุขภาพ หากต้องการคำแนะนำหรือมีอาการที่ต้องการพูดคุย สามารถพิมพ์มาถามดิฉันได้เสมอค่ะ ดูแลสุขภาพด้วยนะคะ"
-]
-
-HOW_ARE_YOU_WORDS = {"สบายดีไหม", "how are you", "เป็นยังไงบ้าง"}
-HOW_ARE_YOU_REPLIES = [
-    "ขอบคุณที่ถามค่ะ ดิฉันเป็น AI ที่พร้อมช่วยเหลือเรื่องสุขภาพเสมอนะคะ 😊",
-    "ดิฉันสบายดีค่ะ และพร้อมดูแลสุขภาพของคุณเสมอค่ะ",
-    "ขอบคุณที่ทักมาถามนะคะ มีอะไรอยากปรึกษาเกี่ยวกับสุขภาพไหมคะ"
-]
-
-def load_json_file(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def convert_json_to_str(json_data):
-    # ใช้ json.dumps() เพื่อแปลงข้อมูลทุกอย่างใน JSON เป็น string
-    return json.dumps(json_data, ensure_ascii=False)
-
-def format_ai3_bullet(text):
-    lines = text.split('\n')
-    new_lines = []
-    for i, line in enumerate(lines):
-        if line.strip().startswith('•'):
-            if i > 0 and lines[i-1].strip() != '':
-                new_lines.append('')  # เพิ่มบรรทัดว่างระหว่าง bullet
-        new_lines.append(line)
-    return '\n'.join(new_lines)
-
-# =========================
-def typhoon_wrapper(prompt, **kwargs):
-    model = kwargs.get("model", "typhoon-v2.1-12b-instruct")
-    temperature = kwargs.get("temperature", 0.3)
-    max_tokens = kwargs.get("max_new_tokens", 512)
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "system", "content": "คุณเป็นผู้ช่วย AI สุขภาพเบื้องต้น พูดจาอ่อนโยน ให้ข้อมูลเหมือนผู้หญิงไทย สุภาพ เป็นมิตร ไม่พูด 'สวัสดี' ทุกครั้ง (พูดแค่ทักทายครั้งแรกเท่านั้น) และห้ามวินิจฉัยหรือสั่งยา ต้องแนะนำให้พบแพทย์เสมอ"},
-                  {"role": "user", "content": prompt}],
-        max_tokens=max_tokens,
-        temperature=temperature
-    )
-    return response.choices[0].message.content
-
-# ================= AI 3 CHAIN =================
-def ai_chain_consistency(user_symptoms, predicted_diseases, llm_api, json_file):
-    json_data = json_file
-    disease_info = json_data
-    predicted_diseases_str = "\n".join([f"{i+1}. {d} {p}% (จาก {m} อาการ)" for i, (d, p, m) in enumerate(predicted_diseases)])
-    prompt_template = get_ai1_consistency_template()
-    prompt = prompt_template.format(
-        user_symptoms=", ".join(user_symptoms),
-        predicted_diseases=predicted_diseases_str,
-        json_data=disease_info
-    )
-    response = guard_ai1(
-        prompt=prompt,
-        llm_api=llm_api,
-        llm_params={"model": "typhoon-v2.1-12b-instruct", "temperature": 0.2, "max_new_tokens": 256}
-    )
-    return response.validated_output if response.validated_output else {}
-
-def ai_chain_summary(user_symptoms, predicted_diseases, ai1_comment, llm_api):
-    prompt_template = get_ai2_summary_template()
-    prompt = prompt_template.format(
-        user_symptoms=", ".join(user_symptoms),
-        predicted_diseases="\n".join([f"{i+1}. {d} {p}% (จาก {m} อาการ)" for i, (d, p, m) in enumerate(predicted_diseases)]),
-        ai1_comment=ai1_comment or "-"
-    )
-    response = guard_ai2(
-        prompt=prompt,
-        llm_api=llm_api,
-        llm_params={"model": "typhoon-v2.1-12b-instruct", "temperature": 0.2, "max_new_tokens": 512}
-    )
-    return response.validated_output if response.validated_output else {}
-
-def ai_chain_doctor_reply(ai2_summary, ai2_recommendation, llm_api):
-    prompt_template = get_ai3_doctor_reply_template()
-    prompt = prompt_template.format(
-        ai2_summary=ai2_summary or "-",
-        ai2_recommendation=ai2_recommendation or "-"
-    )
-    response = llm_api(prompt, model="typhoon-v2.1-12b-instruct", temperature=0.2, max_new_tokens=512)
-    return response
-
-# ================= NEW: AI CHAIN FOR SKIN DISEASE =================
-def ai_chain_skin_summary(image_class, confidence, llm_api):
-    """สร้างสรุปและคำแนะนำเบื้องต้นสำหรับการวิเคราะห์ภาพผิวหนัง"""
-    if image_class == "Abnormal(Ulcer)":
-        ai2_summary = f"จากการวิเคราะห์ภาพ พบลักษณะผิดปกติที่อาจเป็นแผลหรือรอยโรคผิวหนัง (ความมั่นใจ {confidence:.1%})"
-        ai2_recommendation = "ควรปรึกษาแพทย์ผิวหนังเพื่อรับการตรวจและรักษาที่เหมาะสม"
-    else:  # Normal(Healthy skin)
-        ai2_summary = f"จากการวิเคราะห์ภาพ ผิวหนังดูปกติ (ความมั่นใจ {confidence:.1%})"
-        ai2_recommendation = "ควรดูแลรักษาความสะอาดและความชุ่มชื้นของผิวหนังต่อไป"
-    
-    return ai2_summary, ai2_recommendation
-
-def ai_chain_skin_doctor_reply(image_class, confidence, llm_api):
-    """สร้างคำตอบจากหมอสำหรับการวิเคราะห์ภาพผิวหนัง"""
-    ai2_summary, ai2_recommendation = ai_chain_skin_summary(image_class, confidence, llm_api)
-    
-    prompt_template = get_skin_image_summary_template()
-    prompt = prompt_template.format(
-        image_class=f"{image_class} (ความมั่นใจ {confidence:.1%})",
-        ai2_summary=ai2_summary,
-        ai2_recommendation=ai2_recommendation
-    )
-    
-    response = llm_api(prompt, model="typhoon-v2.1-12b-instruct", temperature=0.2, max_new_tokens=512)
-    return response
-
-# =========================
-# ฟังก์ชันการถามบอท
-def ask_bot_streamlit(user_message, n_results=1, greeted=False):
-    msg_lower = user_message.lower().strip()
-
-    if any(word in msg_lower for word in THANK_WORDS):
-        return random.choice(THANK_REPLIES)
-
-    if any(word in msg_lower for word in HOW_ARE_YOU_WORDS):
-        return random.choice(HOW_ARE_YOU_REPLIES)
-
-    for disease in known_diseases:
-        if disease in user_message or disease in msg_lower:
-            prompt = f"ผู้ใช้แจ้งว่าตนเองอาจเป็น '{disease}'. กรุณาให้คำแนะนำเบื้องต้นเกี่ยวกับโรคนี้ (โดยไม่วินิจฉัย ไม่สั่งยา) และเน้นให้พบแพทย์หากไม่แน่ใจอาการ"
-            response = guard(
-                prompt=prompt,
-                llm_api=typhoon_wrapper,
-                llm_params={"model": "typhoon-v2.1-12b-instruct", "temperature": 0.3, "max_new_tokens": 512}
-            )
-            if response.validated_output and isinstance(response.validated_output, dict):
-                answer = response.validated_output.get("answer")
-                if answer:
-                    return answer.strip()
-            return "ขออภัยค่ะ ดิฉันไม่สามารถให้ข้อมูลได้ในขณะนี้ หากมีอาการผิดปกติควรปรึกษาแพทย์นะคะ"
-
-    if not greeted and any(word in msg_lower for word in GENERAL_GREET_WORDS):
-        return random.choice(GENERAL_GREET_REPLIES)
-
-    if "ยา" in msg_lower or "แนะนำยา" in msg_lower:
-        return "ขออภัยค่ะ ดิฉันไม่สามารถแนะนำหรือสั่งยาได้ หากมีอาการผิดปกติควรปรึกษาเภสัชกรหรือแพทย์โดยตรงนะคะ"
-
-    matched_symptoms = extract_symptoms_from_text(user_message, known_symptoms)
-    if not matched_symptoms:
-        return "ขออภัยค่ะ ดิฉันไม่เข้าใจอาการที่ระบุ กรุณาพิมพ์อาการให้ชัดเจน เช่น ปวดหัว มีไข้ ไอ หรืออื่นๆ"
-
-    results = predict_disease_percent(matched_symptoms, df, disease_col)
-    n_show = 3 if n_results < 1 else n_results
-    results = results[:n_show]
-
-    json_file_path = './symptoms_data.json'
-    json_data = load_json_file(json_file_path)
-    json_data_str = convert_json_to_str(json_data)
-    ai1_res = ai_chain_consistency(matched_symptoms, results, typhoon_wrapper, json_data_str)
-    ai1_comment = ai1_res.get('comment', '')
-
-    ai2_res = ai_chain_summary(matched_symptoms, results, ai1_comment, typhoon_wrapper)
-    ai2_summary = ai2_res.get('summary', '')
-    ai2_recommendation = ai2_res.get('recommendation', '')
-
-    ai3_reply = ai_chain_doctor_reply(ai2_summary, ai2_recommendation, typhoon_wrapper)
-    ai3_reply = format_ai3_bullet(ai3_reply)
-
-    st.session_state.ai1_res = ai1_res
-    st.session_state.ai2_res = ai2_res
-    st.session_state.ai3_reply = ai3_reply
-
-    return ai3_reply.strip()
+# แสดงประวัติทีละหน้า ต้นทุนการวาดต่อ rerun จึงคงที่ไม่โตตามความยาวแชต
+HISTORY_PAGE_SIZE = 20
 
 # ------------------- Streamlit UI -------------------
 
@@ -272,24 +70,31 @@ st.markdown(
     "**หมายเหตุ:** ข้อมูลนี้เป็นเพียงคำแนะนำเบื้องต้น หากอาการไม่ดีขึ้นควรปรึกษาแพทย์"
 )
 
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-if "greeted" not in st.session_state:
-    st.session_state.greeted = False
-if "pending_ai" not in st.session_state:
-    st.session_state.pending_ai = False
-
-# **เพิ่มตัวแปรเก็บผลวิเคราะห์ภาพ**
-if "ai3_skin_reply" not in st.session_state:
-    st.session_state.ai3_skin_reply = ""
-if "skin_analysis_result" not in st.session_state:
-    st.session_state.skin_analysis_result = None
+# ประวัติแชต greeted ผลลัพธ์ AI1/AI2/AI3 และผลวิเคราะห์ภาพ อยู่ใน session store (SESSION_STORE_DB = SQLite
+# อยู่รอดข้ามการรีสตาร์ต / ใช้ร่วมกันหลาย worker) session id อยู่ใน URL (?sid=...) เปิดลิงก์เดิมได้บทสนทนาเดิม
+# st.session_state เก็บเฉพาะสถานะของหน้าจอ
+store = get_session_store()
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.session_id
+session_id = st.session_state.session_id
+if "pending_message" not in st.session_state:
+    st.session_state.pending_message = None
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
+
+chat_state = store.load_state(session_id)
 
 # ----------------- Messenger Bubble Layout ----------------
 st.markdown('<div class="messenger-bg">', unsafe_allow_html=True)
 st.markdown('<div class="messenger-container">', unsafe_allow_html=True)
 
-for msg in st.session_state.messages:
+messages, has_more = store.messages(session_id, limit=HISTORY_PAGE_SIZE * st.session_state.history_pages)
+if has_more and st.button("⬆️ แสดงข้อความก่อนหน้า"):
+    st.session_state.history_pages += 1
+    st.rerun()
+
+for msg in messages:
     if msg["role"] == "user":
         st.markdown(
             f'<div class="messenger-bubble-row" style="justify-content:flex-end;">'
@@ -301,8 +106,10 @@ for msg in st.session_state.messages:
             f'  <div class="messenger-bubble messenger-bubble-ai">{msg["content"]}</div>'
             f'</div>', unsafe_allow_html=True)
 
-if st.session_state.pending_ai:
-    st.markdown(
+# ช่องคำตอบของ AI: แสดง "กำลังพิมพ์..." จนกว่า token แรกของคำตอบจะมาถึง แล้วสตรีมคำตอบลงที่เดิม
+typing_placeholder = st.empty()
+if st.session_state.pending_message:
+    typing_placeholder.markdown(
         '<div class="messenger-bubble-row" style="justify-content:flex-start;">'
         '<div class="messenger-bubble messenger-bubble-ai">กำลังพิมพ์...</div>'
         '</div>', unsafe_allow_html=True
@@ -318,25 +125,40 @@ st.sidebar.markdown("อัปโหลดภาพผิวหนังเพ
 uploaded_file = st.sidebar.file_uploader("เลือกรูปภาพผิวหนัง", type=["png", "jpg", "jpeg"])
 
 if uploaded_file is not None:
-    image = Image.open(uploaded_file).convert("RGB")
-    st.sidebar.image(image, caption="ภาพที่อัปโหลด", use_container_width=True)
+    # เปิดแบบ lazy (อ่านแค่ header) ให้ตัววิเคราะห์ถอดรหัส JPEG แบบย่อขนาดได้ ส่วนภาพตัวอย่างส่ง bytes เดิมไปแสดง
+    image = Image.open(uploaded_file)
+    st.sidebar.image(uploaded_file.getvalue(), caption="ภาพที่อัปโหลด", use_container_width=True)
 
     if st.sidebar.button("🔍 วิเคราะห์ภาพ", type="primary"):
         with st.spinner("กำลังวิเคราะห์ภาพ..."):
             try:
-                predicted_class, confidence = predict_skin_disease(image)
-                
-                # สร้างคำตอบจาก AI Doctor
-                skin_ai3_reply = ai_chain_skin_doctor_reply(predicted_class, confidence, typhoon_wrapper)
-                skin_ai3_reply = format_ai3_bullet(skin_ai3_reply)
+                # ภาพเดิม (หรือภาพเดียวกันที่บีบอัด/ย่อขนาดใหม่) ใช้ผลและคำแนะนำที่เคยวิเคราะห์ไว้ ดู skin_cache.py
+                skin_cache = get_skin_result_cache()
+                cached, fingerprint = skin_cache.lookup(uploaded_file.getvalue())
+                if cached is not None:
+                    predicted_class, confidence = cached["predicted_class"], cached["confidence"]
+                else:
+                    predicted_class, confidence = predict_skin_disease(image)
+                    skin_cache.store(fingerprint, predicted_class, confidence)
+
+                skin_ai3_reply = cached["reply"] if cached is not None else None
+                if not skin_ai3_reply:
+                    # สร้างคำตอบจาก AI Doctor (สตรีมให้เห็นทีละส่วน แล้วค่อยแสดงฉบับเต็มด้านล่าง)
+                    reply_placeholder = st.sidebar.empty()
+                    skin_ai3_reply = reply_placeholder.write_stream(format_ai3_bullet_stream(
+                        ai_chain_skin_doctor_reply_stream(predicted_class, confidence, typhoon_wrapper_stream)
+                    ))
+                    reply_placeholder.empty()
+                    skin_cache.set_reply(fingerprint, skin_ai3_reply)
                 
-                # เก็บผลลัพธ์ใน session state
-                st.session_state.ai3_skin_reply = skin_ai3_reply
-                st.session_state.skin_analysis_result = {
+                # เก็บผลลัพธ์ใน session store
+                chat_state["ai3_skin_reply"] = skin_ai3_reply
+                chat_state["skin_analysis_result"] = {
                     "predicted_class": predicted_class,
-                    "confidence": confidence,
+                    "confidence": float(confidence),
                     "reply": skin_ai3_reply
                 }
+                store.save_state(session_id, chat_state)
                 
                 st.sidebar.success("✅ วิเคราะห์เสร็จแล้ว!")
                 
@@ -344,9 +166,9 @@ if uploaded_file is not None:
                 st.sidebar.error(f"❌ เกิดข้อผิดพลาด: {str(e)}")
 
 # แสดงผลการวิเคราะห์ภาพ
-if st.session_state.skin_analysis_result:
+if chat_state.get("skin_analysis_result"):
     st.sidebar.markdown("### 📋 ผลการวิเคราะห์")
-    result = st.session_state.skin_analysis_result
+    result = chat_state["skin_analysis_result"]
     
     # แสดงผลการจำแนกประเภท
     if result["predicted_class"] == "Abnormal(Ulcer)":
@@ -360,38 +182,62 @@ if st.session_state.skin_analysis_result:
     st.sidebar.markdown("### 💬 คำแนะนำจากแพทย์ AI")
     st.sidebar.markdown(result["reply"])
 
+# อาการที่สะสมจากทุกข้อความใน session นี้ (ใช้จัดอันดับโรครวมกัน)
+tracked_symptoms = session_symptoms(chat_state)
+if tracked_symptoms:
+    st.sidebar.markdown("### 🩺 อาการที่บันทึกไว้")
+    st.sidebar.write(", ".join(tracked_symptoms))
+    if st.sidebar.button("🔄 เริ่มเล่าอาการใหม่"):
+        clear_session_symptoms(chat_state)
+        store.save_state(session_id, chat_state)
+        st.rerun()
+
 # แชทปกติ
 user_input = st.chat_input("พิมพ์ข้อความของคุณที่นี่")
 
 if user_input:
-    st.session_state.messages.append({"role": "user", "content": user_input})
-    st.session_state.pending_ai = True
+    store.append_message(session_id, "user", user_input)
+    st.session_state.pending_message = user_input
+    st.session_state.history_pages = 1
     st.rerun()
 
-if st.session_state.pending_ai:
-    user_message = [msg["content"] for msg in st.session_state.messages if msg["role"] == "user"][-1]
-    bot_reply = ask_bot_streamlit(user_message, n_results=1, greeted=st.session_state.greeted)
-    st.session_state.messages.append({"role": "ai", "content": bot_reply})
-
-    if not st.session_state.greeted:
-        st.session_state.greeted = True
-    st.session_state.pending_ai = False
+if st.session_state.pending_message:
+    bot_reply = typing_placeholder.write_stream(
+        ask_bot_streamlit_stream(st.session_state.pending_message, n_results=1, greeted=chat_state["greeted"],
+                                 state=chat_state)
+    )
+    chat_state["greeted"] = True
+    store.save_state(session_id, chat_state)
+    store.append_message(session_id, "ai", bot_reply)
+    st.session_state.pending_message = None
     st.rerun()
 
 # --- DEBUG --- (แสดงผลใน sidebar แยกจากวิเคราะห์ผิวหนัง)
 with st.sidebar.expander("🛠️ DEBUG - รายละเอียดการประมวลผล", expanded=False):
-    if "ai1_res" in st.session_state:
+    if "ai1_res" in chat_state:
         st.markdown("🟦 **AI1 (Consistency Check)**")
-        st.json(st.session_state.ai1_res)
+        st.json(chat_state["ai1_res"])
     
-    if "ai2_res" in st.session_state:
+    if "ai2_res" in chat_state:
         st.markdown("🟩 **AI2 (Summary & Recommend)**")
-        st.json(st.session_state.ai2_res)
+        st.json(chat_state["ai2_res"])
     
-    if "ai3_reply" in st.session_state:
+    if "ai3_reply" in chat_state:
         st.markdown("🟧 **AI3 (Doctor Reply - Text)**")
-        st.write(st.session_state.ai3_reply)
+        st.write(chat_state["ai3_reply"])
 
-    if "ai3_skin_reply" in st.session_state and st.session_state.ai3_skin_reply:
+    if chat_state.get("timings"):
+        st.markdown("⏱️ **เวลาแต่ละขั้น (วินาที)**")
+        st.json(chat_state["timings"])
+
+    if chat_state.get("trace"):
+        st.markdown("🧭 **Trace ของข้อความล่าสุด (span ต่อขั้น, token, แคช)**")
+        st.json(chat_state["trace"])
+
+    if chat_state.get("ai3_skin_reply"):
         st.markdown("🟪 **AI3 (Doctor Reply - Skin Image Analysis)**")
-        st.write(st.session_state.ai3_skin_reply)
\ No newline at end of file
+        st.write(chat_state["ai3_skin_reply"])
+
+    if chat_state.get("skin_analysis_result"):
+        st.markdown("🖼️ **Skin inference (batch / queue wait)**")
+        st.json({**get_skin_inference_service().metrics(), "cache": get_skin_result_cache().stats()})
\ No newline at end of file
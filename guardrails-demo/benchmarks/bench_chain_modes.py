@@ -0,0 +1,92 @@
+"""
+เทียบ latency ของโหมด AI1/AI2 chain (sequential / speculative / fast) ด้วย LLM จำลองที่หน่วงเวลา
+ไม่เรียก Typhoon จริง ใช้คำตอบชุดเดียวกับ fake_typhoon_server.py
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_chain_modes.py [--latency-ms 300] [--requests 20] [--inconsistent-rate 0.2] [--cache]
+
+ค่าเริ่มต้นปิด response cache เพื่อวัด latency ของการเรียก LLM จริงทุกครั้ง ใส่ --cache เพื่อดูผลเมื่อเปิดแคช
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+os.environ.setdefault("TYPHOON_API_KEY", "fake")
+if "--cache" not in sys.argv:
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+os.chdir(os.path.join(HERE, ".."))
+
+import chatbot  # noqa: E402
+from fake_typhoon_server import AI1_REPLY, fake_content  # noqa: E402
+
+MESSAGE = "ไข้ ไอ เจ็บคอ น้ำมูกไหล"
+
+
+def make_llm_api(latency, inconsistent_rate, rng):
+    def llm_api(prompt, **kwargs):
+        time.sleep(latency)
+        content = fake_content(prompt)
+        if "'consistency'" in prompt and rng.random() < inconsistent_rate:
+            data = json.loads(content)
+            data.update(consistency="no", comment="อาการที่แจ้งไม่ตรงกับโรคที่ระบบวิเคราะห์")
+            content = json.dumps(data, ensure_ascii=False)
+        return content
+    return llm_api
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_mode(mode, args):
+    llm_api = make_llm_api(args.latency_ms / 1000.0, args.inconsistent_rate, random.Random(args.seed))
+    samples = {}
+    misses = 0
+    for _ in range(args.requests):
+        state = {}
+        chatbot.ask_bot_streamlit(MESSAGE, greeted=True, state=state, llm_api=llm_api, mode=mode)
+        timings = state["timings"]
+        misses += timings.get("speculation") == "miss"
+        for key, value in timings.items():
+            if isinstance(value, float):
+                samples.setdefault(key, []).append(value)
+    print(f"\n[{mode}] {args.requests} requests" + (f", speculation miss {misses}" if mode == "speculative" else ""))
+    for key, values in samples.items():
+        print(f"  {key:12s} mean {statistics.mean(values) * 1000:8.1f} ms  "
+              f"p50 {percentile(values, 0.5) * 1000:8.1f} ms  p95 {percentile(values, 0.95) * 1000:8.1f} ms")
+    return statistics.mean(samples["total"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--inconsistent-rate", type=float, default=0.2,
+                        help="สัดส่วนที่ AI1 ตอบ consistency='no' (speculation miss)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="เปิด response cache (ดู hit rate ท้ายผล)")
+    args = parser.parse_args()
+    assert AI1_REPLY["consistency"] == "yes"
+    # อุ่นเครื่อง guard ทุกตัวก่อน ไม่ให้เวลาโหลดครั้งแรกปนในผล
+    for mode in chatbot.CHAIN_MODES:
+        chatbot.ask_bot_streamlit(MESSAGE, greeted=True, state={}, llm_api=make_llm_api(0, 0, random.Random()), mode=mode)
+
+    totals = {mode: run_mode(mode, args) for mode in chatbot.CHAIN_MODES}
+    base = totals["sequential"]
+    print()
+    for mode, total in totals.items():
+        print(f"{mode:12s} total mean {total * 1000:8.1f} ms  ({base / total:.2f}x vs sequential)")
+    if args.cache:
+        print(f"\nresponse cache: {json.dumps(chatbot.response_cache.stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
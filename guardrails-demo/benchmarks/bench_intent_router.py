@@ -0,0 +1,98 @@
+"""
+ความเร็วการแยกประเภทข้อความ: วิธีเดิม (any(word in msg) ทีละหมวด + วนหาชื่อโรคทุกโรค)
+เทียบกับ IntentRouter (automaton ตัวเดียว สแกนรอบเดียว) และตรวจว่าผลตรงกันทุกข้อความ
+
+corpus = ประโยคอาการจาก symptoms_data.json + ข้อความสนทนาทั่วไป (ทักทาย ขอบคุณ ถามโรค ขอยา)
+หรือไฟล์ข้อความจริงหนึ่งข้อความต่อบรรทัดด้วย --messages
+--disease-scale เพิ่มจำนวนชื่อโรค (สำเนาตั้งชื่อใหม่) เพื่อดูว่าต้นทุนโตตามจำนวนโรคแค่ไหน
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_intent_router.py [--repeat 5] [--disease-scales 1,10,100]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chatbot import (  # noqa: E402
+    GENERAL_GREET_WORDS,
+    HOW_ARE_YOU_WORDS,
+    MEDICATION_WORDS,
+    THANK_WORDS,
+)
+from intent_router import DISEASE, GREETING, HOW_ARE_YOU, MEDICATION, SYMPTOMS, THANKS, IntentRouter  # noqa: E402
+from predict import load_symptom_data  # noqa: E402
+
+CHAT_MESSAGES = [
+    "สวัสดีค่ะ", "hello", "Hi there", "ดีครับ", "ขอบคุณมากค่ะ", "Thank you so much", "ขอบใจนะ",
+    "สบายดีไหมคะ", "How are you today?", "เป็นยังไงบ้าง", "แนะนำยาแก้ปวดหัวหน่อย", "กินยาอะไรดี",
+    "สวัสดีค่ะ ปวดหัวมีไข้มาสองวัน", "ไอ เจ็บคอ มีน้ำมูก", "ตัวร้อน ปวดเมื่อยตามตัว", "ท้องเสีย คลื่นไส้",
+]
+
+
+def legacy_route(user_message, diseases, greeted=False):
+    msg_lower = user_message.lower().strip()
+    if any(word in msg_lower for word in THANK_WORDS):
+        return THANKS, None
+    if any(word in msg_lower for word in HOW_ARE_YOU_WORDS):
+        return HOW_ARE_YOU, None
+    for disease in diseases:
+        if disease in user_message or disease in msg_lower:
+            return DISEASE, disease
+    if not greeted and any(word in msg_lower for word in GENERAL_GREET_WORDS):
+        return GREETING, None
+    if "ยา" in msg_lower or "แนะนำยา" in msg_lower:
+        return MEDICATION, None
+    return SYMPTOMS, None
+
+
+def load_corpus(json_path, messages_path, diseases):
+    if messages_path:
+        with open(messages_path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    corpus = [phrase for entry in data for phrase in entry.get("อาการโดยสังเขป", [])]
+    corpus += CHAT_MESSAGES
+    corpus += [f"{disease} คืออะไร" for disease in diseases[:20]]
+    return corpus
+
+
+def bench(fn, corpus, repeat):
+    best = float("inf")
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [fn(text) for text in corpus]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="./data/full_onehot_disease.csv")
+    parser.add_argument("--json", default="./symptoms_data.json")
+    parser.add_argument("--messages", help="ไฟล์ข้อความจริง หนึ่งข้อความต่อบรรทัด")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--disease-scales", default="1,10,100")
+    args = parser.parse_args()
+
+    df, _, disease_col = load_symptom_data(args.csv)
+    base_diseases = list(df[disease_col])
+    corpus = load_corpus(args.json, args.messages, base_diseases)
+    print(f"corpus {len(corpus)} ข้อความ, โรคตั้งต้น {len(base_diseases)} โรค")
+    print(f"{'diseases':>8} {'legacy(ms)':>11} {'router(ms)':>11} {'msgs/s':>10} {'speedup':>8} {'identical':>9}")
+    for scale in [int(s) for s in args.disease_scales.split(",")]:
+        diseases = base_diseases + [f"{d}-{i}" for i in range(1, scale) for d in base_diseases]
+        router = IntentRouter(THANK_WORDS, HOW_ARE_YOU_WORDS, GENERAL_GREET_WORDS, MEDICATION_WORDS, diseases)
+        legacy_time, legacy = bench(lambda t: legacy_route(t, diseases), corpus, args.repeat)
+        router_time, routed = bench(router.route, corpus, args.repeat)
+        print(f"{len(diseases):>8} {legacy_time * 1e3:>11.2f} {router_time * 1e3:>11.2f} "
+              f"{len(corpus) / router_time:>10.0f} {legacy_time / router_time:>7.1f}x {str(legacy == routed):>9}")
+
+
+if __name__ == "__main__":
+    main()
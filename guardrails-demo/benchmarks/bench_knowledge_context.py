@@ -0,0 +1,74 @@
+"""
+ขนาด prompt ของ AI1 และเวลาสร้างบริบท เมื่อฐานความรู้ symptoms_data.json โตขึ้น
+เทียบวิธีเดิม (dump ทั้งไฟล์ทุกข้อความ) กับ KnowledgeContext (เฉพาะโรคอันดับต้นๆ ภายในงบ token)
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_knowledge_context.py [--scales 1,10,100,1000] [--top-k 3] [--budget 600]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from knowledge_context import KnowledgeContext, estimate_tokens  # noqa: E402
+
+
+def scaled_entries(entries, scale):
+    """สร้างฐานความรู้ขนาด scale เท่า (โรคสำเนาตั้งชื่อใหม่ ตัวอย่างซ้ำบางส่วนเพื่อทดสอบการตัดซ้ำ)"""
+    out = list(entries)
+    for i in range(1, scale):
+        for entry in entries:
+            out.append({"โรค": f"{entry['โรค']}-{i}", "อาการโดยสังเขป": entry["อาการโดยสังเขป"] * 2})
+    return out
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default="./symptoms_data.json")
+    parser.add_argument("--scales", default="1,10,100,1000")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    top = [entry["โรค"] for entry in base[:args.top_k]]
+
+    print(f"{'diseases':>9} | {'legacy tokens':>13} {'legacy ms':>10} | {'context tokens':>14} {'context ms':>10}")
+    for scale in [int(s) for s in args.scales.split(",")]:
+        entries = scaled_entries(base, scale)
+        path = f"/tmp/bench_knowledge_{scale}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+        def legacy():
+            with open(path, "r", encoding="utf-8") as f:
+                return json.dumps(json.load(f), ensure_ascii=False)
+
+        knowledge = KnowledgeContext.from_json(path)
+
+        def context():
+            # ล้างแคชผลลัพธ์ เพื่อวัดเวลาสร้างบริบทจริง
+            knowledge._rendered.clear()
+            return knowledge.context_for(top, args.budget)
+
+        legacy_tokens = estimate_tokens(legacy())
+        context_tokens = estimate_tokens(context())
+        print(f"{len(knowledge.diseases):>9} | {legacy_tokens:>13} {per_call(legacy, args.repeat) * 1000:>10.3f} | "
+              f"{context_tokens:>14} {per_call(context, args.repeat) * 1000:>10.3f}")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
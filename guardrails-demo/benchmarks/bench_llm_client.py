@@ -0,0 +1,121 @@
+"""
+ทดสอบ LLMClient กับเซิร์ฟเวอร์จำลอง (fake_typhoon_server) ที่มี 429 และหางยาวตามที่กำหนด
+เทียบ AsyncOpenAI ค่าเริ่มต้น (แบบ typhoon_wrapper เดิม) กับ LLMClient ที่ตั้ง retry + jitter, hedging และ rate limit
+
+เซิร์ฟเวอร์จำลองรันใน thread เดียวกัน ไม่ต้องเปิดแยก:
+    python benchmarks/bench_llm_client.py [--requests 400] [--concurrency 50] [--error-rate 0.1]
+                                          [--slow-rate 0.05] [--hedge-after 0.6] [--rate-limit 0]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import uvicorn  # noqa: E402
+
+import fake_typhoon_server  # noqa: E402
+from llm_client import LLMClient, LLMConfig  # noqa: E402
+
+PROMPT = "ไม่ต้องตอบเป็น JSON สรุปสถานการณ์: ปวดหัว มีไข้"
+
+
+def start_fake_server(latency_ms, error_rate, slow_rate, slow_ms):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    app = fake_typhoon_server.app
+    app.state.latency_ms = latency_ms
+    app.state.error_rate = error_rate
+    app.state.slow_rate = slow_rate
+    app.state.slow_ms = slow_ms
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}/v1"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+async def run(complete, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await complete(PROMPT)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(name, latencies, errors, elapsed, requests, server_requests):
+    ok = len(latencies)
+    print(f"{name:>10} ok {ok:>4}/{requests} err {errors:>3}  "
+          f"p50 {percentile(latencies, 0.5) * 1e3:7.0f} ms  p95 {percentile(latencies, 0.95) * 1e3:7.0f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1e3:7.0f} ms  mean {statistics.fmean(latencies) * 1e3 if ok else 0:7.0f} ms  "
+          f"{ok / elapsed:6.1f} rps  upstream {server_requests} req")
+
+
+async def main_async(args, base_url):
+    from openai import AsyncOpenAI
+
+    # แบบเดิม: AsyncOpenAI ค่าเริ่มต้น (retry ของไลบรารี 2 ครั้ง ไม่มี jitter cap / hedging / rate limit)
+    plain = AsyncOpenAI(api_key="fake", base_url=base_url)
+
+    async def plain_complete(prompt):
+        response = await plain.chat.completions.create(
+            model="fake", messages=[{"role": "user", "content": prompt}], max_tokens=512, temperature=0.3)
+        return response.choices[0].message.content
+
+    tuned = LLMClient(LLMConfig(api_key="fake", base_url=base_url, max_retries=args.max_retries,
+                                backoff_base=args.backoff_base, hedge_after=args.hedge_after,
+                                rate_limit=args.rate_limit, max_concurrency=args.concurrency))
+
+    for name, complete in (("plain", plain_complete), ("LLMClient", tuned.complete_async)):
+        before = fake_typhoon_server.app.state.requests
+        latencies, errors, elapsed = await run(complete, args.requests, args.concurrency)
+        report(name, latencies, errors, elapsed, args.requests, fake_typhoon_server.app.state.requests - before)
+    print("LLMClient stats:", tuned.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--backoff-base", type=float, default=0.1)
+    parser.add_argument("--hedge-after", type=float, default=0.6)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.latency_ms, args.error_rate, args.slow_rate, args.slow_ms)
+    try:
+        asyncio.run(main_async(args, base_url))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
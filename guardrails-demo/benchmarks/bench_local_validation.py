@@ -0,0 +1,113 @@
+"""
+ตรวจผลลัพธ์ดิบของ LLM ด้วย LocalValidator เทียบกับ Guard.parse (ไม่มี llm_api จึงไม่ reask)
+แล้วรายงานต่อ 1,000 คำขอ: Guard ไม่ผ่านกี่ครั้ง (= reask ที่จะเกิด) ตรวจ/ซ่อมในโปรเซสผ่านกี่ครั้ง
+ยังต้องส่งต่อ Guard กี่ครั้ง ไม่ต้องเรียก Guard เลยกี่ครั้ง และเวลาตรวจต่อครั้ง
+
+corpus จำลองรูปแบบคำตอบที่พบจริงของ Typhoon (JSON ปกติ, dict แบบ Python ตามตัวอย่างใน prompt, ห่อ ```,
+มีข้อความนำ, comma เกิน, ขาดฟิลด์, มีคำต้องห้าม) สัดส่วนกำหนดด้วย --mix หรือใช้ไฟล์ผลดิบจริง
+(หนึ่งคำตอบ JSON string ต่อบรรทัด) ด้วย --raw
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_local_validation.py [--requests 1000] [--no-guard]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from local_validation import LocalValidator  # noqa: E402
+
+RAILS = {
+    "ai1": "guardrails_spec_ai1.rail",
+    "ai2": "guardrails_spec_ai2.rail",
+    "answer": "guardrails_spec.rail",
+}
+SAMPLES = {
+    "ai1": {"consistency": "yes", "comment": "อาการที่แจ้งสอดคล้องกับโรคที่ระบบวิเคราะห์: ไข้หวัดใหญ่"},
+    "ai2": {"summary": "คุณมีไข้และปวดหัวมาสองวัน", "recommendation": "พักผ่อนให้เพียงพอ ดื่มน้ำมากๆ"},
+    "answer": {"answer": "ควรพักผ่อนให้เพียงพอและดื่มน้ำมากๆ\nหากอาการไม่ดีขึ้นควรพบแพทย์"},
+}
+# รูปแบบคำตอบ -> สัดส่วน
+DEFAULT_MIX = {
+    "clean": 0.55, "python_dict": 0.15, "fenced": 0.1, "preamble": 0.08,
+    "trailing_comma": 0.05, "missing_field": 0.04, "forbidden": 0.03,
+}
+
+
+def render(kind, sample):
+    text = json.dumps(sample, ensure_ascii=False)
+    if kind == "python_dict":
+        return repr(sample)
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "preamble":
+        return f"แน่นอนค่ะ นี่คือผลการวิเคราะห์\n{text}"
+    if kind == "trailing_comma":
+        return text[:-1] + ",}"
+    if kind == "missing_field":
+        first = next(iter(sample))
+        return json.dumps({first: sample[first]}, ensure_ascii=False)
+    if kind == "forbidden":
+        field = list(sample)[-1]
+        forbidden = dict(sample, **{field: sample[field] + "\nยา: พาราเซตามอล 500 มก."})
+        return json.dumps(forbidden, ensure_ascii=False)
+    return text
+
+
+def build_corpus(stage, requests, mix, seed):
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+    return [render(kind, SAMPLES[stage]) for kind in kinds]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--mix", help='JSON เช่น {"clean": 0.8, "python_dict": 0.2}')
+    parser.add_argument("--raw", help="ไฟล์ผลดิบจริง (JSON string ต่อบรรทัด) ใช้กับทุก rail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-guard", action="store_true", help="ไม่วัดฝั่ง Guard (ไม่ต้อง import guardrails)")
+    args = parser.parse_args()
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+
+    Guard = None
+    if not args.no_guard:
+        from guardrails import Guard
+
+    print(f"{'rail':>7} {'guard_fail/1k':>14} {'local_ok/1k':>12} {'escalate/1k':>12} "
+          f"{'reask_saved/1k':>15} {'guard_saved/1k':>15} {'local(us)':>10} {'guard(us)':>10}")
+    for stage, rail in RAILS.items():
+        if args.raw:
+            with open(args.raw, "r", encoding="utf-8") as f:
+                corpus = [json.loads(line) for line in f if line.strip()]
+        else:
+            corpus = build_corpus(stage, args.requests, mix, args.seed)
+        per_1k = 1000 / len(corpus)
+        validator = LocalValidator.from_rail(rail)
+
+        start = time.perf_counter()
+        results = [validator.check(raw) for raw in corpus]
+        local_us = (time.perf_counter() - start) / len(corpus) * 1e6
+        local_ok = sum(r.ok for r in results)
+        saved = sum(r.ok and r.saves_reask for r in results)
+        # ผ่านในโปรเซสและ rail ไม่มี validator ที่ต้องให้ Guard ตรวจ = ไม่ต้องเรียก Guard.parse
+        guard_saved = 0 if validator.spec.guard_validators else local_ok
+
+        guard_fail, guard_us = "-", "-"
+        if Guard is not None:
+            guard = Guard.from_rail(rail)
+            start = time.perf_counter()
+            failed = sum(not guard.parse(raw, num_reasks=0).validation_passed for raw in corpus)
+            guard_us = f"{(time.perf_counter() - start) / len(corpus) * 1e6:.0f}"
+            guard_fail = f"{failed * per_1k:.0f}"
+        print(f"{stage:>7} {guard_fail:>14} {local_ok * per_1k:>12.0f} {(len(corpus) - local_ok) * per_1k:>12.0f} "
+              f"{saved * per_1k:>15.0f} {guard_saved * per_1k:>15.0f} {local_us:>10.1f} {guard_us:>10}")
+
+
+if __name__ == "__main__":
+    main()
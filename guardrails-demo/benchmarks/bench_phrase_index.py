@@ -0,0 +1,118 @@
+"""
+ดัชนีประโยคตัวอย่าง (PhraseIndex) เมื่อจำนวนประโยคโตเป็นหลักแสน: เวลาสร้าง เวลาโหลด artifact (mmap)
+หน่วยความจำของดัชนี และ latency ต่อคำค้น (p50/p95/p99) เทียบกับการไล่เทียบทุกประโยคด้วย rapidfuzz
+
+ประโยคสังเคราะห์สร้างจากท่อนคำของประโยคจริงในโรคเดียวกัน สลับลำดับและเติมคำขยาย (seed คงที่)
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_phrase_index.py [--sizes 10000,100000,300000] [--queries 200] [--brute-queries 20]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rapidfuzz import fuzz, process  # noqa: E402
+
+from knowledge_context import DISEASE_KEY, EXAMPLES_KEY  # noqa: E402
+from phrase_index import compile_phrase_index, load_phrase_index  # noqa: E402
+
+MODIFIERS = ["มาก", "นิดหน่อย", "ตอนเช้า", "ตอนกลางคืน", "มา 2 วัน", "มาเป็นอาทิตย์", "บ่อยๆ", "เป็นๆ หายๆ", "หลังกินข้าว"]
+
+
+def synthetic_entries(entries, size, seed):
+    rng = random.Random(seed)
+    fragments = {e[DISEASE_KEY]: [w for p in e[EXAMPLES_KEY] for w in p.split()] for e in entries}
+    diseases = list(fragments)
+    phrases = {d: list(e[EXAMPLES_KEY]) for d, e in zip(diseases, entries)}
+    total = sum(len(p) for p in phrases.values())
+    while total < size:
+        disease = rng.choice(diseases)
+        words = rng.sample(fragments[disease], min(len(fragments[disease]), rng.randint(2, 5)))
+        if rng.random() < 0.6:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(MODIFIERS))
+        phrases[disease].append(" ".join(words))
+        total += 1
+    return [{DISEASE_KEY: d, EXAMPLES_KEY: p} for d, p in phrases.items()]
+
+
+def make_queries(entries, n, seed):
+    """ข้อความผู้ใช้จำลอง: ท่อนจากประโยคจริง 1-3 ท่อน + คำขยาย (ไม่ตรงกับประโยคใดเป๊ะ)"""
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(n):
+        entry = rng.choice(entries)
+        words = rng.choice(entry[EXAMPLES_KEY]).split()
+        picked = rng.sample(words, min(len(words), rng.randint(1, 3)))
+        queries.append((" ".join(picked + [rng.choice(MODIFIERS)]), entry[DISEASE_KEY]))
+    return queries
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def timed_queries(fn, queries):
+    latencies, results = [], []
+    for text, _ in queries:
+        start = time.perf_counter()
+        results.append(fn(text))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default="./symptoms_data.json")
+    parser.add_argument("--sizes", default="10000,100000,300000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--brute-queries", type=int, default=20, help="จำนวนคำค้นสำหรับแบบไล่เทียบทุกประโยค (ช้า)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    queries = make_queries(base, args.queries, args.seed)
+
+    print(f"{'phrases':>8} {'build s':>8} {'load ms':>8} {'index MiB':>9} {'n-grams':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'top1 acc':>8} {'brute p50 ms':>12} {'speedup':>8}")
+    for size in (int(x) for x in args.sizes.split(",") if x.strip()):
+        entries = synthetic_entries(base, size, args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "symptoms_data.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            start = time.perf_counter()
+            compile_phrase_index(json_path, os.path.join(tmp, "index"))
+            build_s = time.perf_counter() - start
+            start = time.perf_counter()
+            index = load_phrase_index(json_path, os.path.join(tmp, "index"), rebuild=False)
+            load_ms = (time.perf_counter() - start) * 1e3
+
+            latencies, results = timed_queries(lambda t: index.search(t, args.k), queries)
+            correct = sum(bool(r) and r[0][1] == disease for r, (_, disease) in zip(results, queries))
+
+            # แบบไล่เทียบทุกประโยค (rapidfuzz ทำงานใน C แต่ต้องแตะทุกประโยคทุกคำค้น)
+            phrases = index.phrases
+            brute_latencies, _ = timed_queries(
+                lambda t: process.extract(t, phrases, scorer=fuzz.token_set_ratio, limit=args.k),
+                queries[:args.brute_queries])
+            usage = index.memory_usage()
+            p50 = percentile(latencies, 0.5) * 1e3
+            brute_p50 = percentile(brute_latencies, 0.5) * 1e3
+            print(f"{len(index):>8} {build_s:>8.2f} {load_ms:>8.1f} {usage['arrays'] / 2 ** 20:>9.1f} "
+                  f"{usage['vocab']:>8} {p50:>7.2f} {percentile(latencies, 0.95) * 1e3:>7.2f} "
+                  f"{percentile(latencies, 0.99) * 1e3:>7.2f} {correct / len(queries):>8.2f} "
+                  f"{brute_p50:>12.1f} {brute_p50 / p50:>7.0f}x")
+            del index
+
+
+if __name__ == "__main__":
+    main()
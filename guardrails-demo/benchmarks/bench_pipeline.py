@@ -0,0 +1,312 @@
+"""
+benchmark ทั้ง pipeline ของแชตบอท (ask_bot ใน app.py, ask_bot_streamlit / ask_bot_streamlit_stream ใน chatbot.py)
+ด้วย LLM จำลองแบบ deterministic ที่หน่วงเวลาตามกำหนด ข้อความอาการภาษาไทยสังเคราะห์ (seed คงที่)
+และตารางอาการ one-hot ที่ขยายจำนวนแถว (ค่าเริ่มต้น 1x, 10x, 100x, 1000x)
+
+รายงานต่อขั้น: throughput, p50/p95/p99, peak memory (tracemalloc วัดอีกรอบแยก ไม่ปนกับเวลา)
+และเวลาแต่ละ span ภายในเทิร์น (จาก telemetry) ผลบันทึกเป็น JSON พร้อม commit เพื่อเทียบข้าม commit:
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_pipeline.py [--scales 1,10,100,1000] [--messages 200] [--turns 30]
+                                        [--latency-ms 20] [--mode sequential] [--out pipeline.json]
+    python benchmarks/bench_pipeline.py --compare before.json --out after.json
+
+ค่าเริ่มต้นปิด response cache เพื่อให้ทุกเทิร์นเรียก LLM (จำลอง) จริง ใส่ --cache เพื่อเปิด
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+os.environ.setdefault("TYPHOON_API_KEY", "fake")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+if "--cache" not in sys.argv:
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+os.chdir(os.path.join(HERE, ".."))
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+import chatbot  # noqa: E402
+import telemetry  # noqa: E402
+from fake_typhoon_server import fake_content  # noqa: E402
+from predict import SymptomScorer, extract_symptoms_from_text, predict_disease_percent  # noqa: E402
+
+MESSAGE_TEMPLATES = [
+    "{0}",
+    "มี{0}",
+    "{0} {1}",
+    "มี{0}และ{1}มา 2 วัน",
+    "ช่วงนี้{0} {1} แล้วก็{2}",
+    "{0}, {1}, {2}",
+    "เมื่อวานเริ่ม{0} วันนี้{1}ด้วย",
+    "รู้สึก{0} {1} {2} {3}",
+]
+
+
+# ================= ข้อมูลสังเคราะห์ =================
+def synthetic_messages(known_symptoms, n, seed):
+    """ข้อความอาการภาษาไทยจากรายชื่ออาการในตาราง 1-4 อาการต่อข้อความ"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(n):
+        template = rng.choice(MESSAGE_TEMPLATES)
+        slots = template.count("{")
+        messages.append(template.format(*rng.sample(known_symptoms, min(slots, len(known_symptoms)))))
+    return messages
+
+
+def scale_table(base, factor, noise, seed):
+    """
+    ตารางที่มีแถวมากขึ้น factor เท่า: ชุดแรกคือตารางเดิม ชุดที่เหลือสุ่มสลับบิตในสัดส่วน noise
+    (โรคและอาการชุดเดิม ผลจัดอันดับจึงใกล้เคียงของจริง)
+    """
+    if factor == 1:
+        return base
+    rng = np.random.default_rng(seed)
+    matrix = np.tile(np.asarray(base.matrix), (factor, 1))
+    rows = base.matrix.shape[0]
+    if noise > 0:
+        for start in range(rows, matrix.shape[0], rows * 64):  # ทีละก้อน ไม่ให้ใช้หน่วยความจำชั่วคราวมาก
+            block = matrix[start:start + rows * 64]
+            flip = rng.random(block.shape, dtype=np.float32) < noise
+            block[flip] ^= 1
+    row_codes = np.tile(base.row_codes, factor)
+    return SymptomScorer(np.asfortranarray(matrix), row_codes, base.diseases, base.symptoms)
+
+
+def use_table(table, known_symptoms, disease_col):
+    """ให้ chatbot และ app ใช้ตารางที่กำหนด (ทั้งสองเรียก get_symptom_table() ตอนใช้งาน)"""
+    value = (table, known_symptoms, disease_col)
+    chatbot.get_symptom_table = app.get_symptom_table = lambda: value
+
+
+# ================= LLM จำลอง =================
+def make_llm_api(latency):
+    def llm_api(prompt, **kwargs):
+        time.sleep(latency)
+        return fake_content(prompt)
+    return llm_api
+
+
+def make_llm_stream_api(latency, chunk_chars=4):
+    """token แรกหลัง latency/4 ที่เหลือทยอยส่งจนครบ latency (แบบเดียวกับ fake_typhoon_server)"""
+    def llm_stream_api(prompt, **kwargs):
+        content = fake_content(prompt)
+        pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)] or [""]
+        time.sleep(latency / 4)
+        for piece in pieces:
+            yield piece
+            time.sleep(latency * 0.75 / len(pieces))
+    return llm_stream_api
+
+
+# ================= วัดผล =================
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(latencies, elapsed):
+    return {
+        "n": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1e3, 4),
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 4),
+        "p95_ms": round(percentile(latencies, 0.95) * 1e3, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 4),
+    }
+
+
+def time_calls(fn, inputs):
+    latencies = []
+    start = time.perf_counter()
+    for item in inputs:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+def peak_memory_kib(fn, inputs):
+    """หน่วยความจำสูงสุดที่เพิ่มขึ้นระหว่างรัน fn กับทุก input (KiB)"""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for item in inputs:
+            fn(item)
+        return round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def build_stages(args, table, known_symptoms, disease_col):
+    llm_api = make_llm_api(args.latency_ms / 1000.0)
+    llm_stream_api = make_llm_stream_api(args.latency_ms / 1000.0)
+    first_token = []
+
+    def stream_turn(message):
+        start = time.perf_counter()
+        for i, _ in enumerate(chatbot.ask_bot_streamlit_stream(message, greeted=True, state={}, llm_api=llm_api,
+                                                               llm_stream_api=llm_stream_api, mode=args.mode)):
+            if i == 0:
+                first_token.append(time.perf_counter() - start)
+
+    matched = {}
+
+    def extract(message):
+        matched[message] = extract_symptoms_from_text(message, known_symptoms)
+
+    # (ชื่อขั้น, ฟังก์ชัน, ใช้ข้อความชุดเต็มหรือชุดเทิร์น)
+    stages = [
+        ("extract_symptoms", extract, False),
+        ("predict_disease", lambda m: predict_disease_percent(matched[m] or known_symptoms[:1], table, disease_col,
+                                                             top_k=chatbot.KNOWLEDGE_TOP_K), False),
+        ("classify_message", lambda m: chatbot.classify_message(m, greeted=True), False),
+        ("analyze_symptoms", chatbot.analyze_symptoms, False),
+        ("ask_bot", lambda m: app.ask_bot(m, greeted=True, llm_api=llm_api), True),
+        ("ask_bot_streamlit", lambda m: chatbot.ask_bot_streamlit(m, greeted=True, state={}, llm_api=llm_api,
+                                                                  mode=args.mode), True),
+        ("ask_bot_streamlit_stream", stream_turn, True),
+    ]
+    return stages, first_token
+
+
+def collect_spans(fn, inputs):
+    """เวลาแต่ละ span ภายในเทิร์น (รวมทุก span ที่ชื่อเดียวกันในเทิร์นเดียว)"""
+    per_span = {}
+    for item in inputs:
+        with telemetry.trace("bench") as trace:
+            fn(item)
+        totals = {}
+        for s in trace.spans:
+            totals[s.name] = totals.get(s.name, 0.0) + s.duration
+        for name, value in totals.items():
+            per_span.setdefault(name, []).append(value)
+    return {name: summarize(values, 0) for name, values in sorted(per_span.items())}
+
+
+def run_scale(factor, base, known_symptoms, disease_col, args):
+    start = time.perf_counter()
+    table = scale_table(base, factor, args.noise, args.seed)
+    build_s = time.perf_counter() - start
+    use_table(table, known_symptoms, disease_col)
+
+    messages = synthetic_messages(known_symptoms, args.messages, args.seed)
+    turns = messages[:args.turns]
+    stages, first_token = build_stages(args, table, known_symptoms, disease_col)
+
+    for _, fn, _ in stages:  # อุ่นเครื่อง (Guard, validator, extractor) ไม่ให้เวลาโหลดครั้งแรกปนในผล
+        fn(messages[0])
+    first_token.clear()
+
+    result = {"rows": int(table.matrix.shape[0]), "table_mib": round(table.matrix.nbytes / 2 ** 20, 2),
+              "build_s": round(build_s, 3), "stages": {}}
+    telemetry.set_enabled(False)  # วัดเวลาโดยไม่มีต้นทุน telemetry
+    for name, fn, is_turn in stages:
+        inputs = turns if is_turn else messages
+        latencies, elapsed = time_calls(fn, inputs)
+        result["stages"][name] = summarize(latencies, elapsed)
+    if first_token:
+        result["stages"]["ask_bot_streamlit_stream"]["first_token"] = summarize(first_token, 0)
+    for name, fn, is_turn in stages:
+        inputs = turns[:args.memory_turns] if is_turn else messages
+        result["stages"][name]["peak_kib"] = peak_memory_kib(fn, inputs)
+    telemetry.set_enabled(True)
+    result["spans"] = collect_spans(dict((n, fn) for n, fn, _ in stages)["ask_bot_streamlit"], turns)
+    return result
+
+
+# ================= รายงาน / เทียบ =================
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                    text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_scale(label, result):
+    print(f"\n[{label}] rows {result['rows']}  table {result['table_mib']} MiB")
+    print(f"  {'stage':26s} {'thru/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KiB':>9}")
+    for name, s in result["stages"].items():
+        print(f"  {name:26s} {s['throughput_per_s']:>10.1f} {s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} "
+              f"{s['p99_ms']:>9.3f} {s['peak_kib']:>9.1f}")
+        if "first_token" in s:
+            ft = s["first_token"]
+            print(f"  {'  first_token':26s} {'':>10} {ft['p50_ms']:>9.3f} {ft['p95_ms']:>9.3f} {ft['p99_ms']:>9.3f}")
+    print("  spans in ask_bot_streamlit: " + ", ".join(
+        f"{name} p50 {s['p50_ms']:.2f}" for name, s in result["spans"].items()))
+
+
+def print_compare(old, new):
+    """เทียบ p50/p95 ต่อขั้นกับผลครั้งก่อน (ratio > 1 = ช้าลง)"""
+    print(f"\ncompare {old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for label, result in new["results"].items():
+        before = old["results"].get(label)
+        if before is None:
+            continue
+        for name, s in result["stages"].items():
+            prev = before["stages"].get(name)
+            if prev is None:
+                continue
+            print(f"  {label:>6} {name:26s} p50 {prev['p50_ms']:9.3f} -> {s['p50_ms']:9.3f} "
+                  f"({s['p50_ms'] / prev['p50_ms']:.2f}x)  p95 {prev['p95_ms']:9.3f} -> {s['p95_ms']:9.3f} "
+                  f"({s['p95_ms'] / prev['p95_ms']:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", default="1,10,100,1000", help="จำนวนเท่าของแถวในตารางอาการ")
+    parser.add_argument("--messages", type=int, default=200, help="จำนวนข้อความสำหรับขั้นที่ไม่เรียก LLM")
+    parser.add_argument("--turns", type=int, default=30, help="จำนวนเทิร์นเต็ม (เรียก LLM จำลอง) ต่อขั้น")
+    parser.add_argument("--memory-turns", type=int, default=5, help="จำนวนเทิร์นที่ใช้วัด peak memory")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="เวลาหน่วงของ LLM จำลองต่อครั้ง")
+    parser.add_argument("--mode", default="sequential", choices=chatbot.CHAIN_MODES)
+    parser.add_argument("--noise", type=float, default=0.02, help="สัดส่วนบิตที่สลับในแถวที่ขยาย")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="เปิด response cache")
+    parser.add_argument("--out", default="pipeline_bench.json")
+    parser.add_argument("--compare", help="ไฟล์ JSON ผลครั้งก่อน")
+    args = parser.parse_args()
+
+    base, known_symptoms, disease_col = chatbot.get_symptom_table()
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    for factor in (int(x) for x in args.scales.split(",") if x.strip()):
+        label = f"x{factor}"
+        report["results"][label] = run_scale(factor, base, known_symptoms, disease_col, args)
+        print_scale(label, report["results"][label])
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nsaved {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
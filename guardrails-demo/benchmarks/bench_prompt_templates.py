@@ -0,0 +1,67 @@
+"""
+เวลา render prompt ต่อครั้ง: template ที่คอมไพล์ไว้ (health_prompt_template) เทียบกับการสร้าง
+langchain PromptTemplate ใหม่แล้ว format ทุกคำขอแบบเดิม และตรวจว่าข้อความที่ได้ตรงกันทุกตัวอักษร
+(ถ้าไม่ได้ติดตั้ง langchain จะวัดเฉพาะฝั่งใหม่)
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_prompt_templates.py [--repeat 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from health_prompt_template import TEMPLATES  # noqa: E402
+
+SAMPLE_VALUES = {
+    "user_symptoms": "ปวดหัว, มีไข้, ไอ",
+    "predicted_diseases": "1. ไข้หวัดใหญ่ 66.67% (จากอาการทั้งหมด 3)\n2. ไข้หวัด 33.33% (จากอาการทั้งหมด 3)",
+    "json_data": '[{"โรค": "ไข้หวัดใหญ่", "อาการโดยสังเขป": ["มีไข้สูง ปวดเมื่อยตัว"]}]',
+    "ai1_comment": "อาการที่แจ้งสอดคล้องกับโรคที่ระบบวิเคราะห์",
+    "ai2_summary": "คุณมีไข้และปวดหัว",
+    "ai2_recommendation": "พักผ่อนและดื่มน้ำมากๆ",
+    "image_class": "Abnormal(Ulcer)",
+    "symptoms": "ปวดหัว, มีไข้",
+    "disease_ranking": "1. ไข้หวัดใหญ่ 66.67% (จากอาการทั้งหมด 3)",
+}
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    try:
+        from langchain.prompts import PromptTemplate as LangChainPromptTemplate
+    except ImportError:
+        LangChainPromptTemplate = None
+
+    print(f"{'template':>8} {'compiled(us)':>13} {'langchain(us)':>14} {'speedup':>8} {'identical':>9}")
+    for name, template in TEMPLATES.items():
+        values = {k: SAMPLE_VALUES[k] for k in template.input_variables}
+        compiled = per_call(lambda: template.format(**values), args.repeat) * 1e6
+        if LangChainPromptTemplate is None:
+            print(f"{name:>8} {compiled:>13.2f} {'-':>14} {'-':>8} {'-':>9}")
+            continue
+
+        def langchain_render():
+            return LangChainPromptTemplate(
+                input_variables=template.input_variables, template=template.template
+            ).format(**values)
+
+        identical = langchain_render() == template.format(**values)
+        old = per_call(langchain_render, max(1, args.repeat // 20)) * 1e6
+        print(f"{name:>8} {compiled:>13.2f} {old:>14.2f} {old / compiled:>7.0f}x {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
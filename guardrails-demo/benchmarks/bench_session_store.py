@@ -0,0 +1,72 @@
+"""
+ต้นทุนต่อเทิร์นของ session store เมื่อแชตยาวขึ้น (โหลด state + ต่อท้าย 2 ข้อความ + บันทึก state + อ่านหน้าประวัติ)
+เทียบกับแบบเดิมที่วาดประวัติทั้งหมดทุก rerun (จำลองด้วยการสร้าง HTML bubble ของทุกข้อความ)
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_session_store.py [--turns 2000] [--page-size 20] [--max-messages 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from session_store import MemorySessionStore, SQLiteSessionStore  # noqa: E402
+
+STATE = {"greeted": True, "ai1_res": {"consistency": "yes", "comment": "สอดคล้อง"},
+         "ai2_res": {"summary": "มีไข้", "recommendation": "พักผ่อน"}, "ai3_reply": "• 💧 ดื่มน้ำ" * 5}
+REPLY = "ขอให้คุณหายไวๆ นะคะ\n• 💧 ดื่มน้ำสะอาดบ่อยๆ\n• 😴 พักผ่อนให้เพียงพอ"
+
+
+def bubble(msg):
+    return (f'<div class="messenger-bubble-row"><div class="messenger-bubble messenger-bubble-{msg["role"]}">'
+            f'{msg["content"]}</div></div>')
+
+
+def run(store, turns, page_size, checkpoints):
+    unbounded = []  # แบบเดิม: st.session_state.messages โตไม่จำกัดและวาดทั้งหมด
+    rows = []
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        state = store.load_state("s")
+        store.append_message("s", "user", "ไข้ ไอ เจ็บคอ")
+        store.save_state("s", dict(state, **STATE))
+        store.append_message("s", "ai", REPLY)
+        page, _ = store.messages("s", limit=page_size)
+        "".join(bubble(m) for m in page)
+        store_us = (time.perf_counter() - start) * 1e6
+
+        unbounded += [{"role": "user", "content": "ไข้ ไอ เจ็บคอ"}, {"role": "ai", "content": REPLY}]
+        start = time.perf_counter()
+        "".join(bubble(m) for m in unbounded)
+        legacy_us = (time.perf_counter() - start) * 1e6
+        if turn in checkpoints:
+            rows.append((turn, store_us, legacy_us))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--max-messages", type=int, default=200)
+    args = parser.parse_args()
+    checkpoints = {t for t in (10, 100, 500, 1000, 2000, 5000, 10000) if t <= args.turns} | {args.turns}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            "memory": MemorySessionStore(max_messages=args.max_messages),
+            "sqlite": SQLiteSessionStore(os.path.join(tmp, "sessions.db"), max_messages=args.max_messages),
+        }
+        for name, store in stores.items():
+            print(f"\n[{name}] turn cost (store + render {args.page_size} msgs) vs legacy render-all")
+            for turn, store_us, legacy_us in run(store, args.turns, args.page_size, checkpoints):
+                print(f"  turn {turn:>6}: store {store_us:9.1f} us   legacy render {legacy_us:9.1f} us")
+            print(f"  kept messages: {store.message_count('s')}")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
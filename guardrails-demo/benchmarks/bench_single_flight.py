@@ -0,0 +1,97 @@
+"""
+ข้อความเหมือนกันเข้ามาพร้อมกันเป็นชุด (burst): จำนวนการเรียก LLM จริงและ latency เมื่อเปิด/ปิด single-flight
+ทั้งแบบเธรด (ask_bot_streamlit) และ asyncio (ask_bot_async) ใช้ LLM จำลองที่หน่วงเวลา ปิด response cache
+เพื่อให้เห็นผลของการรวมคำขอที่กำลังทำงานอยู่อย่างเดียว
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_single_flight.py [--burst 50] [--latency-ms 300]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+os.environ.setdefault("TYPHOON_API_KEY", "fake")
+os.environ["RESPONSE_CACHE_SIZE"] = "0"
+os.chdir(os.path.join(HERE, ".."))
+
+import chatbot  # noqa: E402
+import chatbot_async  # noqa: E402
+from fake_typhoon_server import fake_content  # noqa: E402
+
+MESSAGES = {"symptoms": "ไข้ ไอ เจ็บคอ น้ำมูกไหล", "disease_info": "ไข้หวัดใหญ่คืออะไร"}
+
+
+class CountingLLM:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def __call__(self, prompt, **kwargs):
+        self._count()
+        time.sleep(self.latency)
+        return fake_content(prompt)
+
+    async def call_async(self, prompt, **kwargs):
+        self._count()
+        await asyncio.sleep(self.latency)
+        return fake_content(prompt)
+
+
+def run_threads(message, burst, llm):
+    def turn(_):
+        start = time.perf_counter()
+        chatbot.ask_bot_streamlit(message, greeted=True, state={}, llm_api=llm, mode="sequential")
+        return time.perf_counter() - start
+    with ThreadPoolExecutor(max_workers=burst) as pool:
+        return list(pool.map(turn, range(burst)))
+
+
+def run_async(message, burst, llm):
+    async def turn():
+        start = time.perf_counter()
+        await chatbot_async.ask_bot_async(message, greeted=True, state={}, llm_api=llm.call_async, mode="sequential")
+        return time.perf_counter() - start
+
+    async def main():
+        return await asyncio.gather(*[turn() for _ in range(burst)])
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    chatbot.analyze_symptoms(MESSAGES["symptoms"])  # โหลดตารางอาการก่อนวัด
+    print(f"burst of {args.burst} identical messages, fake LLM {args.latency_ms:.0f} ms, response cache off")
+    print(f"{'runner':>7} {'message':>13} {'flight':>7} {'llm calls':>10} {'coalesced':>10} {'p50 s':>7} {'max s':>7}")
+    for runner_name, runner in (("threads", run_threads), ("asyncio", run_async)):
+        for message in MESSAGES.values():  # โหลด Guard / validator ก่อนวัด
+            runner(message, 1, CountingLLM(0))
+        for kind, message in MESSAGES.items():
+            for enabled in (False, True):
+                chatbot.llm_flight.enabled = enabled
+                before = chatbot.llm_flight.stats()["coalesced"]
+                llm = CountingLLM(args.latency_ms / 1000.0)
+                latencies = runner(message, args.burst, llm)
+                coalesced = chatbot.llm_flight.stats()["coalesced"] - before
+                print(f"{runner_name:>7} {kind:>13} {'on' if enabled else 'off':>7} {llm.calls:>10} {coalesced:>10} "
+                      f"{statistics.median(latencies):>7.3f} {max(latencies):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
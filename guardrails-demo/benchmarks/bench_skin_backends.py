@@ -0,0 +1,133 @@
+"""
+เทียบ backend ของโมเดลผิวหนัง (Keras / TFLite float32 / TFLite int8): ความตรงกันของผล, เวลาโหลด, latency และหน่วยความจำ
+แต่ละ backend รันใน process แยก เพื่อให้เวลา import/โหลด และ RSS ไม่ปนกัน
+
+รันจากโฟลเดอร์ guardrails-demo หลัง export แล้ว:
+    python skin_model_export.py --output ./custom_cnn_dfu_model.tflite
+    python skin_model_export.py --int8 --calibration-dir ./samples --output ./custom_cnn_dfu_model_int8.tflite
+    python benchmarks/bench_skin_backends.py --tflite ./custom_cnn_dfu_model.tflite --tflite-int8 ./custom_cnn_dfu_model_int8.tflite
+
+ผลถือว่าตรงกัน (parity) เมื่อทำนายคลาสเดียวกันทุกภาพ และ confidence ต่างจาก Keras ไม่เกิน --tolerance
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+
+def sample_inputs(n, image_dir=None):
+    import numpy as np
+    from PIL import Image
+    from skin_inference_service import preprocess_skin_image
+
+    if image_dir:
+        names = sorted(f for f in os.listdir(image_dir) if f.lower().endswith((".png", ".jpg", ".jpeg")))[:n]
+        images = [Image.open(os.path.join(image_dir, name)).convert("RGB") for name in names]
+    else:
+        rng = np.random.default_rng(0)
+        images = [Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)) for _ in range(n)]
+    return np.stack([preprocess_skin_image(img) for img in images])
+
+
+def run_child(args):
+    """วัดผลของ backend เดียว (เรียกจาก process แม่ผ่าน --child)"""
+    import numpy as np
+
+    start = time.perf_counter()
+    from skin_inference_service import load_skin_model_backend
+    model = load_skin_model_backend(args.child)
+    load_s = time.perf_counter() - start
+
+    inputs = sample_inputs(args.images, args.image_dir)
+    outputs = np.asarray(model.predict_on_batch(inputs)).tolist()
+
+    single = []
+    for i in range(args.repeat):
+        t = time.perf_counter()
+        model.predict_on_batch(inputs[i % len(inputs)][None])
+        single.append(time.perf_counter() - t)
+    batch = []
+    for _ in range(max(1, args.repeat // 4)):
+        t = time.perf_counter()
+        model.predict_on_batch(inputs[:args.batch_size])
+        batch.append(time.perf_counter() - t)
+    single.sort()
+    batch.sort()
+    print(json.dumps({
+        "backend": getattr(model, "backend_name", args.child),
+        "load_s": round(load_s, 3),
+        "single_p50_ms": round(single[len(single) // 2] * 1000, 3),
+        "single_p95_ms": round(single[int(len(single) * 0.95) - 1] * 1000, 3),
+        "batch_ms": round(batch[len(batch) // 2] * 1000, 3),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "outputs": outputs,
+    }))
+
+
+def run_backend(name, backend, tflite_path, args):
+    env = dict(os.environ)
+    if tflite_path:
+        env["SKIN_TFLITE_PATH"] = os.path.abspath(tflite_path)
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", backend, "--images", str(args.images),
+           "--repeat", str(args.repeat), "--batch-size", str(args.batch_size)]
+    if args.image_dir:
+        cmd += ["--image-dir", args.image_dir]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"[{name}] ล้มเหลว:\n{proc.stderr[-2000:]}")
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tflite", help="ไฟล์ TFLite float32")
+    parser.add_argument("--tflite-int8", help="ไฟล์ TFLite int8")
+    parser.add_argument("--image-dir", help="ภาพจริงสำหรับเทียบผล (ไม่ระบุ = ภาพสุ่ม)")
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    os.chdir(os.path.join(HERE, ".."))
+
+    if args.child:
+        run_child(args)
+        return
+
+    runs = [("keras", "keras", None)]
+    if args.tflite:
+        runs.append(("tflite", "tflite", args.tflite))
+    if args.tflite_int8:
+        runs.append(("tflite-int8", "tflite", args.tflite_int8))
+
+    results = {name: run_backend(name, backend, path, args) for name, backend, path in runs}
+    reference = results.get("keras")
+    print(f"{'backend':12s} {'load s':>8} {'1 img p50':>10} {'1 img p95':>10} {'batch ms':>9} {'RSS MB':>8}  parity")
+    failed = False
+    for name, result in results.items():
+        if result is None:
+            failed = True
+            continue
+        parity = "-"
+        if reference is not None and name != "keras":
+            same_class = sum(max(range(len(a)), key=a.__getitem__) == max(range(len(b)), key=b.__getitem__)
+                             for a, b in zip(reference["outputs"], result["outputs"]))
+            max_diff = max(abs(x - y) for a, b in zip(reference["outputs"], result["outputs"]) for x, y in zip(a, b))
+            ok = same_class == len(result["outputs"]) and max_diff <= args.tolerance
+            failed |= not ok
+            parity = f"{'OK' if ok else 'FAIL'} ({same_class}/{len(result['outputs'])} same class, max diff {max_diff:.4f})"
+        print(f"{name:12s} {result['load_s']:>8.2f} {result['single_p50_ms']:>10.2f} {result['single_p95_ms']:>10.2f} "
+              f"{result['batch_ms']:>9.2f} {result['max_rss_mb']:>8.1f}  {parity}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+แคชผลวิเคราะห์ภาพผิวหนัง (skin_cache.py) กับภาพแผลจำลอง (พื้นผิวสีผิว + รอยแผลสุ่มตำแหน่ง/ขนาด/สี)
+
+- ภาพเดิมซ้ำ / บีบอัด JPEG ใหม่ / ย่อขนาด / ครอปขอบเล็กน้อย: หาเจอกี่เปอร์เซ็นต์ต่อค่า SKIN_CACHE_PHASH_DISTANCE
+- แผลคนละแผล (ทุกคู่): ชนกันกี่คู่ ทั้งแบบ phash อย่างเดียวและเมื่อตรวจ thumbnail ด้วย (ต้องเป็น 0)
+- เวลา lookup (hit ตรงเป๊ะ / hit ใกล้เคียง / miss) เทียบกับการ predict ผ่านบริการโมเดล (ถ้ามีโมเดล)
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_skin_cache.py [--images 300] [--size 256]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+os.chdir(os.path.join(HERE, ".."))
+
+from skin_cache import SkinFingerprint, SkinResultCache, _popcount, _thumb_diff  # noqa: E402
+
+
+def make_wound(rng, size=640):
+    """ภาพแผลจำลองหนึ่งภาพ (PIL RGB)"""
+    skin = np.array([rng.uniform(170, 235), rng.uniform(120, 185), rng.uniform(95, 160)])
+    noise = rng.normal(0, 6, (size // 8, size // 8, 1))
+    base = np.clip(skin + np.kron(noise, np.ones((8, 8, 1))), 0, 255).astype(np.uint8)
+    img = Image.fromarray(base)
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.integers(1, 4)):
+        cx, cy = rng.uniform(0.2, 0.8, 2) * size
+        rx, ry = rng.uniform(0.05, 0.25, 2) * size
+        color = tuple(int(c) for c in (rng.uniform(110, 200), rng.uniform(30, 90), rng.uniform(30, 90)))
+        draw.ellipse([cx - rx, cy - ry, cx + rx, cy + ry], fill=color)
+    return img.filter(ImageFilter.GaussianBlur(rng.uniform(1, 4)))
+
+
+def encode(img, quality=92):
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def variants(img):
+    """สำเนาของภาพเดียวกันที่ไบต์ไม่ตรงกัน"""
+    w, h = img.size
+    return {
+        "jpeg q70": encode(img, 70),
+        "resize 0.6": encode(img.resize((int(w * 0.6), int(h * 0.6)), Image.BILINEAR)),
+        "png": (lambda buf: (img.save(buf, format="PNG"), buf.getvalue())[1])(io.BytesIO()),
+        "crop 2%": encode(img.crop((int(w * 0.01), int(h * 0.01), int(w * 0.99), int(h * 0.99)))),
+    }
+
+
+def timed(fn, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--size", type=int, default=640)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-pixel-diff", type=float, default=6.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images = [make_wound(rng, args.size) for _ in range(args.images)]
+    originals = [encode(img) for img in images]
+    fingerprints = [SkinFingerprint(data) for data in originals]
+    copies = [variants(img) for img in images]
+    hashes = np.array([fp.phash for fp in fingerprints], dtype=np.uint64)
+    print(f"{args.images} synthetic wound images, {args.size}px JPEG")
+
+    # ภาพต่างกันทุกคู่: distance ของ phash และคู่ที่ผ่านทั้ง phash และ thumbnail
+    pair_distance = _popcount(hashes[:, None] ^ hashes[None, :])
+    upper = np.triu_indices(len(hashes), 1)
+    distinct = pair_distance[upper]
+    print(f"\ndistinct pairs: {len(distinct)}, phash distance min {distinct.min()} median {np.median(distinct):.0f}")
+
+    print(f"\n{'distance':>8} {'distinct phash':>15} {'after thumb':>12}  recall per variant")
+    for threshold in (0, 2, 4, 6, 8, 10, 12):
+        close = [(i, j) for i, j in zip(*upper) if pair_distance[i, j] <= threshold]
+        collide = sum(_thumb_diff(fingerprints[i].thumb, fingerprints[j].thumb) <= args.max_pixel_diff
+                      for i, j in close)
+        recall = {}
+        for name in copies[0]:
+            found = 0
+            for fp, copy in zip(fingerprints, copies):
+                other = SkinFingerprint(copy[name])
+                distance = bin(fp.phash ^ other.phash).count("1")
+                found += distance <= threshold and _thumb_diff(fp.thumb, other.thumb) <= args.max_pixel_diff
+            recall[name] = found / len(copies)
+        print(f"{threshold:>8} {len(close):>15} {collide:>12}  "
+              + "  ".join(f"{name} {value:.0%}" for name, value in recall.items()))
+
+    cache = SkinResultCache(max_size=args.images, max_distance=4, max_pixel_diff=args.max_pixel_diff)
+    for fp in fingerprints:
+        cache.store(fp, "Acne", 0.9, "reply")
+    miss = encode(make_wound(rng, args.size))
+    print(f"\nlookup with {args.images} cached images (median ms):")
+    print(f"  exact hit {timed(cache.lookup, originals[0]):.3f}   near hit {timed(cache.lookup, copies[0]['jpeg q70']):.3f}"
+          f"   miss {timed(cache.lookup, miss):.3f}")
+    print(f"  {cache.stats()}")
+
+    try:
+        from skin_inference_service import get_skin_inference_service
+        service = get_skin_inference_service()
+        service.predict(Image.open(io.BytesIO(originals[0])))
+        print(f"  model predict {timed(lambda: service.predict(Image.open(io.BytesIO(originals[0])))):.3f} ms"
+              " (plus the LLM doctor reply on a miss)")
+    except Exception as e:
+        print(f"  model predict skipped: {type(e).__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+เทียบการเตรียมภาพผิวหนังแบบเดิม (convert RGB เต็มขนาด -> resize -> astype -> /255 -> expand_dims)
+กับ load_skin_pixels + normalize_skin_pixels (JPEG draft + เขียนลง buffer ที่จองไว้) บนภาพกล้องมือถือขนาดใหญ่
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_skin_preprocess.py [--width 4032 --height 3024] [--repeat 20] [--image photo.jpg]
+
+MB คือหน่วยความจำสูงสุดฝั่ง Python/numpy (tracemalloc ไม่เห็น buffer ภายใน PIL)
+ส่วนขนาดภาพที่ถูกถอดรหัสจริงดูที่คอลัมน์ decoded
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from skin_inference_service import IMAGE_SIZE, load_skin_pixels, normalize_skin_pixels  # noqa: E402
+
+
+def legacy_preprocess(path):
+    # เส้นทางเดิม: UI convert("RGB") แล้ว predict_skin_disease ทำส่วนที่เหลือ
+    img_pil = Image.open(path).convert("RGB")
+    img = img_pil.resize(IMAGE_SIZE)
+    img_array = np.array(img).astype('float32') / 255.0
+    if img_array.ndim == 2:
+        img_array = np.stack([img_array]*3, axis=-1)
+    elif img_array.shape[2] == 4:
+        img_array = img_array[:, :, :3]
+    return np.expand_dims(img_array, axis=0)
+
+
+def make_photo(path, width, height, mode):
+    """ภาพสังเคราะห์ที่บีบอัดคล้ายภาพถ่ายจริง (gradient + noise) quality 90"""
+    rng = np.random.default_rng(0)
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None] * np.ones((height, 1, 3), dtype=np.float32)
+    pixels = np.clip(base + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels)
+    if mode != "RGB":
+        img = img.convert(mode)
+    img.save(path, quality=90)
+
+
+def measure(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times.sort()
+    return times[len(times) // 2] * 1000, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", help="ใช้ภาพจริงแทนภาพสังเคราะห์")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    buffer = np.empty((1, *IMAGE_SIZE[::-1], 3), dtype=np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [(args.image, "given")] if args.image else []
+        if not args.image:
+            for mode in ("RGB", "L"):
+                path = os.path.join(tmp, f"photo_{mode}.jpg")
+                make_photo(path, args.width, args.height, mode)
+                cases.append((path, f"{args.width}x{args.height} {mode} JPEG"))
+            png = os.path.join(tmp, "photo_RGBA.png")
+            Image.open(cases[0][0]).convert("RGBA").resize((args.width // 2, args.height // 2)).save(png)
+            cases.append((png, f"{args.width // 2}x{args.height // 2} RGBA PNG"))
+
+        print(f"{'image':24s} {'legacy ms':>10} {'legacy MB':>10} {'new ms':>8} {'new MB':>7} {'speedup':>8} "
+              f"{'decoded':>10} {'max diff':>9}")
+        for path, label in cases:
+            def new():
+                return normalize_skin_pixels(load_skin_pixels(Image.open(path)), buffer[0])
+
+            legacy_ms, legacy_mb = measure(lambda: legacy_preprocess(path), args.repeat)
+            new_ms, new_mb = measure(new, args.repeat)
+            diff = float(np.abs(legacy_preprocess(path)[0] - new()).max())
+            img = Image.open(path)
+            if img.format == "JPEG":
+                img.draft(img.mode, IMAGE_SIZE)
+            decoded = f"{img.size[0]}x{img.size[1]}"
+            print(f"{label:24s} {legacy_ms:>10.2f} {legacy_mb:>10.1f} {new_ms:>8.2f} {new_mb:>7.2f} "
+                  f"{legacy_ms / new_ms:>7.1f}x {decoded:>10} {diff:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+เทียบการวิเคราะห์ภาพผิวหนังทีละภาพ (model.predict_on_batch ต่อคำขอ) กับ SkinInferenceService (รวม batch)
+ภายใต้ผู้ใช้พร้อมกันหลายคน
+
+รันจากโฟลเดอร์ guardrails-demo (ต้องมี custom_cnn_dfu_model.h5) หรือใช้โมเดลจำลองด้วย --fake-model:
+    python benchmarks/bench_skin_service.py [--clients 32] [--requests 8] [--batch-size 16] [--wait-ms 5]
+    python benchmarks/bench_skin_service.py --fake-model --call-ms 20 --image-ms 1
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from skin_inference_service import (  # noqa: E402
+    SkinInferenceService,
+    decode_skin_prediction,
+    load_keras_model,
+    preprocess_skin_image,
+)
+
+
+class FakeModel:
+    """โมเดลจำลอง: ค่าใช้จ่ายคงที่ต่อการเรียก + ต่อภาพ (ถือ lock เหมือนรัน forward pass ทีละครั้ง)"""
+
+    def __init__(self, call_ms, image_ms):
+        self.call = call_ms / 1000.0
+        self.image = image_ms / 1000.0
+        self._lock = threading.Lock()
+
+    def predict_on_batch(self, inputs):
+        with self._lock:
+            time.sleep(self.call + self.image * len(inputs))
+        score = inputs.reshape(len(inputs), -1).mean(axis=1)
+        return np.stack([score, 1 - score], axis=1)
+
+
+def run_clients(fn, images, clients, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(i):
+        for j in range(requests):
+            start = time.perf_counter()
+            fn(images[(i + j) % len(images)])
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--fake-model", action="store_true")
+    parser.add_argument("--call-ms", type=float, default=20.0, help="(fake) ค่าใช้จ่ายต่อการเรียกโมเดล")
+    parser.add_argument("--image-ms", type=float, default=1.0, help="(fake) ค่าใช้จ่ายต่อภาพ")
+    args = parser.parse_args()
+
+    model = FakeModel(args.call_ms, args.image_ms) if args.fake_model else load_keras_model()
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)) for _ in range(16)]
+    model_lock = threading.Lock()
+
+    def single(img):
+        # แบบเดิม: หนึ่งคำขอ = หนึ่ง forward pass
+        inputs = np.expand_dims(preprocess_skin_image(img), axis=0)
+        with model_lock:
+            prediction = model.predict_on_batch(inputs)
+        return decode_skin_prediction(np.asarray(prediction)[0])
+
+    service = SkinInferenceService(model_loader=lambda: model, max_batch_size=args.batch_size,
+                                   max_wait_ms=args.wait_ms, workers=args.workers).start()
+    # ผลต้องตรงกับแบบทีละภาพ
+    for img in images:
+        expected, got = single(img), service.predict(img)
+        assert expected[0] == got[0] and abs(expected[1] - got[1]) < 1e-5, (expected, got)
+
+    print("single :", json.dumps(run_clients(single, images, args.clients, args.requests)))
+    print("batched:", json.dumps(run_clients(service.predict, images, args.clients, args.requests)))
+    print("metrics:", json.dumps(service.metrics()))
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+วัดเวลาเริ่มต้นของโมดูลแอป: เวลา import (จาก python -X importtime แยกตาม package) และเวลา warm-up ทรัพยากร
+แต่ละโมดูลรันใน process ใหม่ เพื่อให้ได้เวลาแบบ cold import
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_startup.py [--modules chatbot,chatbot_async,main] [--top 10] [--warm-up] [--json out.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..")
+
+WARM_UP_SNIPPET = (
+    "import json, time, {module}\n"
+    "from lazy_resources import warm_up\n"
+    "start = time.perf_counter()\n"
+    "timings = warm_up()\n"
+    "print(json.dumps({{'total': time.perf_counter() - start, 'resources': timings}}))\n"
+)
+
+
+def parse_importtime(stderr):
+    """คืน (เวลารวม us, {package ระดับบนสุด: self time us})"""
+    by_package = defaultdict(int)
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us)
+        # บรรทัดระดับบนสุดมีช่องว่างนำหน้าตัวเดียว
+        if not name.startswith("  "):
+            total += int(cumulative_us)
+    return total, dict(by_package)
+
+
+def run(code, env):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=APP_DIR, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return wall, proc
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", default="chatbot,chatbot_async,main")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--warm-up", action="store_true", help="วัดเวลา warm_up() ของทรัพยากรทั้งหมดด้วย")
+    parser.add_argument("--json", help="บันทึกผลเป็นไฟล์ JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("TYPHOON_API_KEY", "fake")
+    env.setdefault("OTEL_SDK_DISABLED", "true")
+    report = {}
+    for module in args.modules.split(","):
+        try:
+            wall, proc = run(f"import {module}", env)
+        except RuntimeError as e:
+            print(f"[{module}] import ไม่สำเร็จ:\n{e}")
+            continue
+        total_us, by_package = parse_importtime(proc.stderr)
+        top = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+        entry = {"process_s": round(wall, 3), "import_s": round(total_us / 1e6, 3),
+                 "top_packages_s": {name: round(us / 1e6, 3) for name, us in top}}
+        print(f"\n[{module}] process {wall:.2f} s, import {total_us / 1e6:.2f} s")
+        for name, us in top:
+            print(f"  {name:32s} {us / 1e6:7.3f} s")
+
+        if args.warm_up:
+            _, proc = run(WARM_UP_SNIPPET.format(module=module), env)
+            warm = json.loads(proc.stdout.strip().splitlines()[-1])
+            entry["warm_up"] = warm
+            print(f"  warm_up() {warm['total']:.2f} s")
+            for name, seconds in warm["resources"].items():
+                print(f"    {name:30s} {seconds if seconds is not None else 'failed'}")
+        report[module] = entry
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+เทียบความเร็วและผลการดึงอาการ ระหว่างตัวดึงอาการแบบเดิม (rapidfuzz extractOne ทีละคำ)
+กับ SymptomExtractor (Aho–Corasick + fuzzy แบบ blocking)
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_symptom_extractor.py [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rapidfuzz import process  # noqa: E402
+
+from predict import load_symptom_data  # noqa: E402
+from symptom_extractor import SymptomExtractor, DEFAULT_SYMPTOM_SYNONYMS  # noqa: E402
+
+
+def legacy_extract_symptoms_from_text(user_text, known_symptoms, threshold=80):
+    words = user_text.replace('และ', ' ').replace(',', ' ').split()
+    matched = set()
+    for word in words:
+        res = process.extractOne(word, known_symptoms, score_cutoff=threshold)
+        if res is not None:
+            matched.add(res[0])
+    return list(matched)
+
+
+def load_corpus(json_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [phrase for entry in data for phrase in entry.get("อาการโดยสังเขป", [])]
+
+
+def bench(fn, corpus, repeat):
+    best = float("inf")
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [fn(text) for text in corpus]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="./data/full_onehot_disease.csv")
+    parser.add_argument("--json", default="./symptoms_data.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=1, help="ทำซ้ำ corpus กี่เท่า")
+    args = parser.parse_args()
+
+    _, known_symptoms, _ = load_symptom_data(args.csv)
+    corpus = load_corpus(args.json) * args.scale
+    extractor = SymptomExtractor(known_symptoms, synonyms=DEFAULT_SYMPTOM_SYNONYMS)
+
+    legacy_time, legacy = bench(lambda t: legacy_extract_symptoms_from_text(t, known_symptoms), corpus, args.repeat)
+    new_time, new = bench(extractor.extract, corpus, args.repeat)
+
+    legacy_hits = sum(len(r) for r in legacy)
+    new_hits = sum(len(r) for r in new)
+    superset = sum(set(a) <= set(b) for a, b in zip(legacy, new))
+    n = len(corpus)
+    print(f"messages: {n}")
+    print(f"legacy   : {legacy_time * 1e3:8.1f} ms total  {legacy_time / n * 1e6:8.1f} us/msg  symptoms found {legacy_hits}")
+    print(f"indexed  : {new_time * 1e3:8.1f} ms total  {new_time / n * 1e6:8.1f} us/msg  symptoms found {new_hits}")
+    print(f"speedup  : {legacy_time / new_time:.1f}x")
+    print(f"messages where indexed result covers legacy result: {superset}/{n}")
+
+
+if __name__ == "__main__":
+    main()
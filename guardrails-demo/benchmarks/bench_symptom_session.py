@@ -0,0 +1,87 @@
+"""
+ต้นทุนต่อเทิร์นของการสะสมอาการข้ามเทิร์น (symptom_session.py) เทียบกับการสแกนประวัติทั้งหมดใหม่ทุกเทิร์น
+(ดึงอาการจากทุกข้อความที่ผ่านมา + predict_disease_percent ทั้งตาราง) เมื่อแชตยาวขึ้นและตารางอาการใหญ่ขึ้น
+
+ทั้งสองแบบรวมการ serialize state เป็น JSON (เหมือนเก็บใน session store) และได้อาการชุดเดียวกันทุกเทิร์น
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_symptom_session.py [--turns 1000] [--scales 1,100]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+from bench_pipeline import scale_table  # noqa: E402
+from predict import extract_symptom_mentions, predict_disease_percent  # noqa: E402
+from symptom_session import split_negated, update_session_symptoms  # noqa: E402
+from symptom_table_cache import load_symptom_table  # noqa: E402
+
+
+def make_messages(known_symptoms, turns, seed):
+    """ข้อความละ 1-2 อาการ ราว 20% เป็นการบอกว่าอาการหนึ่งหายแล้ว"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(turns):
+        if rng.random() < 0.2:
+            messages.append(f"ไม่มี{rng.choice(known_symptoms)}แล้ว")
+        else:
+            messages.append(" ".join(rng.sample(known_symptoms, rng.randint(1, 2))))
+    return messages
+
+
+def incremental_turn(state_json, message, table, known_symptoms):
+    state = json.loads(state_json)
+    present, negated = split_negated(message, extract_symptom_mentions(message, known_symptoms))
+    accumulator = update_session_symptoms(state, table, "bench", present, negated)
+    ranking = accumulator.rank()
+    return json.dumps(state, ensure_ascii=False), accumulator.symptoms, ranking
+
+
+def rescan_turn(history, table, known_symptoms, disease_col):
+    symptoms = []
+    for message in history:
+        present, negated = split_negated(message, extract_symptom_mentions(message, known_symptoms))
+        symptoms = [s for s in symptoms if s not in negated] + [s for s in present if s not in symptoms]
+    return symptoms, predict_disease_percent(symptoms, table, disease_col) if symptoms else []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="./data/full_onehot_disease.csv")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--scales", default="1,100")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base, known_symptoms, disease_col = load_symptom_table(args.csv)
+    messages = make_messages(known_symptoms, args.turns, args.seed)
+    checkpoints = {t for t in (1, 10, 100, 500, 1000, 5000) if t <= args.turns} | {args.turns}
+
+    for factor in (int(x) for x in args.scales.split(",") if x.strip()):
+        table = scale_table(base, factor, 0.05, args.seed)
+        table.disease_profile()  # สร้างครั้งเดียวต่อฐานความรู้ (ในแอปสร้างตอน reload)
+        print(f"\n[table x{factor}: {table.matrix.shape[0]} rows] per-turn cost")
+        state_json = "{}"
+        for turn, message in enumerate(messages, 1):
+            start = time.perf_counter()
+            state_json, symptoms, _ = incremental_turn(state_json, message, table, known_symptoms)
+            incremental_us = (time.perf_counter() - start) * 1e6
+            if turn not in checkpoints:
+                continue
+            start = time.perf_counter()
+            rescanned, _ = rescan_turn(messages[:turn], table, known_symptoms, disease_col)
+            rescan_us = (time.perf_counter() - start) * 1e6
+            assert sorted(rescanned) == sorted(symptoms)
+            print(f"  turn {turn:>5}: incremental {incremental_us:9.1f} us   rescan history {rescan_us:11.1f} us"
+                  f"   ({len(symptoms)} symptoms)")
+
+
+if __name__ == "__main__":
+    main()
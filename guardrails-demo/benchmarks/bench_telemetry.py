@@ -0,0 +1,59 @@
+"""
+ต้นทุนของ telemetry: เวลาต่อ span (เปิด/ปิด) และผลต่อ analyze_symptoms ทั้งเทิร์น (ไม่มี LLM)
+
+รันจากโฟลเดอร์ guardrails-demo:
+    python benchmarks/bench_telemetry.py [--repeat 200000] [--messages 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("TYPHOON_API_KEY", "fake")
+
+import telemetry  # noqa: E402
+
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def empty_span():
+    with telemetry.span("bench"):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200000)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--json", default="./symptoms_data.json")
+    args = parser.parse_args()
+
+    import chatbot
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        phrases = [p for entry in json.load(f) for p in entry.get("อาการโดยสังเขป", [])]
+    messages = (phrases * (args.messages // max(1, len(phrases)) + 1))[:args.messages]
+    chatbot.analyze_symptoms(messages[0])  # โหลดตารางอาการก่อนวัด
+
+    def turn():
+        with telemetry.trace("bench"):
+            for message in messages:
+                chatbot.analyze_symptoms(message)
+
+    print(f"{'telemetry':>9} {'span(ns)':>9} {'analyze_symptoms(us/msg)':>25}")
+    for enabled in (False, True):
+        telemetry.set_enabled(enabled)
+        span_ns = per_call(empty_span, args.repeat) * 1e9
+        turn_us = per_call(turn, 3) / len(messages) * 1e6
+        print(f"{'on' if enabled else 'off':>9} {span_ns:>9.0f} {turn_us:>25.1f}")
+
+
+if __name__ == "__main__":
+    main()
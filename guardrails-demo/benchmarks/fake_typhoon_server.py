@@ -0,0 +1,127 @@
+"""
+เซิร์ฟเวอร์จำลอง OpenAI-compatible (/v1/chat/completions) สำหรับทดสอบโหลดโดยไม่เรียก Typhoon จริง
+
+ตอบ JSON/ข้อความตามชนิดของ prompt (AI1 / AI2 / AI3 / คำถามเรื่องโรค) พร้อมหน่วงเวลาตามที่กำหนด
+จำลองปัญหาตอนโหลดสูงได้ด้วย --error-rate (ตอบ 429 + Retry-After) และ --slow-rate / --slow-ms (หางยาว)
+
+    python benchmarks/fake_typhoon_server.py --port 8001 --latency-ms 300
+    TYPHOON_API_URL=http://127.0.0.1:8001/v1 TYPHOON_API_KEY=fake uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake Typhoon")
+app.state.latency_ms = 300.0
+app.state.error_rate = 0.0
+app.state.slow_rate = 0.0
+app.state.slow_ms = 3000.0
+app.state.requests = 0
+
+AI1_REPLY = {"consistency": "yes", "comment": "อาการที่แจ้งสอดคล้องกับโรคที่ระบบวิเคราะห์"}
+AI2_REPLY = {
+    "summary": "คุณมีอาการที่พบได้บ่อยในไข้หวัด",
+    "recommendation": "พักผ่อนให้เพียงพอ ดื่มน้ำมากๆ หากอาการแย่ลงควรพบแพทย์",
+}
+AI3_REPLY = (
+    "ขอให้คุณหายไวๆ นะคะ\n"
+    "• 💧 ดื่มน้ำสะอาดบ่อยๆ\n"
+    "• 😴 พักผ่อนให้เพียงพอ\n"
+    "• ⚠️ หากอาการไม่ดีขึ้นภายใน 2-3 วัน ควรพบแพทย์ค่ะ"
+)
+ANSWER_REPLY = {"answer": "โรคนี้ควรดูแลตัวเองด้วยการพักผ่อนและสังเกตอาการ หากไม่แน่ใจควรพบแพทย์ค่ะ"}
+
+
+def fake_content(prompt):
+    if "'consistency'" in prompt and "'summary'" in prompt:
+        return json.dumps({**AI1_REPLY, **AI2_REPLY}, ensure_ascii=False)
+    if "'consistency'" in prompt:
+        return json.dumps(AI1_REPLY, ensure_ascii=False)
+    if "'summary'" in prompt:
+        return json.dumps(AI2_REPLY, ensure_ascii=False)
+    if "ไม่ต้องตอบเป็น JSON" in prompt or "ไม่ต้องเป็น JSON" in prompt:
+        return AI3_REPLY
+    return json.dumps(ANSWER_REPLY, ensure_ascii=False)
+
+
+async def stream_chunks(body, content, chunk_chars=4):
+    """ส่ง SSE แบบ OpenAI: token แรกหลัง latency/4 ที่เหลือทยอยส่งจนครบ latency"""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)] or [""]
+    latency = app.state.latency_ms / 1000.0
+    await asyncio.sleep(latency / 4)
+    for piece in pieces:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(latency * 0.75 / len(pieces))
+    if (body.get("stream_options") or {}).get("include_usage"):
+        prompt = body["messages"][-1]["content"]
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [],
+            "usage": {"prompt_tokens": len(prompt) // 3, "completion_tokens": len(content) // 3,
+                      "total_tokens": (len(prompt) + len(content)) // 3},
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.requests += 1
+    if random.random() < app.state.error_rate:
+        return JSONResponse({"error": {"message": "rate limited", "type": "rate_limit_error"}}, status_code=429,
+                            headers={"Retry-After": "0.05"})
+    prompt = body["messages"][-1]["content"]
+    content = fake_content(prompt)
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(body, content), media_type="text/event-stream")
+    slow = random.random() < app.state.slow_rate
+    await asyncio.sleep((app.state.slow_ms if slow else app.state.latency_ms) / 1000.0)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": len(prompt) // 3, "completion_tokens": len(content) // 3,
+                  "total_tokens": (len(prompt) + len(content)) // 3},
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="สัดส่วนคำขอที่ตอบ 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="สัดส่วนคำขอที่ช้าผิดปกติ")
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    args = parser.parse_args()
+    app.state.latency_ms = args.latency_ms
+    app.state.error_rate = args.error_rate
+    app.state.slow_rate = args.slow_rate
+    app.state.slow_ms = args.slow_ms
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,70 @@
+"""
+ยิงแชตพร้อมกันหลาย session เข้า main.py เพื่อวัด throughput และ latency
+
+    python benchmarks/load_test_api.py --url http://127.0.0.1:8000 --sessions 300 --turns 3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+MESSAGES = [
+    "สวัสดีค่ะ",
+    "ปวดหัว มีไข้ ไอ มา 2 วันแล้ว",
+    "จาม น้ำมูกไหล คันตา",
+    "ปัสสาวะบ่อย กระหายน้ำ น้ำหนักลด",
+    "ขอบคุณค่ะ",
+]
+
+
+async def run_session(client, url, turns, latencies, errors):
+    session_id = None
+    for turn in range(turns):
+        message = MESSAGES[turn % len(MESSAGES)]
+        start = time.perf_counter()
+        try:
+            resp = await client.post(f"{url}/chat", json={"message": message, "session_id": session_id})
+            resp.raise_for_status()
+            session_id = resp.json()["session_id"]
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:  # noqa: BLE001
+            errors.append(repr(e))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(client, args.url, args.turns, latencies, errors)
+                               for _ in range(args.sessions)))
+        elapsed = time.perf_counter() - start
+
+    print(f"sessions {args.sessions} x turns {args.turns}: {len(latencies)} ok, {len(errors)} errors in {elapsed:.2f}s")
+    print(f"throughput {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(f"latency mean {statistics.mean(latencies) * 1e3:.0f} ms  p50 {percentile(latencies, 50) * 1e3:.0f} ms  "
+              f"p95 {percentile(latencies, 95) * 1e3:.0f} ms  p99 {percentile(latencies, 99) * 1e3:.0f} ms")
+    if errors:
+        print("first error:", errors[0])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
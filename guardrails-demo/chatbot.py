@@ -0,0 +1,729 @@
+# chatbot.py
+# แกนหลักของแชตบอท (ไม่ขึ้นกับ Streamlit) ใช้ร่วมกันระหว่าง app_streamlit.py และ main.py (FastAPI)
+# Guard / OpenAI client / ตารางอาการ / ข้อมูลโรค สร้างเมื่อใช้ครั้งแรก (ดู lazy_resources.py)
+from dotenv import load_dotenv
+import contextvars
+import os
+import random
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from predict import (
+    extract_symptom_mentions,
+    extract_symptoms_from_text,
+    predict_disease_percent
+)
+from response_cache import ResponseCache, make_key
+from single_flight import SingleFlight
+from symptom_session import clear_session_symptoms, retracted_last_turn, split_negated, update_session_symptoms
+from knowledge_base import KnowledgeBase, pinned, register_index
+from local_validation import guarded_llm_call
+from llm_client import DEFAULT_API_URL, DEFAULT_MODEL, LLMClient
+from intent_router import DISEASE, GREETING, HOW_ARE_YOU, MEDICATION, THANKS, IntentRouter
+from lazy_resources import lazy, warm_up, warm_up_in_background
+import telemetry
+from health_prompt_template import (
+    get_ai1_consistency_template,
+    get_ai2_summary_template,
+    get_ai12_fast_template,
+    get_ai3_doctor_reply_template,
+    get_skin_image_summary_template,
+    template_versions,
+)
+
+# โหลด .env
+load_dotenv()
+
+TYPHOON_API_KEY = os.getenv("TYPHOON_API_KEY")
+TYPHOON_API_URL = os.getenv("TYPHOON_API_URL", DEFAULT_API_URL)
+TYPHOON_MODEL = os.getenv("TYPHOON_MODEL", DEFAULT_MODEL)
+
+# ไคลเอนต์ LLM ตัวเดียวของทั้งโปรเซส (pool / timeout / retry / rate limit / hedging ตั้งค่าด้วย TYPHOON_* ดู llm_client.py)
+get_llm_client = lazy("llm_client", LLMClient.from_env)
+
+def get_client():
+    """OpenAI client (sync) ที่อยู่ใต้ LLMClient ตัวกลาง"""
+    return get_llm_client().client
+
+SYMPTOM_CSV = "./data/full_onehot_disease.csv"
+SYMPTOMS_JSON = "./symptoms_data.json"
+# ตารางอาการ (mmap) + ข้อมูลตัวอย่างอาการของแต่ละโรค เป็น snapshot ที่มีเวอร์ชัน เมื่อไฟล์ใดไฟล์หนึ่งเปลี่ยน
+# จะสร้างชุดใหม่ในเธรดพื้นหลังแล้วสลับทีเดียว คำขอที่ทำงานอยู่ใช้ชุดเดิมจนจบเทิร์น (ดู knowledge_base.py)
+get_knowledge_base = lazy("knowledge_base", lambda: KnowledgeBase(SYMPTOM_CSV, SYMPTOMS_JSON).start_watcher())
+
+def get_symptom_table():
+    """(symptom_table, known_symptoms, disease_col) ของ snapshot ที่ใช้อยู่"""
+    snapshot = get_knowledge_base().current()
+    return snapshot.symptom_table, snapshot.known_symptoms, snapshot.disease_col
+
+def get_known_diseases():
+    """รายชื่อโรค สำหรับตรวจชื่อโรคในข้อความ"""
+    return get_knowledge_base().current().known_diseases
+
+def get_knowledge():
+    """ข้อมูลตัวอย่างอาการของแต่ละโรค ใส่ prompt เฉพาะโรคที่ติดอันดับต้นๆ ภายในงบ token"""
+    return get_knowledge_base().current().knowledge
+
+def get_phrase_index():
+    return get_knowledge_base().current().index("phrase_index")
+
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "3"))
+KNOWLEDGE_TOKEN_BUDGET = int(os.getenv("KNOWLEDGE_TOKEN_BUDGET", "600"))
+# ประโยคตัวอย่างใน symptoms_data.json ที่ใกล้กับข้อความผู้ใช้ (phrase_index.py) ใช้เป็นสัญญาณเสริม:
+# - ดึงอาการไม่เจอเลย: ใช้อาการจากประโยคตัวอย่างที่ใกล้ที่สุดถ้า similarity >= PHRASE_EXTRACT_MIN_SCORE (0 = ปิด)
+# - จัดอันดับโรค: เรียงด้วย (1 - w) * เปอร์เซ็นต์จากตาราง + w * 100 * คะแนนโรคจากประโยคใกล้เคียง (w = PHRASE_RANK_WEIGHT)
+PHRASE_EXTRACT_MIN_SCORE = float(os.getenv("PHRASE_EXTRACT_MIN_SCORE", "0.5"))
+PHRASE_RANK_WEIGHT = float(os.getenv("PHRASE_RANK_WEIGHT", "0.3"))
+# สะสมอาการข้ามเทิร์นใน state ของ session (0 = วิเคราะห์ทีละข้อความแบบเดิม) ดู symptom_session.py
+SYMPTOM_ACCUMULATE = os.getenv("SYMPTOM_ACCUMULATE", "1") != "0"
+
+# ===== Guardrails หลายไฟล์ สำหรับแต่ละ AI
+GUARD_AI1_RAIL = "guardrails_spec_ai1.rail"
+GUARD_AI2_RAIL = "guardrails_spec_ai2.rail"
+GUARD_AI12_RAIL = "guardrails_spec_ai12.rail"
+GUARD_RAIL = "guardrails_spec.rail"
+
+def _load_guard(rail):
+    # import guardrails (หลายวินาที) ตอนสร้าง Guard ตัวแรกเท่านั้น
+    from guardrails import Guard
+    return Guard.from_rail(rail)
+
+get_guard_ai1 = lazy("guard_ai1", lambda: _load_guard(GUARD_AI1_RAIL))
+get_guard_ai2 = lazy("guard_ai2", lambda: _load_guard(GUARD_AI2_RAIL))
+get_guard_ai12 = lazy("guard_ai12", lambda: _load_guard(GUARD_AI12_RAIL))
+get_guard = lazy("guard", lambda: _load_guard(GUARD_RAIL))
+
+# ชื่อเดิมระดับโมดูล (chatbot.known_symptoms, chatbot.guard_ai1 ...) ยังใช้ได้ โหลดเมื่อถูกอ้างถึงครั้งแรก
+_LAZY_ATTRIBUTES = {
+    "client": get_client,
+    "symptom_table": lambda: get_symptom_table()[0],
+    "known_symptoms": lambda: get_symptom_table()[1],
+    "disease_col": lambda: get_symptom_table()[2],
+    "known_diseases": get_known_diseases,
+    "knowledge": get_knowledge,
+    "guard_ai1": get_guard_ai1,
+    "guard_ai2": get_guard_ai2,
+    "guard_ai12": get_guard_ai12,
+    "guard": get_guard,
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ===== พารามิเตอร์ LLM ของแต่ละขั้น
+AI1_PARAMS = {"model": TYPHOON_MODEL, "temperature": 0.2, "max_new_tokens": 256}
+AI2_PARAMS = {"model": TYPHOON_MODEL, "temperature": 0.2, "max_new_tokens": 512}
+AI3_PARAMS = {"model": TYPHOON_MODEL, "temperature": 0.2, "max_new_tokens": 512}
+DISEASE_INFO_PARAMS = {"model": TYPHOON_MODEL, "temperature": 0.3, "max_new_tokens": 512}
+
+# ===== คำขอที่ prompt และพารามิเตอร์เหมือนกันซึ่งรอ LLM อยู่พร้อมกันใช้การเรียกจริงครั้งเดียว (LLM_SINGLE_FLIGHT)
+llm_flight = SingleFlight.from_env()
+# ===== แคชผลลัพธ์ของ AI1 / AI2 / AI3 (ตั้งค่าด้วย RESPONSE_CACHE_SIZE / _TTL / _DB) ตอน miss ผ่าน llm_flight
+response_cache = ResponseCache.from_env(flight=llm_flight)
+# template คอมไพล์ครั้งเดียวตอน import แล้ว version (hash ของข้อความ) จึงคำนวณไว้แล้วเช่นกัน
+get_template_versions = template_versions
+
+# ===== โหมดการรันเชน AI1 -> AI2
+# sequential : AI1 เสร็จแล้วค่อยเริ่ม AI2 (แบบเดิม)
+# speculative: เริ่ม AI2 (ไม่มี ai1_comment) พร้อมกับ AI1 ถ้า AI1 ตอบว่าสอดคล้องก็ใช้ผลนั้นเลย ถ้าไม่ก็สั่ง AI2 ใหม่
+# fast       : รวม AI1+AI2 เป็นการเรียก LLM ครั้งเดียว
+CHAIN_MODES = ("sequential", "speculative", "fast")
+CHAIN_MODE = os.getenv("CHAIN_MODE", "sequential")
+# ===== warm-up: WARM_UP=1 โหลดทรัพยากรทั้งหมดตอนเริ่ม / background โหลดในเธรดแยก / ไม่ตั้ง = โหลดเมื่อใช้
+WARM_UP = os.getenv("WARM_UP", "")
+_warm_up_started = False
+
+def start_warm_up(mode=None):
+    """เรียกครั้งเดียวตอนแอปเริ่ม (เรียกซ้ำได้ เช่น Streamlit รันสคริปต์ใหม่ จะไม่ทำซ้ำ)"""
+    global _warm_up_started
+    mode = WARM_UP if mode is None else mode
+    if _warm_up_started or mode not in ("1", "true", "background"):
+        return None
+    _warm_up_started = True
+    if mode == "background":
+        return warm_up_in_background()
+    return warm_up()
+
+chain_pool = ThreadPoolExecutor(max_workers=int(os.getenv("CHAIN_WORKERS", "8")), thread_name_prefix="chain")
+
+# =========================
+# กลุ่มคำสนทนาทั่วไป
+# =========================
+THANK_WORDS = {"ขอบคุณ", "ขอบคุณค่ะ", "ขอบคุณครับ", "thank you", "ขอบใจ", "ซาบซึ้ง"}
+THANK_REPLIES = [
+    "ยินดีค่ะ 😊 หากมีอะไรให้ช่วยเหลือเพิ่มเติม แจ้งได้เลยนะคะ",
+    "ด้วยความยินดีนะคะ ดูแลสุขภาพด้วยค่ะ",
+    "ขอบคุณเช่นกันค่ะ หากมีคำถามเกี่ยวกับสุขภาพหรืออยากพูดคุยเพิ่มเติม สามารถทักมาได้ตลอดนะคะ",
+    "ขอบคุณที่พูดคุยกับดิฉันค่ะ ขอให้สุขภาพแข็งแรงนะคะ"
+]
+
+GENERAL_GREET_WORDS = {"สวัสดี", "hello", "hi", "ดีครับ", "ดีค่ะ"}
+GENERAL_GREET_REPLIES = [
+    "สวัสดีค่ะ ดิฉันเป็นผู้ช่วย AI ด้านสุขภาพเบื้องต้นของคุณ พร้อมให้คำแนะนำและดูแลสุขภาพคุณเสมอนะคะ หากมีอาการไม่สบายหรืออยากปรึกษาเรื่องสุขภาพ พิมพ์เข้ามาได้เลยค่ะ 💖",
+    "สวัสดีค่ะ ดิฉันคือ AI ผู้ช่วยดูแลสุขภาพเบื้องต้นค่ะ หากต้องการข้อมูลเกี่ยวกับสุขภาพหรือมีอาการที่อยากสอบถาม สามารถพูดคุยกับดิฉันได้ตลอดเวลานะคะ 😊",
+    "สวัสดีค่ะ ดิฉันเป็น AI ผู้ช่วยสุขภาพของคุณ พร้อมรับฟังและให้คำแนะนำสุขภาพเบื้องต้น หากมีข้อสงสัยหรืออยากพูดคุย สามารถสอบถามได้เลยค่ะ 💬",
+    "สวัสดีค่ะ ดิฉันเป็น AI ผู้ช่วยด้านสุขภาพ หากต้องการคำแนะนำหรือมีอาการที่ต้องการพูดคุย สามารถพิมพ์มาถามดิฉันได้เสมอค่ะ ดูแลสุขภาพด้วยนะคะ"
+]
+
+HOW_ARE_YOU_WORDS = {"สบายดีไหม", "how are you", "เป็นยังไงบ้าง"}
+HOW_ARE_YOU_REPLIES = [
+    "ขอบคุณที่ถามค่ะ ดิฉันเป็น AI ที่พร้อมช่วยเหลือเรื่องสุขภาพเสมอนะคะ 😊",
+    "ดิฉันสบายดีค่ะ และพร้อมดูแลสุขภาพของคุณเสมอค่ะ",
+    "ขอบคุณที่ทักมาถามนะคะ มีอะไรอยากปรึกษาเกี่ยวกับสุขภาพไหมคะ"
+]
+
+MEDICATION_WORDS = {"ยา", "แนะนำยา"}
+MEDICATION_REPLY = "ขออภัยค่ะ ดิฉันไม่สามารถแนะนำหรือสั่งยาได้ หากมีอาการผิดปกติควรปรึกษาเภสัชกรหรือแพทย์โดยตรงนะคะ"
+NO_SYMPTOM_REPLY = "ขออภัยค่ะ ดิฉันไม่เข้าใจอาการที่ระบุ กรุณาพิมพ์อาการให้ชัดเจน เช่น ปวดหัว มีไข้ ไอ หรืออื่นๆ"
+SYMPTOMS_CLEARED_REPLY = "รับทราบค่ะ ตอนนี้ไม่มีอาการที่บันทึกไว้แล้ว หากมีอาการอื่นพิมพ์บอกได้เลยนะคะ"
+DISEASE_INFO_FALLBACK = "ขออภัยค่ะ ดิฉันไม่สามารถให้ข้อมูลได้ในขณะนี้ หากมีอาการผิดปกติควรปรึกษาแพทย์นะคะ"
+
+def load_json_file(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def convert_json_to_str(json_data):
+    # ใช้ json.dumps() เพื่อแปลงข้อมูลทุกอย่างใน JSON เป็น string
+    return json.dumps(json_data, ensure_ascii=False)
+
+def format_ai3_bullet(text):
+    lines = text.split('\n')
+    new_lines = []
+    for i, line in enumerate(lines):
+        if line.strip().startswith('•'):
+            if i > 0 and lines[i-1].strip() != '':
+                new_lines.append('')  # เพิ่มบรรทัดว่างระหว่าง bullet
+        new_lines.append(line)
+    return '\n'.join(new_lines)
+
+class BulletStreamFormatter:
+    """
+    format_ai3_bullet แบบทีละ chunk สำหรับคำตอบที่สตรีมมา
+
+    ป้อนข้อความด้วย feed() แล้วปิดท้ายด้วย flush() ผลรวมที่ได้เท่ากับ format_ai3_bullet(ข้อความเต็ม)
+    (และ .strip() ด้วยถ้า strip=True) โดยกักข้อความไว้เฉพาะช่องว่างต้นบรรทัดที่ยังตัดสินไม่ได้
+    """
+
+    def __init__(self, strip=False):
+        self.strip = strip
+        self._pending = ""        # ช่องว่างต้นบรรทัดที่ยังไม่รู้ว่าบรรทัดนี้เป็น bullet หรือไม่
+        self._line_start = True
+        self._line_index = 0
+        self._line_has_text = False
+        self._prev_has_text = False
+        self._started = False      # ส่งตัวอักษรที่ไม่ใช่ช่องว่างออกไปแล้วหรือยัง (ใช้ตอน strip)
+        self._trailing = ""        # ช่องว่างท้ายข้อความที่กักไว้ (ใช้ตอน strip)
+
+    def _emit(self, text, out):
+        if not self.strip:
+            out.append(text)
+            return
+        for ch in text:
+            if ch.isspace():
+                if self._started:
+                    self._trailing += ch
+            else:
+                self._started = True
+                out.append(self._trailing)
+                out.append(ch)
+                self._trailing = ""
+
+    def feed(self, chunk):
+        out = []
+        for ch in chunk:
+            if ch == "\n":
+                if self._pending:
+                    self._emit(self._pending, out)
+                    self._pending = ""
+                self._emit("\n", out)
+                self._prev_has_text = self._line_has_text
+                self._line_has_text = False
+                self._line_start = True
+                self._line_index += 1
+            elif self._line_start:
+                if ch.isspace():
+                    self._pending += ch
+                    continue
+                if ch == "•" and self._line_index > 0 and self._prev_has_text:
+                    self._emit("\n", out)  # เพิ่มบรรทัดว่างระหว่าง bullet
+                self._emit(self._pending + ch, out)
+                self._pending = ""
+                self._line_start = False
+                self._line_has_text = True
+            else:
+                if not ch.isspace():
+                    self._line_has_text = True
+                self._emit(ch, out)
+        return "".join(out)
+
+    def flush(self):
+        out = []
+        if self._pending:
+            self._emit(self._pending, out)
+            self._pending = ""
+        return "".join(out)
+
+def format_ai3_bullet_stream(chunks, strip=False):
+    formatter = BulletStreamFormatter(strip=strip)
+    for chunk in chunks:
+        text = formatter.feed(chunk)
+        if text:
+            yield text
+    tail = formatter.flush()
+    if tail:
+        yield tail
+
+# =========================
+def typhoon_wrapper(prompt, **kwargs):
+    return get_llm_client().complete(prompt, **kwargs)
+
+def typhoon_wrapper_stream(prompt, **kwargs):
+    """เหมือน typhoon_wrapper แต่คืนข้อความทีละส่วน (delta) ทันทีที่มาถึง"""
+    yield from get_llm_client().stream(prompt, **kwargs)
+
+# ================= สร้าง prompt (ใช้ร่วมกันทั้งแบบ sync และ async) =================
+def format_predicted_diseases(predicted_diseases):
+    return "\n".join([f"{i+1}. {d} {p}% (จาก {m} อาการ)" for i, (d, p, m) in enumerate(predicted_diseases)])
+
+def build_consistency_prompt(user_symptoms, predicted_diseases, json_data):
+    return get_ai1_consistency_template().format(
+        user_symptoms=", ".join(user_symptoms),
+        predicted_diseases=format_predicted_diseases(predicted_diseases),
+        json_data=json_data
+    )
+
+def build_summary_prompt(user_symptoms, predicted_diseases, ai1_comment):
+    return get_ai2_summary_template().format(
+        user_symptoms=", ".join(user_symptoms),
+        predicted_diseases=format_predicted_diseases(predicted_diseases),
+        ai1_comment=ai1_comment or "-"
+    )
+
+def build_fast_prompt(user_symptoms, predicted_diseases, json_data):
+    return get_ai12_fast_template().format(
+        user_symptoms=", ".join(user_symptoms),
+        predicted_diseases=format_predicted_diseases(predicted_diseases),
+        json_data=json_data
+    )
+
+def split_fast_output(output):
+    """แยกผลของโหมด fast เป็น (ai1_res, ai2_res) รูปแบบเดียวกับการเรียกแยก"""
+    output = output or {}
+    ai1_res = {k: output[k] for k in ("consistency", "comment") if k in output}
+    ai2_res = {k: output[k] for k in ("summary", "recommendation") if k in output}
+    return ai1_res, ai2_res
+
+def ai1_is_consistent(ai1_res):
+    return str(ai1_res.get("consistency", "")).strip().lower() == "yes"
+
+def build_doctor_reply_prompt(ai2_summary, ai2_recommendation):
+    return get_ai3_doctor_reply_template().format(
+        ai2_summary=ai2_summary or "-",
+        ai2_recommendation=ai2_recommendation or "-"
+    )
+
+def build_skin_doctor_reply_prompt(image_class, confidence, ai2_summary, ai2_recommendation):
+    return get_skin_image_summary_template().format(
+        image_class=f"{image_class} (ความมั่นใจ {confidence:.1%})",
+        ai2_summary=ai2_summary,
+        ai2_recommendation=ai2_recommendation
+    )
+
+def build_disease_info_prompt(disease):
+    return f"ผู้ใช้แจ้งว่าตนเองอาจเป็น '{disease}'. กรุณาให้คำแนะนำเบื้องต้นเกี่ยวกับโรคนี้ (โดยไม่วินิจฉัย ไม่สั่งยา) และเน้นให้พบแพทย์หากไม่แน่ใจอาการ"
+
+def disease_info_answer(output):
+    if output and isinstance(output, dict):
+        answer = output.get("answer")
+        if answer:
+            return answer.strip()
+    return DISEASE_INFO_FALLBACK
+
+# ================= คีย์แคช =================
+# อาการเรียงลำดับก่อน (ลำดับที่ผู้ใช้พิมพ์ไม่ควรทำให้ได้คีย์ต่างกัน) อันดับโรคใช้ทั้งชื่อ % และจำนวนอาการ
+def consistency_cache_key(user_symptoms, predicted_diseases, json_file):
+    return make_key("ai1", get_template_versions()["ai1"], sorted(user_symptoms), predicted_diseases, AI1_PARAMS, json_file)
+
+def summary_cache_key(user_symptoms, predicted_diseases, ai1_comment):
+    return make_key("ai2", get_template_versions()["ai2"], sorted(user_symptoms), predicted_diseases, AI2_PARAMS, ai1_comment or "")
+
+def fast_cache_key(user_symptoms, predicted_diseases, json_file):
+    return make_key("ai12", get_template_versions()["ai12"], sorted(user_symptoms), predicted_diseases, AI2_PARAMS, json_file)
+
+def doctor_reply_cache_key(ai2_summary, ai2_recommendation):
+    return make_key("ai3", get_template_versions()["ai3"], ai2_summary or "", ai2_recommendation or "", AI3_PARAMS)
+
+# คำตอบเรื่องโรคไม่เก็บแคช แต่คำขอที่ถามโรคเดียวกันพร้อมกันใช้การเรียกครั้งเดียวกันได้
+def disease_info_key(prompt):
+    return make_key("disease_info", prompt, DISEASE_INFO_PARAMS)
+
+# ================= AI 3 CHAIN =================
+def ai_chain_consistency(user_symptoms, predicted_diseases, llm_api, json_file):
+    return response_cache.call(consistency_cache_key(user_symptoms, predicted_diseases, json_file),
+                               _ai_chain_consistency, user_symptoms, predicted_diseases, llm_api, json_file)
+
+def _ai_chain_consistency(user_symptoms, predicted_diseases, llm_api, json_file):
+    prompt = build_consistency_prompt(user_symptoms, predicted_diseases, json_file)
+    return guarded_llm_call(GUARD_AI1_RAIL, get_guard_ai1, prompt, llm_api, AI1_PARAMS)
+
+def ai_chain_summary(user_symptoms, predicted_diseases, ai1_comment, llm_api):
+    return response_cache.call(summary_cache_key(user_symptoms, predicted_diseases, ai1_comment),
+                               _ai_chain_summary, user_symptoms, predicted_diseases, ai1_comment, llm_api)
+
+def _ai_chain_summary(user_symptoms, predicted_diseases, ai1_comment, llm_api):
+    prompt = build_summary_prompt(user_symptoms, predicted_diseases, ai1_comment)
+    return guarded_llm_call(GUARD_AI2_RAIL, get_guard_ai2, prompt, llm_api, AI2_PARAMS)
+
+def ai_chain_fast(user_symptoms, predicted_diseases, llm_api, json_file):
+    output = response_cache.call(fast_cache_key(user_symptoms, predicted_diseases, json_file),
+                                 _ai_chain_fast, user_symptoms, predicted_diseases, llm_api, json_file)
+    return split_fast_output(output)
+
+def _ai_chain_fast(user_symptoms, predicted_diseases, llm_api, json_file):
+    prompt = build_fast_prompt(user_symptoms, predicted_diseases, json_file)
+    return guarded_llm_call(GUARD_AI12_RAIL, get_guard_ai12, prompt, llm_api, AI2_PARAMS)
+
+def ai_chain_doctor_reply(ai2_summary, ai2_recommendation, llm_api):
+    return response_cache.call(doctor_reply_cache_key(ai2_summary, ai2_recommendation),
+                               _ai_chain_doctor_reply, ai2_summary, ai2_recommendation, llm_api)
+
+def _ai_chain_doctor_reply(ai2_summary, ai2_recommendation, llm_api):
+    prompt = build_doctor_reply_prompt(ai2_summary, ai2_recommendation)
+    response = llm_api(prompt, **AI3_PARAMS)
+    return response
+
+def ai_chain_doctor_reply_stream(ai2_summary, ai2_recommendation, llm_stream_api):
+    yield from response_cache.stream(doctor_reply_cache_key(ai2_summary, ai2_recommendation),
+                                     _ai_chain_doctor_reply_stream, ai2_summary, ai2_recommendation, llm_stream_api)
+
+def _ai_chain_doctor_reply_stream(ai2_summary, ai2_recommendation, llm_stream_api):
+    prompt = build_doctor_reply_prompt(ai2_summary, ai2_recommendation)
+    yield from llm_stream_api(prompt, **AI3_PARAMS)
+
+# ================= NEW: AI CHAIN FOR SKIN DISEASE =================
+def ai_chain_skin_summary(image_class, confidence, llm_api):
+    """สร้างสรุปและคำแนะนำเบื้องต้นสำหรับการวิเคราะห์ภาพผิวหนัง"""
+    if image_class == "Abnormal(Ulcer)":
+        ai2_summary = f"จากการวิเคราะห์ภาพ พบลักษณะผิดปกติที่อาจเป็นแผลหรือรอยโรคผิวหนัง (ความมั่นใจ {confidence:.1%})"
+        ai2_recommendation = "ควรปรึกษาแพทย์ผิวหนังเพื่อรับการตรวจและรักษาที่เหมาะสม"
+    else:  # Normal(Healthy skin)
+        ai2_summary = f"จากการวิเคราะห์ภาพ ผิวหนังดูปกติ (ความมั่นใจ {confidence:.1%})"
+        ai2_recommendation = "ควรดูแลรักษาความสะอาดและความชุ่มชื้นของผิวหนังต่อไป"
+
+    return ai2_summary, ai2_recommendation
+
+def ai_chain_skin_doctor_reply(image_class, confidence, llm_api):
+    """สร้างคำตอบจากหมอสำหรับการวิเคราะห์ภาพผิวหนัง"""
+    ai2_summary, ai2_recommendation = ai_chain_skin_summary(image_class, confidence, llm_api)
+    prompt = build_skin_doctor_reply_prompt(image_class, confidence, ai2_summary, ai2_recommendation)
+    response = llm_api(prompt, **AI3_PARAMS)
+    return response
+
+def ai_chain_skin_doctor_reply_stream(image_class, confidence, llm_stream_api):
+    ai2_summary, ai2_recommendation = ai_chain_skin_summary(image_class, confidence, llm_stream_api)
+    prompt = build_skin_doctor_reply_prompt(image_class, confidence, ai2_summary, ai2_recommendation)
+    yield from llm_stream_api(prompt, **AI3_PARAMS)
+
+# =========================
+# แยกประเภทข้อความ (ลำดับความสำคัญเดียวกับเดิม)
+# คำทุกหมวดและชื่อโรครวมใน automaton ตัวเดียว สร้างใหม่พร้อมกับฐานความรู้ทุกชุด (ใช้รายชื่อโรคจากตารางอาการ)
+register_index("intent_router", lambda snapshot: IntentRouter(
+    THANK_WORDS, HOW_ARE_YOU_WORDS, GENERAL_GREET_WORDS, MEDICATION_WORDS, snapshot.known_diseases
+))
+
+def get_intent_router():
+    return get_knowledge_base().current().index("intent_router")
+
+def classify_message(user_message, greeted=False):
+    """
+    คืน (intent, payload)
+    intent: "reply" (payload = คำตอบสำเร็จรูป), "disease" (payload = ชื่อโรค), "symptoms"
+    """
+    intent, disease = get_intent_router().route(user_message, greeted)
+    if intent == THANKS:
+        return "reply", random.choice(THANK_REPLIES)
+    if intent == HOW_ARE_YOU:
+        return "reply", random.choice(HOW_ARE_YOU_REPLIES)
+    if intent == DISEASE:
+        return "disease", disease
+    if intent == GREETING:
+        return "reply", random.choice(GENERAL_GREET_REPLIES)
+    if intent == MEDICATION:
+        return "reply", MEDICATION_REPLY
+    return "symptoms", None
+
+def analyze_symptoms(user_message, n_results=1, state=None):
+    """
+    คืน (matched_symptoms, results, context_diseases) หรือ ([], [], []) ถ้าไม่พบอาการ
+    results คือโรคที่แสดงผล context_diseases คือโรค KNOWLEDGE_TOP_K อันดับแรกสำหรับดึงข้อมูลใส่ prompt
+
+    ส่ง state (dict ของ session) มาด้วยเพื่อสะสมอาการข้ามเทิร์น: matched_symptoms คืออาการสะสมทั้งหมด
+    และอาการที่ผู้ใช้ปฏิเสธ ("ไม่มีไข้แล้ว") ถูกถอนออก วิเคราะห์เฉพาะเทิร์นที่บอกอาการหรือถอนอาการ
+    ข้อความที่ไม่มีอาการ ("โอเคค่ะ") ได้ ([], [], []) เหมือนเดิม ไม่ใช่ผลวิเคราะห์อาการสะสมซ้ำ
+    อาการจากประโยคตัวอย่างที่ใกล้ที่สุด (ผู้ใช้ไม่ได้พิมพ์เอง) ใช้จัดอันดับเฉพาะเทิร์นนี้ ไม่เก็บลง session
+    """
+    symptom_table, known_symptoms, disease_col = get_symptom_table()
+    negated = []
+    with telemetry.span("extract_symptoms"):
+        if state is None:
+            matched_symptoms = extract_symptoms_from_text(user_message, known_symptoms)
+        else:
+            matched_symptoms, negated = split_negated(
+                user_message, extract_symptom_mentions(user_message, known_symptoms))
+    phrase_symptoms = []
+    if not matched_symptoms and not negated and PHRASE_EXTRACT_MIN_SCORE > 0:
+        with telemetry.span("phrase_match"):
+            phrase_symptoms = symptoms_from_similar_phrase(user_message, known_symptoms)
+    accumulator = None
+    if state is None:
+        matched_symptoms = matched_symptoms or phrase_symptoms
+    else:
+        with telemetry.span("accumulate_symptoms"):
+            accumulator = update_session_symptoms(state, symptom_table, get_knowledge_base().current().version,
+                                                  matched_symptoms, negated)
+            if not (matched_symptoms or phrase_symptoms or retracted_last_turn(state)):
+                return [], [], []
+            if phrase_symptoms:
+                accumulator = accumulator.with_symptoms(phrase_symptoms)
+            matched_symptoms = list(accumulator.symptoms)
+    if not matched_symptoms:
+        return [], [], []
+    n_show = 3 if n_results < 1 else n_results
+    phrase_scores = {}
+    if PHRASE_RANK_WEIGHT > 0:
+        # สะสมอาการอยู่ เทียบประโยคตัวอย่างกับอาการทั้งหมดที่มี ไม่ใช่แค่ข้อความล่าสุด
+        phrase_query = user_message if accumulator is None else " ".join(matched_symptoms)
+        with telemetry.span("phrase_match"):
+            phrase_scores = get_phrase_index().disease_scores(phrase_query)
+    top_k = max(n_show, KNOWLEDGE_TOP_K)
+    with telemetry.span("predict_disease"):
+        # มีคะแนนจากประโยคตัวอย่าง ต้องจัดอันดับใหม่จากทุกโรค (โรคนอก top-k ของตารางอาจขึ้นมาได้)
+        if accumulator is not None:
+            ranking = accumulator.rank(top_k=None if phrase_scores else top_k)
+        else:
+            ranking = predict_disease_percent(matched_symptoms, symptom_table, disease_col,
+                                              top_k=None if phrase_scores else top_k)
+        if phrase_scores:
+            ranking = rerank_with_phrases(ranking, phrase_scores, PHRASE_RANK_WEIGHT)[:top_k]
+    context_diseases = [d for d, _, _ in ranking[:KNOWLEDGE_TOP_K]]
+    return matched_symptoms, ranking[:n_show], context_diseases
+
+def no_symptom_reply(state=None):
+    """ไม่มีอาการให้วิเคราะห์: ถ้าเพิ่งถอนอาการสุดท้ายออก ตอบรับทราบแทนการบอกว่าไม่เข้าใจ"""
+    return SYMPTOMS_CLEARED_REPLY if retracted_last_turn(state) else NO_SYMPTOM_REPLY
+
+def session_state_for_symptoms(state, reset=False):
+    """state ที่ใช้สะสมอาการ (None ถ้าปิด SYMPTOM_ACCUMULATE) reset=True ล้างอาการที่สะสมไว้ก่อน"""
+    if reset:
+        clear_session_symptoms(state)
+    return state if SYMPTOM_ACCUMULATE else None
+
+def symptoms_from_similar_phrase(user_message, known_symptoms):
+    """อาการจากประโยคตัวอย่างที่ใกล้ที่สุด (เมื่อดึงอาการจากข้อความผู้ใช้ตรงๆ ไม่ได้)"""
+    hits = get_phrase_index().search(user_message, k=1, min_score=PHRASE_EXTRACT_MIN_SCORE)
+    if not hits:
+        return []
+    phrase, disease, score = hits[0]
+    telemetry.annotate(phrase=phrase, score=score)
+    return extract_symptoms_from_text(phrase, known_symptoms)
+
+def rerank_with_phrases(ranking, phrase_scores, weight):
+    """เรียง [(โรค, เปอร์เซ็นต์, จำนวนอาการ)] ใหม่ด้วยคะแนนผสม (เปอร์เซ็นต์ที่แสดงยังเป็นค่าจากตาราง)"""
+    return sorted(ranking, key=lambda r: (1 - weight) * r[1] + weight * 100 * phrase_scores.get(r[0], 0.0),
+                  reverse=True)
+
+def knowledge_context_for(results, context_diseases=None):
+    """สตริง JSON ของข้อมูลโรคที่ใส่ใน prompt AI1 (ค่าเริ่มต้นใช้โรคใน results)"""
+    diseases = context_diseases if context_diseases is not None else [d for d, _, _ in results]
+    with telemetry.span("knowledge_context"):
+        return get_knowledge().context_for(diseases, KNOWLEDGE_TOKEN_BUDGET)
+
+def timed(timings, key, fn, *args):
+    """เรียก fn(*args) แล้วบันทึกเวลาที่ใช้ (วินาที) ลง timings[key] และเป็น span ชื่อ key"""
+    start = time.perf_counter()
+    try:
+        with telemetry.span(key):
+            return fn(*args)
+    finally:
+        timings[key] = round(time.perf_counter() - start, 4)
+
+class SpeculationCancelled(BaseException):
+    """
+    AI2 ที่เดาไว้ถูกยกเลิกก่อนยิงคำขอไป LLM (BaseException แบบเดียวกับ asyncio.CancelledError:
+    แคชไม่เก็บผล และคำขออื่นที่รอการเรียกเดียวกันใน single-flight จะเรียกใหม่เองแทนการรับ error นี้)
+    """
+
+
+class Speculation:
+    """
+    llm_api ของ AI2 ที่เริ่มล่วงหน้าในโหมด speculative ยกเลิกได้จนกว่าจะยิงคำขอ
+    (Future ที่เริ่มรันแล้ว cancel() ไม่ได้ และการเรียก HTTP แบบ sync ที่ยิงไปแล้วหยุดไม่ได้)
+    """
+
+    def __init__(self, llm_api):
+        self._llm_api = llm_api
+        self._lock = threading.Lock()
+        self.cancelled = False
+        self.issued = False
+
+    def __call__(self, prompt, **kwargs):
+        with self._lock:
+            if self.cancelled:
+                raise SpeculationCancelled()
+            self.issued = True
+        return self._llm_api(prompt, **kwargs)
+
+    def cancel(self):
+        """คืน True ถ้ายกเลิกทันก่อนยิงคำขอ (ได้ผลจากแคช / รอการเรียกของคำขออื่น ก็ไม่นับว่าเสีย)"""
+        with self._lock:
+            self.cancelled = True
+            return not self.issued
+
+
+def record_speculation(result):
+    telemetry.inc("speculation_total", 1, "ผลการเดา AI2 ในโหมด speculative (miss_wasted = ยิง LLM ไปแล้วทิ้งผล)",
+                  result=result)
+    telemetry.annotate(speculation=result)
+
+
+def run_symptom_analysis(matched_symptoms, results, llm_api, mode=None, timings=None, context_diseases=None):
+    """
+    รัน AI1 -> AI2 ตามโหมดที่เลือก คืน (ai1_res, ai2_res)
+    เวลาแต่ละขั้นเก็บลง timings (ai1, ai2, ai2_reissue หรือ ai12) พร้อมผลการเดา (speculation hit/miss)
+    """
+    mode = mode or CHAIN_MODE
+    if mode not in CHAIN_MODES:
+        raise ValueError(f"ไม่รู้จักโหมด {mode!r} (ใช้ได้: {', '.join(CHAIN_MODES)})")
+    timings = {} if timings is None else timings
+    timings["mode"] = mode
+
+    json_data_str = knowledge_context_for(results, context_diseases)
+
+    if mode == "fast":
+        return timed(timings, "ai12", ai_chain_fast, matched_symptoms, results, llm_api, json_data_str)
+
+    if mode == "speculative":
+        # copy_context: span ของ AI2 ที่รันใน chain_pool ยังอยู่ใน trace ของคำขอนี้
+        speculation = Speculation(llm_api)
+        speculative = chain_pool.submit(contextvars.copy_context().run, timed, timings, "ai2", ai_chain_summary,
+                                        matched_symptoms, results, "", speculation)
+        try:
+            ai1_res = timed(timings, "ai1", ai_chain_consistency, matched_symptoms, results, llm_api, json_data_str)
+        except BaseException:
+            speculation.cancel()
+            speculative.cancel()
+            raise
+        if ai1_is_consistent(ai1_res):
+            timings["speculation"] = "hit"
+            record_speculation("hit")
+            return ai1_res, speculative.result()
+        # AI1 เห็นว่าไม่สอดคล้อง ความเห็นของ AI1 สำคัญต่อคำสรุป จึงสั่ง AI2 ใหม่พร้อม comment
+        # ถ้า AI2 ที่เดาไว้ยิงคำขอไปแล้วจะรันจนจบใน chain_pool (หยุดไม่ได้) นับเป็น miss_wasted
+        saved = speculation.cancel()
+        speculative.cancel()
+        timings["speculation"] = "miss"
+        record_speculation("miss_not_sent" if saved else "miss_wasted")
+        ai2_res = timed(timings, "ai2_reissue", ai_chain_summary, matched_symptoms, results, ai1_res.get('comment', ''), llm_api)
+        return ai1_res, ai2_res
+
+    ai1_res = timed(timings, "ai1", ai_chain_consistency, matched_symptoms, results, llm_api, json_data_str)
+    ai1_comment = ai1_res.get('comment', '')
+
+    ai2_res = timed(timings, "ai2", ai_chain_summary, matched_symptoms, results, ai1_comment, llm_api)
+    return ai1_res, ai2_res
+
+def store_chain_state(state, ai1_res, ai2_res, ai3_reply, timings=None):
+    if state is not None:
+        state["ai1_res"] = ai1_res
+        state["ai2_res"] = ai2_res
+        state["ai3_reply"] = ai3_reply
+        if timings is not None:
+            state["timings"] = timings
+        trace = telemetry.current_trace()
+        if trace is not None:
+            state["trace"] = trace.to_dict()
+
+def answer_without_chain(intent, payload, llm_api):
+    """คำตอบของ intent "reply" (คำตอบสำเร็จรูป) / "disease" (ถามข้อมูลโรค) จากผลของ classify_message"""
+    if intent == "reply":
+        return payload
+    prompt = build_disease_info_prompt(payload)
+    with telemetry.span("disease_info"):
+        output = llm_flight.call(disease_info_key(prompt), guarded_llm_call, GUARD_RAIL, get_guard, prompt,
+                                 llm_api, DISEASE_INFO_PARAMS)
+    return disease_info_answer(output)
+
+# ฟังก์ชันการถามบอท
+@telemetry.traced("chat")
+@pinned(get_knowledge_base)
+def ask_bot_streamlit(user_message, n_results=1, greeted=False, state=None, llm_api=typhoon_wrapper, mode=None,
+                      reset=False):
+    """
+    ตอบข้อความผู้ใช้หนึ่งข้อความ
+
+    Args:
+        state: dict-like (เช่น st.session_state) สำหรับเก็บผลลัพธ์ระหว่างทาง ai1_res / ai2_res / ai3_reply / timings
+            และอาการที่สะสมข้ามเทิร์น
+        mode: โหมดรันเชน sequential / speculative / fast (ค่าเริ่มต้นจาก CHAIN_MODE)
+        reset: ล้างอาการที่สะสมไว้ก่อนตอบ (เริ่มเล่าอาการใหม่)
+    """
+    symptom_state = session_state_for_symptoms(state, reset)
+    intent, payload = classify_message(user_message, greeted)
+    if intent != "symptoms":
+        return answer_without_chain(intent, payload, llm_api)
+
+    matched_symptoms, results, context_diseases = analyze_symptoms(user_message, n_results, symptom_state)
+    if not matched_symptoms:
+        return no_symptom_reply(symptom_state)
+
+    start = time.perf_counter()
+    timings = {}
+    ai1_res, ai2_res = run_symptom_analysis(matched_symptoms, results, llm_api, mode, timings, context_diseases)
+    ai2_summary = ai2_res.get('summary', '')
+    ai2_recommendation = ai2_res.get('recommendation', '')
+
+    ai3_reply = timed(timings, "ai3", ai_chain_doctor_reply, ai2_summary, ai2_recommendation, llm_api)
+    ai3_reply = format_ai3_bullet(ai3_reply)
+    timings["total"] = round(time.perf_counter() - start, 4)
+
+    store_chain_state(state, ai1_res, ai2_res, ai3_reply, timings)
+
+    return ai3_reply.strip()
+
+@telemetry.traced("chat_stream")
+@pinned(get_knowledge_base)
+def ask_bot_streamlit_stream(user_message, n_results=1, greeted=False, state=None,
+                             llm_api=typhoon_wrapper, llm_stream_api=typhoon_wrapper_stream, mode=None, reset=False):
+    """
+    เหมือน ask_bot_streamlit แต่คืน generator ของข้อความ
+    คำตอบสำเร็จรูปและคำตอบเรื่องโรคส่งออกครั้งเดียว ส่วนคำตอบ AI3 สตรีมทีละ token
+    """
+    symptom_state = session_state_for_symptoms(state, reset)
+    intent, payload = classify_message(user_message, greeted)
+    if intent != "symptoms":
+        yield answer_without_chain(intent, payload, llm_api)
+        return
+
+    matched_symptoms, results, context_diseases = analyze_symptoms(user_message, n_results, symptom_state)
+    if not matched_symptoms:
+        yield no_symptom_reply(symptom_state)
+        return
+
+    start = time.perf_counter()
+    timings = {}
+    ai1_res, ai2_res = run_symptom_analysis(matched_symptoms, results, llm_api, mode, timings, context_diseases)
+    stream = ai_chain_doctor_reply_stream(ai2_res.get('summary', ''), ai2_res.get('recommendation', ''), llm_stream_api)
+    ai3_start = time.perf_counter()
+    parts = []
+    for text in format_ai3_bullet_stream(stream, strip=True):
+        if not parts:
+            timings["first_token"] = round(time.perf_counter() - start, 4)
+        parts.append(text)
+        yield text
+    timings["ai3"] = round(time.perf_counter() - ai3_start, 4)
+    timings["total"] = round(time.perf_counter() - start, 4)
+
+    store_chain_state(state, ai1_res, ai2_res, "".join(parts), timings)
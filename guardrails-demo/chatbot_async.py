@@ -0,0 +1,261 @@
+# chatbot_async.py
+# ไปป์ไลน์แชตบอทแบบ asyncio สำหรับ main.py (FastAPI) ใช้ AsyncOpenAI + AsyncGuard
+# ตรรกะการแยกข้อความ การสร้าง prompt และตารางอาการใช้ร่วมกับ chatbot.py
+import asyncio
+import time
+
+from chatbot import (
+    get_llm_client,
+    get_knowledge_base,
+    GUARD_AI1_RAIL,
+    GUARD_AI2_RAIL,
+    GUARD_AI12_RAIL,
+    CHAIN_MODES,
+    CHAIN_MODE,
+    GUARD_RAIL,
+    AI1_PARAMS,
+    AI2_PARAMS,
+    AI3_PARAMS,
+    DISEASE_INFO_PARAMS,
+    format_ai3_bullet,
+    BulletStreamFormatter,
+    build_consistency_prompt,
+    build_summary_prompt,
+    build_fast_prompt,
+    split_fast_output,
+    ai1_is_consistent,
+    build_doctor_reply_prompt,
+    build_disease_info_prompt,
+    disease_info_answer,
+    classify_message,
+    analyze_symptoms,
+    no_symptom_reply,
+    session_state_for_symptoms,
+    knowledge_context_for,
+    store_chain_state,
+    response_cache,
+    llm_flight,
+    record_speculation,
+    consistency_cache_key,
+    summary_cache_key,
+    fast_cache_key,
+    doctor_reply_cache_key,
+    disease_info_key,
+)
+from knowledge_base import pinned
+from lazy_resources import lazy
+import telemetry
+from local_validation import guarded_llm_call_async
+
+def _load_async_guard(rail):
+    from guardrails import AsyncGuard
+    return AsyncGuard.from_rail(rail)
+
+get_async_guard_ai1 = lazy("async_guard_ai1", lambda: _load_async_guard(GUARD_AI1_RAIL))
+get_async_guard_ai2 = lazy("async_guard_ai2", lambda: _load_async_guard(GUARD_AI2_RAIL))
+get_async_guard_ai12 = lazy("async_guard_ai12", lambda: _load_async_guard(GUARD_AI12_RAIL))
+get_async_guard = lazy("async_guard", lambda: _load_async_guard(GUARD_RAIL))
+
+
+def get_async_client():
+    """AsyncOpenAI client ที่อยู่ใต้ LLMClient ตัวกลาง (pool เดียวกันทั้งแอป)"""
+    return get_llm_client().async_client
+
+async def typhoon_wrapper_async(prompt, **kwargs):
+    return await get_llm_client().complete_async(prompt, **kwargs)
+
+async def typhoon_wrapper_stream_async(prompt, **kwargs):
+    async for text in get_llm_client().stream_async(prompt, **kwargs):
+        yield text
+
+async def format_ai3_bullet_stream_async(chunks, strip=False):
+    formatter = BulletStreamFormatter(strip=strip)
+    async for chunk in chunks:
+        text = formatter.feed(chunk)
+        if text:
+            yield text
+    tail = formatter.flush()
+    if tail:
+        yield tail
+
+# ================= AI 3 CHAIN (async) =================
+async def ai_chain_consistency_async(user_symptoms, predicted_diseases, llm_api, json_file):
+    return await response_cache.call_async(consistency_cache_key(user_symptoms, predicted_diseases, json_file),
+                                           _ai_chain_consistency_async, user_symptoms, predicted_diseases, llm_api, json_file)
+
+async def _ai_chain_consistency_async(user_symptoms, predicted_diseases, llm_api, json_file):
+    prompt = build_consistency_prompt(user_symptoms, predicted_diseases, json_file)
+    return await guarded_llm_call_async(GUARD_AI1_RAIL, get_async_guard_ai1, prompt, llm_api, AI1_PARAMS)
+
+async def ai_chain_summary_async(user_symptoms, predicted_diseases, ai1_comment, llm_api):
+    return await response_cache.call_async(summary_cache_key(user_symptoms, predicted_diseases, ai1_comment),
+                                           _ai_chain_summary_async, user_symptoms, predicted_diseases, ai1_comment, llm_api)
+
+async def _ai_chain_summary_async(user_symptoms, predicted_diseases, ai1_comment, llm_api):
+    prompt = build_summary_prompt(user_symptoms, predicted_diseases, ai1_comment)
+    return await guarded_llm_call_async(GUARD_AI2_RAIL, get_async_guard_ai2, prompt, llm_api, AI2_PARAMS)
+
+async def ai_chain_fast_async(user_symptoms, predicted_diseases, llm_api, json_file):
+    output = await response_cache.call_async(fast_cache_key(user_symptoms, predicted_diseases, json_file),
+                                             _ai_chain_fast_async, user_symptoms, predicted_diseases, llm_api, json_file)
+    return split_fast_output(output)
+
+async def _ai_chain_fast_async(user_symptoms, predicted_diseases, llm_api, json_file):
+    prompt = build_fast_prompt(user_symptoms, predicted_diseases, json_file)
+    return await guarded_llm_call_async(GUARD_AI12_RAIL, get_async_guard_ai12, prompt, llm_api, AI2_PARAMS)
+
+async def ai_chain_doctor_reply_async(ai2_summary, ai2_recommendation, llm_api):
+    return await response_cache.call_async(doctor_reply_cache_key(ai2_summary, ai2_recommendation),
+                                           _ai_chain_doctor_reply_async, ai2_summary, ai2_recommendation, llm_api)
+
+async def _ai_chain_doctor_reply_async(ai2_summary, ai2_recommendation, llm_api):
+    prompt = build_doctor_reply_prompt(ai2_summary, ai2_recommendation)
+    return await llm_api(prompt, **AI3_PARAMS)
+
+async def ai_chain_doctor_reply_stream_async(ai2_summary, ai2_recommendation, llm_stream_api):
+    async for text in response_cache.stream_async(doctor_reply_cache_key(ai2_summary, ai2_recommendation),
+                                                  _ai_chain_doctor_reply_stream_async, ai2_summary, ai2_recommendation, llm_stream_api):
+        yield text
+
+async def _ai_chain_doctor_reply_stream_async(ai2_summary, ai2_recommendation, llm_stream_api):
+    prompt = build_doctor_reply_prompt(ai2_summary, ai2_recommendation)
+    async for text in llm_stream_api(prompt, **AI3_PARAMS):
+        yield text
+
+# =========================
+class AsyncSpeculation:
+    """llm_api แบบ async ของ AI2 ที่เริ่มล่วงหน้า จำว่ายิงคำขอไปแล้วหรือยัง (ดู chatbot.Speculation)"""
+
+    def __init__(self, llm_api):
+        self._llm_api = llm_api
+        self.issued = False
+
+    async def __call__(self, prompt, **kwargs):
+        self.issued = True
+        return await self._llm_api(prompt, **kwargs)
+
+async def timed_async(timings, key, awaitable):
+    start = time.perf_counter()
+    try:
+        with telemetry.span(key):
+            return await awaitable
+    finally:
+        timings[key] = round(time.perf_counter() - start, 4)
+
+async def run_symptom_analysis_async(matched_symptoms, results, llm_api, mode=None, timings=None, context_diseases=None):
+    """AI1 -> AI2 ตามโหมด (ดู chatbot.run_symptom_analysis) คืน (ai1_res, ai2_res)"""
+    mode = mode or CHAIN_MODE
+    if mode not in CHAIN_MODES:
+        raise ValueError(f"ไม่รู้จักโหมด {mode!r} (ใช้ได้: {', '.join(CHAIN_MODES)})")
+    timings = {} if timings is None else timings
+    timings["mode"] = mode
+
+    json_data_str = knowledge_context_for(results, context_diseases)
+
+    if mode == "fast":
+        return await timed_async(timings, "ai12", ai_chain_fast_async(matched_symptoms, results, llm_api, json_data_str))
+
+    if mode == "speculative":
+        speculation = AsyncSpeculation(llm_api)
+        speculative = asyncio.create_task(
+            timed_async(timings, "ai2", ai_chain_summary_async(matched_symptoms, results, "", speculation))
+        )
+        try:
+            ai1_res = await timed_async(timings, "ai1", ai_chain_consistency_async(matched_symptoms, results, llm_api, json_data_str))
+        except BaseException:
+            speculative.cancel()
+            raise
+        if ai1_is_consistent(ai1_res):
+            timings["speculation"] = "hit"
+            record_speculation("hit")
+            return ai1_res, await speculative
+        # ยกเลิกคำขอที่เดาไว้ (ตัดการเชื่อมต่อ HTTP ทันที) แล้วสั่ง AI2 ใหม่พร้อม comment ของ AI1
+        # AI2 ที่เดาไว้เสร็จแล้วหรือยิงคำขอไปแล้ว = เสียค่าเรียก LLM ไปแล้ว (miss_wasted)
+        wasted = speculative.done() or speculation.issued
+        speculative.cancel()
+        timings["speculation"] = "miss"
+        record_speculation("miss_wasted" if wasted else "miss_cancelled")
+        ai2_res = await timed_async(timings, "ai2_reissue",
+                                    ai_chain_summary_async(matched_symptoms, results, ai1_res.get('comment', ''), llm_api))
+        return ai1_res, ai2_res
+
+    ai1_res = await timed_async(timings, "ai1", ai_chain_consistency_async(matched_symptoms, results, llm_api, json_data_str))
+    ai1_comment = ai1_res.get('comment', '')
+
+    ai2_res = await timed_async(timings, "ai2", ai_chain_summary_async(matched_symptoms, results, ai1_comment, llm_api))
+    return ai1_res, ai2_res
+
+async def answer_without_chain_async(intent, payload, llm_api):
+    """เหมือน chatbot.answer_without_chain สำหรับ llm_api แบบ async"""
+    if intent == "reply":
+        return payload
+    prompt = build_disease_info_prompt(payload)
+    with telemetry.span("disease_info"):
+        output = await llm_flight.call_async(disease_info_key(prompt), guarded_llm_call_async, GUARD_RAIL,
+                                             get_async_guard, prompt, llm_api, DISEASE_INFO_PARAMS)
+    return disease_info_answer(output)
+
+@telemetry.traced("chat")
+@pinned(get_knowledge_base)
+async def ask_bot_async(user_message, n_results=1, greeted=False, state=None, llm_api=typhoon_wrapper_async, mode=None,
+                        reset=False):
+    """เหมือน chatbot.ask_bot_streamlit แต่ไม่บล็อก event loop ระหว่างรอ LLM"""
+    symptom_state = session_state_for_symptoms(state, reset)
+    intent, payload = classify_message(user_message, greeted)
+    if intent != "symptoms":
+        return await answer_without_chain_async(intent, payload, llm_api)
+
+    # ดึงอาการ / จัดอันดับ / phrase index เป็นงาน CPU ทำในเธรด (contextvars ตามไป: snapshot ที่ปักไว้ + span)
+    matched_symptoms, results, context_diseases = await asyncio.to_thread(analyze_symptoms, user_message, n_results,
+                                                                          symptom_state)
+    if not matched_symptoms:
+        return no_symptom_reply(symptom_state)
+
+    start = time.perf_counter()
+    timings = {}
+    ai1_res, ai2_res = await run_symptom_analysis_async(matched_symptoms, results, llm_api, mode, timings, context_diseases)
+    ai2_summary = ai2_res.get('summary', '')
+    ai2_recommendation = ai2_res.get('recommendation', '')
+
+    ai3_reply = await timed_async(timings, "ai3", ai_chain_doctor_reply_async(ai2_summary, ai2_recommendation, llm_api))
+    ai3_reply = format_ai3_bullet(ai3_reply)
+    timings["total"] = round(time.perf_counter() - start, 4)
+
+    store_chain_state(state, ai1_res, ai2_res, ai3_reply, timings)
+
+    return ai3_reply.strip()
+
+@telemetry.traced("chat_stream")
+@pinned(get_knowledge_base)
+async def ask_bot_async_stream(user_message, n_results=1, greeted=False, state=None,
+                               llm_api=typhoon_wrapper_async, llm_stream_api=typhoon_wrapper_stream_async, mode=None,
+                               reset=False):
+    """เหมือน ask_bot_async แต่สตรีมคำตอบ AI3 ออกทีละ token"""
+    symptom_state = session_state_for_symptoms(state, reset)
+    intent, payload = classify_message(user_message, greeted)
+    if intent != "symptoms":
+        yield await answer_without_chain_async(intent, payload, llm_api)
+        return
+
+    # ดึงอาการ / จัดอันดับ / phrase index เป็นงาน CPU ทำในเธรด (contextvars ตามไป: snapshot ที่ปักไว้ + span)
+    matched_symptoms, results, context_diseases = await asyncio.to_thread(analyze_symptoms, user_message, n_results,
+                                                                          symptom_state)
+    if not matched_symptoms:
+        yield no_symptom_reply(symptom_state)
+        return
+
+    start = time.perf_counter()
+    timings = {}
+    ai1_res, ai2_res = await run_symptom_analysis_async(matched_symptoms, results, llm_api, mode, timings, context_diseases)
+    stream = ai_chain_doctor_reply_stream_async(ai2_res.get('summary', ''), ai2_res.get('recommendation', ''), llm_stream_api)
+    ai3_start = time.perf_counter()
+    parts = []
+    async for text in format_ai3_bullet_stream_async(stream, strip=True):
+        if not parts:
+            timings["first_token"] = round(time.perf_counter() - start, 4)
+        parts.append(text)
+        yield text
+    timings["ai3"] = round(time.perf_counter() - ai3_start, 4)
+    timings["total"] = round(time.perf_counter() - start, 4)
+
+    store_chain_state(state, ai1_res, ai2_res, "".join(parts), timings)
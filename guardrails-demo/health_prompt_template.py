@@ -1,5 +1,74 @@
-from langchain.prompts import PromptTemplate
+# health_prompt_template.py
+"""
+prompt template ของเชน AI1 / AI2 / AI3 และ app.py
 
+เดิมแต่ละคำขอสร้าง langchain PromptTemplate ใหม่แล้วค่อย format (และต้อง import langchain ทั้งก้อน)
+ที่นี่ template ทุกตัวคอมไพล์ครั้งเดียวตอน import: ตรวจว่าตัวแปรในข้อความตรงกับ input_variables,
+คำนวณ version (hash ของข้อความ) ไว้ใช้ในคีย์แคช แล้ว render ด้วย str.format ธรรมดา
+ไวยากรณ์เหมือน f-string template ของ langchain ({ตัวแปร} และ {{ }} สำหรับวงเล็บปีกกาจริง)
+"""
+import functools
+import hashlib
+import string
+
+
+class PromptTemplate:
+    """template ที่ตรวจและคอมไพล์แล้ว: .template / .input_variables / .version / .format(**kwargs)"""
+
+    def __init__(self, input_variables, template, name=None):
+        self.name = name
+        self.template = template
+        self.input_variables = list(input_variables)
+        fields = set()
+        for _, field, spec, conversion in string.Formatter().parse(template):
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"template {name or ''} มีตัวแปรที่ไม่รองรับ: {{{field}}}")
+            fields.add(field)
+        declared = set(self.input_variables)
+        if fields != declared:
+            raise ValueError(
+                f"template {name or ''} ตัวแปรไม่ตรงกับ input_variables: "
+                f"ขาด {sorted(declared - fields)} เกิน {sorted(fields - declared)}"
+            )
+        # version = hash ของข้อความ ใช้ในคีย์แคช แก้ template เมื่อไรคีย์เก่าก็ใช้ไม่ได้เอง
+        self.version = hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+    def format(self, **kwargs):
+        missing = [name for name in self.input_variables if name not in kwargs]
+        if missing:
+            raise KeyError(f"template {self.name or ''} ขาดค่าตัวแปร: {missing}")
+        return self.template.format(**kwargs)
+
+
+TEMPLATES = {}  # ชื่อ -> PromptTemplate ที่คอมไพล์แล้ว
+
+
+def register_template(name):
+    """คอมไพล์ template จาก factory ครั้งเดียวตอน import แล้วให้ factory คืนตัวเดิมทุกครั้ง"""
+    def decorator(factory):
+        if name in TEMPLATES:
+            raise ValueError(f"template ชื่อซ้ำ: {name}")
+        template = factory()
+        template.name = name
+        TEMPLATES[name] = template
+
+        @functools.wraps(factory)
+        def get_template():
+            return template
+        return get_template
+    return decorator
+
+
+def get_template(name):
+    return TEMPLATES[name]
+
+
+def template_versions():
+    return {name: template.version for name, template in TEMPLATES.items()}
+
+@register_template("ai1")
 def get_ai1_consistency_template():
     return PromptTemplate(
         input_variables=["user_symptoms", "predicted_diseases", "json_data"],
@@ -20,6 +89,7 @@ def get_ai1_consistency_template():
         )
     )
 
+@register_template("ai2")
 def get_ai2_summary_template():
     return PromptTemplate(
         input_variables=["user_symptoms", "predicted_diseases", "ai1_comment"],
@@ -34,6 +104,29 @@ def get_ai2_summary_template():
         )
     )
 
+@register_template("ai12")
+def get_ai12_fast_template():
+    # โหมดเร็ว: รวม AI1 (ตรวจความสอดคล้อง) และ AI2 (สรุป/คำแนะนำ) ไว้ในการเรียก LLM ครั้งเดียว
+    return PromptTemplate(
+        input_variables=["user_symptoms", "predicted_diseases", "json_data"],
+        template=(
+            "อาการที่ผู้ใช้แจ้ง: {user_symptoms}\n"
+            "ระบบวิเคราะห์ว่าอาจเป็นโรคต่อไปนี้ (เรียงตามเปอร์เซ็นต์):\n{predicted_diseases}\n"
+            "ข้อมูลเพิ่มเติมจาก JSON:\n{json_data}\n\n"
+            "ขั้นที่ 1: วิเคราะห์ว่าอาการที่ผู้ใช้แจ้งและผลวิเคราะห์โรคมีความสอดคล้องกันหรือไม่\n"
+            "- 'consistency': ถ้าอาการตรงกับโรคที่ระบบวิเคราะห์ ให้ตอบ 'yes' ถ้าไม่ตรง ให้ตอบ 'no'\n"
+            "- 'comment': ความคิดเห็นเกี่ยวกับความสอดคล้องนั้น พร้อมแจ้งชื่อโรคที่เกี่ยวข้อง\n"
+            "ขั้นที่ 2: โดยใช้ผลจากขั้นที่ 1 สรุปผลและให้คำแนะนำเบื้องต้น 'โดยพูดถึงอาการที่ผู้ใช้แจ้งเป็นหลัก' "
+            "(ห้ามพูดกลางๆ ห้ามพูดแต่เรื่องทั่วไป ห้ามวินิจฉัย/ห้ามแนะนำยา)\n"
+            "โปรดตอบผู้ใช้ด้วยสรรพนามว่า 'คุณ' เท่านั้น (ห้ามใช้ 'ลูกค้า', 'ท่าน', หรือสรรพนามอื่น)\n"
+            "ให้เน้นข้อควรระวังหรืออาการแทรกซ้อนเฉพาะสำหรับอาการเหล่านั้น เช่น หากปวดหัวรุนแรง คลื่นไส้ อาเจียน แขนขาอ่อนแรง ให้แจ้งเตือนให้พบแพทย์ทันที\n"
+            "- 'summary': สรุปผล\n"
+            "- 'recommendation': คำแนะนำเบื้องต้น\n"
+            "ตอบเป็น JSON เดียว เช่น {{'consistency': 'yes', 'comment': '...', 'summary': '...', 'recommendation': '...'}}"
+        )
+    )
+
+@register_template("ai3")
 def get_ai3_doctor_reply_template():
     return PromptTemplate(
         input_variables=["ai2_summary", "ai2_recommendation"],
@@ -54,6 +147,7 @@ def get_ai3_doctor_reply_template():
     )
 
 
+@register_template("skin")
 def get_skin_image_summary_template():
     return PromptTemplate(
         input_variables=["image_class", "ai2_summary", "ai2_recommendation"],
@@ -74,4 +168,19 @@ def get_skin_image_summary_template():
             "คำตอบควรเข้าใจง่าย กระชับ และมีความรับผิดชอบ\n"
             "คำตอบควรเป็นข้อความเดียว (ไม่ต้องเป็น JSON)"
         )
-    )
\ No newline at end of file
+    )
+
+
+@register_template("health")
+def get_health_prompt_template():
+    # ใช้ใน app.py (CLI) คู่กับ guardrails_spec.rail ที่ต้องการ JSON ที่มีคีย์ 'answer'
+    return PromptTemplate(
+        input_variables=["symptoms", "disease_ranking"],
+        template=(
+            "อาการที่ผู้ใช้แจ้ง: {symptoms}\n"
+            "ระบบวิเคราะห์ว่าอาจเป็นโรคต่อไปนี้ (เรียงตามเปอร์เซ็นต์):\n{disease_ranking}\n\n"
+            "โปรดตอบผู้ใช้ด้วยสรรพนามว่า 'คุณ' เท่านั้น สรุปผลและให้คำแนะนำในการดูแลตัวเองเบื้องต้นตามอาการที่แจ้ง "
+            "พร้อมข้อควรระวังที่ควรไปพบแพทย์ (ห้ามวินิจฉัย/ห้ามแนะนำยา)\n"
+            "ตอบเป็น JSON เช่น {{'answer': '...'}}"
+        )
+    )
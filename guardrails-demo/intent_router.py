@@ -0,0 +1,79 @@
+# intent_router.py
+"""
+แยกประเภทข้อความผู้ใช้ (ขอบคุณ / ถามสารทุกข์ / ชื่อโรค / ทักทาย / ขอยา / อาการ) ในรอบเดียว
+
+เดิมเช็คทีละหมวดด้วย any(word in msg ...) แล้ววนหาชื่อโรคทุกโรคในข้อความ ต้นทุนโตตามจำนวนคำและจำนวนโรค
+ที่นี่รวมคำของทุกหมวดและชื่อโรคไว้ใน KeywordAutomaton ตัวเดียว สแกนข้อความครั้งเดียวแล้วเลือกหมวด
+ตามลำดับความสำคัญเดิม:
+
+    ขอบคุณ > ถามสารทุกข์ > ชื่อโรค (ตามลำดับใน known_diseases) > ทักทาย (ถ้ายังไม่ทัก) > ขอยา > อาการ
+
+ผลเหมือน substring test แบบเดิมทุกกรณี (รวมถึงคำที่ซ้อนกันอยู่ในคำอื่น)
+"""
+from symptom_extractor import KeywordAutomaton
+
+THANKS = "thanks"
+HOW_ARE_YOU = "how_are_you"
+DISEASE = "disease"
+GREETING = "greeting"
+MEDICATION = "medication"
+SYMPTOMS = "symptoms"
+
+# หมวดที่เทียบกับข้อความตัวพิมพ์เล็ก เรียงตามลำดับความสำคัญ (ชื่อโรคแทรกหลัง HOW_ARE_YOU)
+_LOWER_INTENTS = (THANKS, HOW_ARE_YOU, GREETING, MEDICATION)
+
+
+class IntentRouter:
+    def __init__(self, thank_words, how_are_you_words, greet_words, medication_words, diseases):
+        self.diseases = list(diseases)
+        words = {
+            THANKS: thank_words,
+            HOW_ARE_YOU: how_are_you_words,
+            GREETING: greet_words,
+            MEDICATION: medication_words,
+        }
+        keywords = []
+        self._labels = []  # keyword_id -> (intent, index ของโรค หรือ None)
+        for intent in _LOWER_INTENTS:
+            for word in words[intent]:
+                if word:
+                    keywords.append(word)
+                    self._labels.append((intent, None))
+        for idx, disease in enumerate(self.diseases):
+            if disease:
+                keywords.append(disease)
+                self._labels.append((DISEASE, idx))
+        self.automaton = KeywordAutomaton(keywords)
+        self._has_cased_disease = any(d != d.lower() for d in self.diseases)
+
+    def _scan(self, text, found, disease_only=False):
+        for _, _, kid in self.automaton.iter_matches(text):
+            intent, idx = self._labels[kid]
+            if intent == DISEASE:
+                if found.get(DISEASE) is None or idx < found[DISEASE]:
+                    found[DISEASE] = idx
+            elif not disease_only:
+                found[intent] = None
+
+    def route(self, user_message, greeted=False):
+        """
+        คืน (intent, disease) โดย disease เป็นชื่อโรคเมื่อ intent == DISEASE นอกนั้นเป็น None
+        """
+        msg_lower = user_message.lower().strip()
+        found = {}
+        self._scan(msg_lower, found)
+        # ชื่อโรคเดิมเทียบทั้งข้อความดิบและตัวพิมพ์เล็ก ต้องสแกนข้อความดิบเพิ่มเฉพาะเมื่อมีโรคที่มีตัวพิมพ์ใหญ่
+        if self._has_cased_disease and user_message != msg_lower:
+            self._scan(user_message, found, disease_only=True)
+
+        if THANKS in found:
+            return THANKS, None
+        if HOW_ARE_YOU in found:
+            return HOW_ARE_YOU, None
+        if DISEASE in found:
+            return DISEASE, self.diseases[found[DISEASE]]
+        if not greeted and GREETING in found:
+            return GREETING, None
+        if MEDICATION in found:
+            return MEDICATION, None
+        return SYMPTOMS, None
@@ -0,0 +1,237 @@
+# knowledge_base.py
+"""
+ฐานความรู้แบบมีเวอร์ชัน (ตารางอาการ CSV + symptoms_data.json) ที่อัปเดตได้โดยไม่ต้องรีสตาร์ต
+
+- KnowledgeSnapshot: ข้อมูลชุดหนึ่งที่สร้างเสร็จแล้ว (ตารางอาการ รายชื่ออาการ/โรค บริบทความรู้ และดัชนีที่ลงทะเบียนไว้
+  เช่น ตัวดึงอาการ ดัชนีประโยคตัวอย่าง intent router) ไม่ถูกแก้หลังสร้าง
+- KnowledgeBase: ถือ snapshot ปัจจุบัน เธรด watcher ตรวจ mtime/ขนาดของทั้งสองไฟล์ทุก KB_WATCH_INTERVAL วินาที
+  เมื่อเปลี่ยนจะสร้าง snapshot ใหม่ทั้งชุดในเธรดนั้น แล้วสลับ reference ทีเดียว (คำขอไม่ต้องรอ lock ใดๆ)
+  ถ้าสร้างไม่สำเร็จ (เช่นไฟล์เขียนไม่ครบ) ใช้ snapshot เดิมต่อและบันทึก last_error ไว้
+- คำขอที่กำลังทำงานใช้ snapshot เดียวตลอดเทิร์น: ครอบด้วย pinned(...) (เก็บใน contextvars
+  ตามไปถึงเธรดที่ submit ผ่าน contextvars.copy_context().run) current() ในเทิร์นนั้นจะคืน snapshot ที่ปักไว้
+
+ตั้งค่าผ่าน env:
+    KB_WATCH_INTERVAL  ช่วงเวลาตรวจไฟล์ (วินาที, ค่าเริ่มต้น 5, 0 = ไม่เฝ้าไฟล์ ใช้ reload() เอง)
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+from knowledge_context import KnowledgeContext
+from phrase_index import load_phrase_index
+from symptom_extractor import get_symptom_extractor
+from symptom_table_cache import file_sha256, load_symptom_table
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# ดัชนีที่คำนวณจาก snapshot (ชื่อ -> builder(snapshot)) สร้างล่วงหน้าในเธรด reload ก่อนสลับ
+_index_builders = {
+    "symptom_extractor": lambda snapshot: get_symptom_extractor(snapshot.known_symptoms),
+    "phrase_index": lambda snapshot: load_phrase_index(snapshot.json_path),
+    "symptom_profile": lambda snapshot: snapshot.symptom_table.disease_profile(),
+}
+
+
+def register_index(name, builder):
+    """ลงทะเบียนดัชนีที่ต้องสร้างใหม่ทุกครั้งที่ข้อมูลเปลี่ยน (เช่น intent router ที่ใช้รายชื่อโรค)"""
+    _index_builders[name] = builder
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class KnowledgeSnapshot:
+    def __init__(self, generation, symptom_table, known_symptoms, disease_col, knowledge, sources, build_seconds,
+                 csv_path=None, json_path=None):
+        self.generation = generation
+        self.csv_path = csv_path
+        self.json_path = json_path
+        self.symptom_table = symptom_table
+        self.known_symptoms = known_symptoms
+        self.disease_col = disease_col
+        self.known_diseases = list(symptom_table.diseases)
+        self.knowledge = knowledge
+        self.sources = sources  # path -> sha256
+        self.version = f"v{generation}-" + "-".join(sha[:8] for sha in sources.values())
+        self.loaded_at = time.time()
+        self.build_seconds = build_seconds
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, name, builder=None):
+        """ดัชนีชื่อ name ของ snapshot นี้ (สร้างครั้งแรกที่ขอถ้ายังไม่ได้สร้างล่วงหน้า)"""
+        value = self._indexes.get(name)
+        if value is None:
+            with self._lock:
+                value = self._indexes.get(name)
+                if value is None:
+                    builder = builder or _index_builders[name]
+                    value = self._indexes[name] = builder(self)
+        return value
+
+
+class KnowledgeBase:
+    def __init__(self, csv_path, json_path, watch_interval=None):
+        self.csv_path = csv_path
+        self.json_path = json_path
+        self.watch_interval = (float(os.getenv("KB_WATCH_INTERVAL", "5")) if watch_interval is None
+                               else watch_interval)
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._generation = 0
+        self._signatures = None
+        self._reload_lock = threading.Lock()  # กัน reload ซ้อนกันเท่านั้น คำขอไม่แตะ lock นี้
+        self._pinned = contextvars.ContextVar(f"knowledge_snapshot_{id(self)}", default=None)
+        self._stop = threading.Event()
+        self._watcher = None
+        self._snapshot = None
+        self.reload(force=True)
+        if self._snapshot is None:
+            raise RuntimeError(f"โหลดฐานความรู้ไม่สำเร็จ: {self.last_error}")
+
+    def _build(self):
+        start = time.perf_counter()
+        with telemetry.span("knowledge_reload"):
+            symptom_table, known_symptoms, disease_col = load_symptom_table(self.csv_path)
+            knowledge = KnowledgeContext.from_json(self.json_path)
+            sources = {
+                self.csv_path: symptom_table.content_hash or file_sha256(self.csv_path),
+                self.json_path: file_sha256(self.json_path),
+            }
+            snapshot = KnowledgeSnapshot(self._generation + 1, symptom_table, known_symptoms, disease_col, knowledge,
+                                         sources, None, self.csv_path, self.json_path)
+            for name in list(_index_builders):
+                snapshot.index(name)
+        snapshot.build_seconds = round(time.perf_counter() - start, 4)
+        return snapshot
+
+    def reload(self, force=False):
+        """
+        สร้าง snapshot ใหม่ถ้าไฟล์เปลี่ยน (force=True สร้างเสมอ) คืน snapshot ใหม่ หรือ None ถ้าไม่ได้สลับ
+        เนื้อหาเหมือนเดิม (แค่ touch ไฟล์) ไม่สลับ
+        """
+        with self._reload_lock:
+            try:
+                signatures = (_signature(self.csv_path), _signature(self.json_path))
+            except OSError as e:
+                self._fail(e)
+                return None
+            if not force and signatures == self._signatures:
+                return None
+            # จำ signature ไว้ก่อนแม้สร้างไม่สำเร็จ จะได้ไม่ลองซ้ำทุกรอบจนกว่าไฟล์จะเปลี่ยนอีก
+            self._signatures = signatures
+            try:
+                snapshot = self._build()
+            except Exception as e:
+                self._fail(e)
+                return None
+            current = self._snapshot
+            if not force and current is not None and snapshot.sources == current.sources:
+                return None
+            self._generation = snapshot.generation
+            self._snapshot = snapshot  # สลับ reference ทีเดียว คำขอที่ปัก snapshot เดิมไว้ยังใช้ของเดิมต่อ
+            self.reloads += 1
+            self.last_error = None
+            telemetry.observe("knowledge_reload_seconds", snapshot.build_seconds, "เวลาสร้างฐานความรู้ชุดใหม่")
+            logger.info("knowledge base %s loaded in %.3fs", snapshot.version, snapshot.build_seconds)
+            return snapshot
+
+    def _fail(self, error):
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        telemetry.inc("knowledge_reload_errors_total", 1, "จำนวนครั้งที่สร้างฐานความรู้ชุดใหม่ไม่สำเร็จ")
+        logger.warning("reload ฐานความรู้ไม่สำเร็จ ใช้ชุดเดิมต่อ: %s", self.last_error)
+
+    def current(self):
+        """snapshot ที่ปักไว้ในเทิร์นนี้ (ถ้ามี) ไม่งั้นตัวล่าสุด"""
+        pinned = self._pinned.get()
+        return pinned if pinned is not None else self._snapshot
+
+    def pin(self):
+        """context manager: ใช้ snapshot ปัจจุบันตลอดบล็อก (ซ้อนกันได้ ใช้ตัวนอกสุด)"""
+        return _Pin(self)
+
+    # ===== watcher
+    def start_watcher(self):
+        if self.watch_interval > 0 and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="knowledge-watcher", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            self.reload()
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "generation": snapshot.generation,
+            "loaded_at": snapshot.loaded_at,
+            "reload_seconds": snapshot.build_seconds,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "sources": snapshot.sources,
+        }
+
+
+class _Pin:
+    def __init__(self, kb):
+        self.kb = kb
+        self._token = None
+
+    def __enter__(self):
+        snapshot = self.kb._pinned.get()
+        if snapshot is None:
+            snapshot = self.kb._snapshot
+            self._token = self.kb._pinned.set(snapshot)
+        return snapshot
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is not None:
+            try:
+                self.kb._pinned.reset(self._token)
+            except ValueError:  # ปิดใน context อื่น (generator ที่ถูกปิดจากอีก task)
+                self.kb._pinned.set(None)
+        return False
+
+
+def pinned(get_kb):
+    """decorator: ครอบฟังก์ชันธรรมดา / coroutine / generator / async generator ด้วย get_kb().pin()"""
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with get_kb().pin():
+                    async for item in fn(*args, **kwargs):
+                        yield item
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with get_kb().pin():
+                    return await fn(*args, **kwargs)
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with get_kb().pin():
+                    yield from fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with get_kb().pin():
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
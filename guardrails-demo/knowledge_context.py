@@ -0,0 +1,97 @@
+# knowledge_context.py
+"""
+บริบทความรู้จาก symptoms_data.json สำหรับ prompt ของ AI1
+
+เดิมทุกข้อความจะอ่านไฟล์ทั้งก้อน parse แล้ว dump กลับเป็นสตริงใส่ prompt ทั้งหมด ทำให้ prompt โตตามจำนวนโรค
+ที่นี่โหลดไฟล์ครั้งเดียว รวม/ตัดตัวอย่างที่ซ้ำ จัดดัชนีตามชื่อโรค แล้วคืนเฉพาะโรคที่ถูกจัดอันดับต้นๆ
+ภายในงบ token ที่กำหนด
+"""
+import json
+import threading
+
+DISEASE_KEY = "โรค"
+EXAMPLES_KEY = "อาการโดยสังเขป"
+# ประมาณจำนวน token จากจำนวนตัวอักษร (ข้อความไทยประมาณ 3 ตัวอักษรต่อ token)
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class KnowledgeContext:
+    def __init__(self, entries, max_rendered=1024):
+        self._examples = {}  # ชื่อโรค -> ตัวอย่างอาการที่ไม่ซ้ำ (ตามลำดับเดิมในไฟล์)
+        for entry in entries:
+            disease = str(entry.get(DISEASE_KEY, "")).strip()
+            if not disease:
+                continue
+            examples = self._examples.setdefault(disease, [])
+            seen = set(examples)
+            for example in entry.get(EXAMPLES_KEY, []):
+                example = str(example).strip()
+                if example and example not in seen:
+                    seen.add(example)
+                    examples.append(example)
+        self._rendered = {}
+        self._max_rendered = max_rendered
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def diseases(self):
+        return list(self._examples)
+
+    def examples_for(self, disease):
+        return list(self._examples.get(disease, []))
+
+    def entries_for(self, diseases, token_budget=None):
+        """
+        คืน [{"โรค": ..., "อาการโดยสังเขป": [...]}, ...] ตามลำดับของ diseases
+
+        ถ้ากำหนด token_budget จะเลือกตัวอย่างแบบวนทีละโรค (ตัวอย่างแรกของทุกโรคก่อน แล้วค่อยตัวที่สอง ...)
+        จนกว่าจะเต็มงบ เพื่อให้ทุกโรคที่ติดอันดับมีข้อมูลอย่างน้อยหนึ่งตัวอย่างถ้างบพอ
+        """
+        order = []
+        for disease in diseases:
+            if disease in self._examples and disease not in order:
+                order.append(disease)
+        picked = {disease: [] for disease in order}
+        if token_budget is None:
+            for disease in order:
+                picked[disease] = list(self._examples[disease])
+        else:
+            used = estimate_tokens(json.dumps([{DISEASE_KEY: d, EXAMPLES_KEY: []} for d in order], ensure_ascii=False))
+            depth = 0
+            full = False
+            while not full and any(depth < len(self._examples[d]) for d in order):
+                for disease in order:
+                    examples = self._examples[disease]
+                    if depth >= len(examples):
+                        continue
+                    cost = estimate_tokens(json.dumps(examples[depth], ensure_ascii=False)) + 1
+                    if used + cost > token_budget:
+                        full = True
+                        break
+                    picked[disease].append(examples[depth])
+                    used += cost
+                depth += 1
+        return [{DISEASE_KEY: disease, EXAMPLES_KEY: picked[disease]} for disease in order]
+
+    def context_for(self, diseases, token_budget=None):
+        """สตริง JSON ของ entries_for สำหรับใส่ prompt (แคชผลตามชุดโรคและงบ)"""
+        key = (tuple(diseases), token_budget)
+        with self._lock:
+            rendered = self._rendered.get(key)
+        if rendered is not None:
+            return rendered
+        rendered = json.dumps(self.entries_for(diseases, token_budget), ensure_ascii=False)
+        with self._lock:
+            if len(self._rendered) >= self._max_rendered:
+                self._rendered.clear()
+            self._rendered[key] = rendered
+        return rendered
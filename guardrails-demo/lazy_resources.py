@@ -0,0 +1,91 @@
+# lazy_resources.py
+"""
+ทรัพยากรหนัก (Guard, OpenAI client, ตารางอาการ, ข้อมูลโรค, โมเดลผิวหนัง) แบบสร้างเมื่อใช้ครั้งแรก
+
+import โมดูลแอปจึงเร็ว (ไม่ต้อง import guardrails / สร้าง Guard / โหลดตารางทันที) และ Streamlit hot reload
+ไม่ต้องจ่ายค่าเริ่มต้นใหม่ ถ้าต้องการให้พร้อมก่อนคำขอแรกเรียก warm_up() หรือตั้ง WARM_UP=1 / WARM_UP=background
+"""
+import logging
+import threading
+import time
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource:
+    """ค่าที่สร้างด้วย factory() ครั้งเดียวต่อ process เมื่อเรียก get() ครั้งแรก (thread-safe)"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.load_seconds = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    with telemetry.span(f"load_{self.name}"):
+                        self._value = self.factory()
+                    self.load_seconds = round(time.perf_counter() - start, 4)
+                    self._loaded = True
+        return self._value
+
+    __call__ = get
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self._loaded = False
+            self.load_seconds = None
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def lazy(name, factory):
+    """สร้างและลงทะเบียน LazyResource (ชื่อซ้ำคืนตัวเดิม เช่นตอน Streamlit รันสคริปต์ซ้ำ)"""
+    with _registry_lock:
+        resource = _registry.get(name)
+        if resource is None:
+            resource = LazyResource(name, factory)
+            _registry[name] = resource
+        return resource
+
+
+def warm_up(names=None):
+    """
+    โหลดทรัพยากรตามชื่อ (ไม่ระบุ = ทุกตัวที่ลงทะเบียน) คืน {ชื่อ: วินาทีที่ใช้โหลด}
+    ตัวที่โหลดไม่สำเร็จ (เช่นไม่มีไฟล์โมเดล) จะถูกข้ามและได้ค่า None ไว้ลองใหม่ตอนใช้จริง
+    """
+    with _registry_lock:
+        resources = [r for n, r in _registry.items() if names is None or n in names]
+    timings = {}
+    for resource in resources:
+        try:
+            resource.get()
+        except Exception as e:
+            logger.warning("warm-up %s ไม่สำเร็จ: %s", resource.name, e)
+        timings[resource.name] = resource.load_seconds
+    return timings
+
+
+def warm_up_in_background(names=None):
+    thread = threading.Thread(target=warm_up, args=(names,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def resource_status():
+    with _registry_lock:
+        return {name: {"loaded": r.loaded, "load_seconds": r.load_seconds} for name, r in _registry.items()}
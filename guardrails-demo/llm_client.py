@@ -0,0 +1,406 @@
+# llm_client.py
+"""
+ไคลเอนต์ Typhoon (OpenAI-compatible) ตัวเดียวที่ทุกขั้นของเชนใช้ร่วมกัน ทั้ง sync / async / stream
+
+- connection pool แบบ keep-alive (httpx) ใช้ร่วมทุกคำขอ ไม่ต้องเปิด TLS ใหม่ทุกครั้ง
+- timeout แยก connect / รวม
+- retry เมื่อเจอ 429 / 5xx / timeout / เชื่อมต่อไม่ได้ แบบ exponential backoff + full jitter (เคารพ Retry-After)
+- token bucket จำกัดอัตราคำขอ และ semaphore จำกัดจำนวนคำขอพร้อมกัน เพื่อไม่ให้เกิด 429 ทั้งชุดตอนโหลดพุ่ง
+- hedging: ถ้าคำขอ (ที่ไม่ใช่ stream) ช้ากว่า TYPHOON_HEDGE_AFTER วินาที ยิงสำเนาอีกหนึ่งคำขอแล้วใช้ผลที่มาก่อน
+
+ตั้งค่าผ่าน env (ค่าเริ่มต้นในวงเล็บ):
+    TYPHOON_API_KEY, TYPHOON_API_URL (https://api.opentyphoon.ai/v1), TYPHOON_MODEL (typhoon-v2.1-12b-instruct)
+    TYPHOON_TIMEOUT (60) TYPHOON_CONNECT_TIMEOUT (5)       วินาที
+    TYPHOON_MAX_RETRIES (3) TYPHOON_BACKOFF_BASE (0.5) TYPHOON_BACKOFF_MAX (8)
+    TYPHOON_RATE_LIMIT (0 = ไม่จำกัด, คำขอ/วินาที) TYPHOON_RATE_BURST (เท่ากับ rate)
+    TYPHOON_MAX_CONCURRENCY (32) TYPHOON_MAX_CONNECTIONS (64) TYPHOON_KEEPALIVE_CONNECTIONS (32)
+    TYPHOON_HEDGE_AFTER (0 = ปิด, วินาที)
+
+ทดสอบกับเซิร์ฟเวอร์จำลองได้ด้วย TYPHOON_API_URL=http://127.0.0.1:8001/v1 (ดู benchmarks/fake_typhoon_server.py)
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import telemetry
+
+DEFAULT_API_URL = "https://api.opentyphoon.ai/v1"
+DEFAULT_MODEL = "typhoon-v2.1-12b-instruct"
+SYSTEM_PROMPT = "คุณเป็นผู้ช่วย AI สุขภาพเบื้องต้น พูดจาอ่อนโยน ให้ข้อมูลเหมือนผู้หญิงไทย สุภาพ เป็นมิตร ไม่พูด 'สวัสดี' ทุกครั้ง (พูดแค่ทักทายครั้งแรกเท่านั้น) และห้ามวินิจฉัยหรือสั่งยา ต้องแนะนำให้พบแพทย์เสมอ"
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+class LLMConfig:
+    def __init__(self, api_key=None, base_url=DEFAULT_API_URL, model=DEFAULT_MODEL, timeout=60.0,
+                 connect_timeout=5.0, max_retries=3, backoff_base=0.5, backoff_max=8.0, rate_limit=0.0,
+                 rate_burst=None, max_concurrency=32, max_connections=64, keepalive_connections=32,
+                 hedge_after=0.0, system_prompt=SYSTEM_PROMPT):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst if rate_burst else max(1.0, rate_limit)
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.keepalive_connections = keepalive_connections
+        self.hedge_after = hedge_after
+        self.system_prompt = system_prompt
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            api_key=os.getenv("TYPHOON_API_KEY"),
+            base_url=os.getenv("TYPHOON_API_URL", DEFAULT_API_URL),
+            model=os.getenv("TYPHOON_MODEL", DEFAULT_MODEL),
+            timeout=_env_float("TYPHOON_TIMEOUT", 60),
+            connect_timeout=_env_float("TYPHOON_CONNECT_TIMEOUT", 5),
+            max_retries=int(os.getenv("TYPHOON_MAX_RETRIES", "3")),
+            backoff_base=_env_float("TYPHOON_BACKOFF_BASE", 0.5),
+            backoff_max=_env_float("TYPHOON_BACKOFF_MAX", 8),
+            rate_limit=_env_float("TYPHOON_RATE_LIMIT", 0),
+            rate_burst=_env_float("TYPHOON_RATE_BURST", 0) or None,
+            max_concurrency=int(os.getenv("TYPHOON_MAX_CONCURRENCY", "32")),
+            max_connections=int(os.getenv("TYPHOON_MAX_CONNECTIONS", "64")),
+            keepalive_connections=int(os.getenv("TYPHOON_KEEPALIVE_CONNECTIONS", "32")),
+            hedge_after=_env_float("TYPHOON_HEDGE_AFTER", 0),
+        )
+
+
+class TokenBucket:
+    """
+    จำกัดอัตรา rate คำขอ/วินาที (สะสมได้สูงสุด burst) ใช้ได้ทั้ง thread และ asyncio
+    reserve() จองโทเคนทันทีแล้วคืนเวลาที่ต้องรอ คำขอจึงได้คิวตามลำดับที่มาถึง
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+def backoff_delay(attempt, base, cap, retry_after=None, rng=random):
+    """full jitter: สุ่มในช่วง [0, min(cap, base * 2^attempt)] ถ้าเซิร์ฟเวอร์บอก Retry-After ใช้ค่านั้นเป็นขั้นต่ำ"""
+    delay = rng.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(cap, retry_after))
+    return delay
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error):
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRY_STATUS
+    return False
+
+
+class LLMClient:
+    def __init__(self, config=None):
+        self.config = config or LLMConfig.from_env()
+        self.bucket = TokenBucket(self.config.rate_limit, self.config.rate_burst)
+        self._semaphore = threading.BoundedSemaphore(self.config.max_concurrency)
+        self._async_semaphore = None
+        self._async_loop = None
+        self._client = None
+        self._async_client = None
+        self._hedge_pool = None
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._rng = random.Random()
+
+    @classmethod
+    def from_env(cls):
+        return cls(LLMConfig.from_env())
+
+    # ---------- ไคลเอนต์ OpenAI (สร้างครั้งแรกที่ใช้) ----------
+    def _timeout(self):
+        import httpx
+        return httpx.Timeout(self.config.timeout, connect=self.config.connect_timeout)
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.config.max_connections,
+                            max_keepalive_connections=self.config.keepalive_connections)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+                    # retry ของไลบรารีปิดไว้ ใช้ retry + jitter ของเราเองแทน
+                    self._client = OpenAI(
+                        api_key=self.config.api_key, base_url=self.config.base_url, max_retries=0,
+                        timeout=self._timeout(),
+                        http_client=httpx.Client(limits=self._limits(), timeout=self._timeout()),
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    import httpx
+                    from openai import AsyncOpenAI
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.config.api_key, base_url=self.config.base_url, max_retries=0,
+                        timeout=self._timeout(),
+                        http_client=httpx.AsyncClient(limits=self._limits(), timeout=self._timeout()),
+                    )
+        return self._async_client
+
+    def _get_async_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._async_semaphore is None or self._async_loop is not loop:
+            self._async_semaphore = asyncio.Semaphore(self.config.max_concurrency)
+            self._async_loop = loop
+        return self._async_semaphore
+
+    # ---------- สร้างคำขอ ----------
+    def _request(self, prompt, kwargs, stream=False):
+        request = {
+            "model": kwargs.get("model", self.config.model),
+            "messages": [{"role": "system", "content": self.config.system_prompt},
+                         {"role": "user", "content": prompt}],
+            "max_tokens": kwargs.get("max_new_tokens", 512),
+            "temperature": kwargs.get("temperature", 0.3),
+        }
+        if stream:
+            request["stream"] = True
+            # chunk สุดท้ายมี usage (choices ว่าง) ใช้นับ token ของคำตอบแบบสตรีม
+            request["stream_options"] = {"include_usage": True}
+        return request
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+        telemetry.inc("llm_events_total", n, "คำขอ / retry / error / hedge ของไคลเอนต์ LLM", event=name)
+
+    def _record_usage(self, response):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            with self._lock:
+                self._counts["prompt_tokens"] += usage.prompt_tokens or 0
+                self._counts["completion_tokens"] += usage.completion_tokens or 0
+            telemetry.record_tokens(usage.prompt_tokens, usage.completion_tokens, getattr(response, "model", None))
+
+    def _delay(self, attempt, error):
+        return backoff_delay(attempt, self.config.backoff_base, self.config.backoff_max, _retry_after(error), self._rng)
+
+    # ---------- sync ----------
+    def _create(self, request, hold=False):
+        """เรียก API หนึ่งครั้ง (ผ่าน rate limit + semaphore) พร้อม retry
+
+        hold=True (stream): คืนผลโดยยังถือ permit ของ semaphore ไว้ ผู้เรียกต้อง release เองเมื่ออ่านสตรีมจบ/ปิด
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self._semaphore.acquire()
+            held = False
+            try:
+                self._count("requests")
+                response = self.client.chat.completions.create(**request)
+                held = hold
+                return response
+            except Exception as e:
+                if attempt >= self.config.max_retries or not is_retryable(e):
+                    self._count("errors")
+                    raise
+                error = e
+            finally:
+                if not held:
+                    self._semaphore.release()
+            self._count("retries")
+            time.sleep(self._delay(attempt, error))
+            attempt += 1
+
+    def _create_hedged(self, request):
+        if self.config.hedge_after <= 0:
+            return self._create(request)
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=self.config.max_concurrency,
+                                                          thread_name_prefix="llm-hedge")
+        primary = self._hedge_pool.submit(self._create, request)
+        done, _ = wait([primary], timeout=self.config.hedge_after)
+        if done:
+            return primary.result()
+        self._count("hedges")
+        hedge = self._hedge_pool.submit(self._create, request)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    # คำขออีกตัวยกเลิกกลางทางไม่ได้ ปล่อยให้จบเองแล้วทิ้งผล
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def complete(self, prompt, **kwargs):
+        """ส่ง prompt คืนข้อความคำตอบ (kwargs: model / temperature / max_new_tokens แบบ typhoon_wrapper เดิม)"""
+        response = self._create_hedged(self._request(prompt, kwargs))
+        self._record_usage(response)
+        return response.choices[0].message.content
+
+    def stream(self, prompt, **kwargs):
+        """เหมือน complete แต่คืนข้อความทีละส่วน (retry ได้เฉพาะก่อนเริ่มสตรีม ไม่ทำ hedging)
+
+        ถือ permit ของ semaphore จนอ่านสตรีมจบหรือ generator ถูกปิด (การเชื่อมต่อยังเปิดอยู่ตลอดช่วงนั้น)
+        token นับจาก chunk usage สุดท้าย (stream_options.include_usage)
+        """
+        stream = self._create(self._request(prompt, kwargs, stream=True), hold=True)
+        try:
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            try:
+                stream.close()
+            finally:
+                self._semaphore.release()
+
+    # ---------- async ----------
+    async def _create_async(self, request, hold=False):
+        attempt = 0
+        semaphore = self._get_async_semaphore()
+        while True:
+            await self.bucket.acquire_async()
+            await semaphore.acquire()
+            held = False
+            try:
+                self._count("requests")
+                response = await self.async_client.chat.completions.create(**request)
+                held = hold
+                return response
+            except Exception as e:
+                if attempt >= self.config.max_retries or not is_retryable(e):
+                    self._count("errors")
+                    raise
+                error = e
+            finally:
+                if not held:
+                    semaphore.release()
+            self._count("retries")
+            await asyncio.sleep(self._delay(attempt, error))
+            attempt += 1
+
+    async def _create_hedged_async(self, request):
+        if self.config.hedge_after <= 0:
+            return await self._create_async(request)
+        primary = asyncio.ensure_future(self._create_async(request))
+        done, _ = await asyncio.wait({primary}, timeout=self.config.hedge_after)
+        if done:
+            return primary.result()
+        self._count("hedges")
+        hedge = asyncio.ensure_future(self._create_async(request))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete_async(self, prompt, **kwargs):
+        response = await self._create_hedged_async(self._request(prompt, kwargs))
+        self._record_usage(response)
+        return response.choices[0].message.content
+
+    async def stream_async(self, prompt, **kwargs):
+        semaphore = self._get_async_semaphore()
+        stream = await self._create_async(self._request(prompt, kwargs, stream=True), hold=True)
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            try:
+                await stream.close()
+            finally:
+                semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            "base_url": self.config.base_url,
+            "requests": counts.get("requests", 0),
+            "retries": counts.get("retries", 0),
+            "errors": counts.get("errors", 0),
+            "hedges": counts.get("hedges", 0),
+            "hedge_wins": counts.get("hedge_wins", 0),
+            "prompt_tokens": counts.get("prompt_tokens", 0),
+            "completion_tokens": counts.get("completion_tokens", 0),
+            "rate_limit": self.config.rate_limit,
+            "max_concurrency": self.config.max_concurrency,
+        }
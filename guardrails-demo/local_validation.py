@@ -0,0 +1,328 @@
+# local_validation.py
+"""
+ตรวจและซ่อมผลลัพธ์ของ LLM ในโปรเซสก่อนส่งต่อให้ Guard
+
+เดิมทุกการเรียกผ่าน Guard(...) ถ้าผลไม่ผ่าน (JSON เสีย ขาดฟิลด์ มีคำต้องห้าม) Guard จะ reask = เรียก LLM อีกรอบ
+แต่ความผิดพลาดที่พบบ่อยแก้ได้แน่นอนโดยไม่ต้องถาม LLM ใหม่:
+
+- JSON ห่อด้วยข้อความ/``` หรือเขียนแบบ dict ของ Python (quote เดี่ยว ตามตัวอย่างใน prompt) หรือมี comma เกิน
+- ค่าของฟิลด์ไม่ใช่สตริง
+- คำต้องห้ามตาม regex ใน rail (ยา / วินิจฉัย / รักษา ...) จับแบบ substring เหมือน rail (ภาษาไทยไม่เว้นวรรค
+  "ควรทานยาแก้ปวด" จึงนับ) ยกเว้นคำใน FORBIDDEN_ALLOWLIST ที่มีคำต้องห้ามซ่อนอยู่แต่ไม่ได้มีความหมายนั้น
+  ("ยา" ใน "โรงพยาบาล" "ลับ" ใน "กลับ" "รักษา" ใน "รักษาความสะอาด") ซึ่งถูกลบออกก่อนค้น
+  ตัดบรรทัดที่มีคำนั้นออกเฉพาะเมื่อ rail กำหนด on-fail-regex เป็น fix / filter / reask
+  ถ้าไม่กำหนด (Guard ใช้ noop) แค่บันทึกว่าพบ แล้วส่งข้อความเดิมเหมือนที่ Guard ทำ
+
+ที่ซ่อมไม่ได้ (ขาดฟิลด์ ไม่มี JSON เลย on-fail เป็น reask แต่ตัดแล้วไม่เหลือข้อความ) ค่อยส่งให้ Guard.parse
+พร้อม llm_api เพื่อ reask
+rail ที่มี validator ที่ตรวจในโปรเซสไม่ได้ (เช่น no-profanity) ยังผ่าน Guard.parse เสมอ แต่ส่ง JSON ที่ซ่อมแล้ว
+จึงไม่ต้อง reask เพราะรูปแบบผิด
+"""
+import ast
+import json
+import re
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import telemetry
+
+# regex ใน rail เป็นรูป ^(?!.*(คำ1|คำ2|...)).*$ = ห้ามมีคำใดคำหนึ่ง
+_FORBIDDEN_LOOKAHEAD = re.compile(r"^\^\(\?!\.\*\((?P<terms>[^()]*)\)\)\.\*\$$")
+_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+# คำที่มีคำต้องห้ามเป็นส่วนหนึ่งแต่ไม่ใช่ความหมายนั้น (ลบออกก่อนค้นคำต้องห้าม ยาวก่อนสั้น)
+FORBIDDEN_ALLOWLIST = (
+    "โรงพยาบาล", "พยาบาล", "พยายาม", "พยาธิ", "รักษาความสะอาด",
+    "กลับ", "หลับ", "สลับ", "ยาก", "ยาว", "ยาง", "ยาม", "ยาย",
+)
+_ALLOWED = re.compile("|".join(re.escape(w) for w in sorted(FORBIDDEN_ALLOWLIST, key=len, reverse=True)))
+# on-fail ที่ Guard แก้ค่าเอง (ไม่ตั้ง = noop: Guard แค่บันทึกว่าไม่ผ่าน แล้วคืนค่าเดิม)
+_REDACT_ON_FAIL = {"fix", "filter", "reask"}
+
+REASK_NUM = 1  # จำนวน reask ที่ Guard ทำได้เมื่อส่งต่อ (เท่ากับค่าเริ่มต้นของ Guard)
+# การซ่อมที่ parser ของ Guard ทำเองไม่ได้ (ผลดิบแบบนี้ Guard จะ reask) ส่วน ``` / ข้อความรอบ JSON /
+# ค่าไม่ใช่สตริง / ฟิลด์เกิน Guard รับได้อยู่แล้ว จึงไม่นับว่าประหยัด reask
+_REASK_REPAIRS = {"trailing_comma", "python_literal"}
+
+
+class OutputSpec:
+    """ฟิลด์สตริงที่ต้องมี + คำต้องห้าม (จาก <regex>) + validator อื่นที่ต้องให้ Guard ตรวจ"""
+
+    def __init__(self, fields, forbidden_terms=(), guard_validators=(), forbidden_on_fail="noop"):
+        self.fields = list(fields)
+        self.forbidden_terms = list(forbidden_terms)
+        self.guard_validators = list(guard_validators)
+        # on-fail-regex ใน rail: fix / filter / reask = ตัดบรรทัดที่มีคำต้องห้าม, อย่างอื่น = คงค่าเดิม
+        self.forbidden_on_fail = forbidden_on_fail
+        self.forbidden = (
+            re.compile("|".join(re.escape(t) for t in self.forbidden_terms), re.IGNORECASE)
+            if self.forbidden_terms else None
+        )
+
+    def find_forbidden(self, text):
+        """คำต้องห้ามแรกที่พบ (match หรือ None) หลังลบคำใน FORBIDDEN_ALLOWLIST ออก"""
+        if self.forbidden is None:
+            return None
+        return self.forbidden.search(_ALLOWED.sub(" ", text))
+
+    @property
+    def redact_forbidden(self):
+        return self.forbidden_on_fail in _REDACT_ON_FAIL
+
+    @classmethod
+    def from_rail(cls, path):
+        root = ET.parse(path).getroot()
+        output = root.find("output")
+        fields, terms, others = [], [], []
+        on_fail = "noop"
+        for element in output:
+            fields.append(element.get("name"))
+            on_fail = element.get("on-fail-regex") or on_fail
+            for validator in element:
+                pattern = validator.get("pattern", "") if validator.tag == "regex" else ""
+                m = _FORBIDDEN_LOOKAHEAD.match(pattern)
+                if m:
+                    terms.extend(t for t in m.group("terms").split("|") if t)
+                else:
+                    others.append(validator.tag)
+        return cls(fields, terms, others, on_fail)
+
+
+class CheckResult:
+    def __init__(self, output=None, repairs=(), error=None, saves_reask=False, forbidden_hits=()):
+        self.output = output
+        self.repairs = list(repairs)
+        self.error = error
+        self.saves_reask = saves_reask
+        self.forbidden_hits = list(forbidden_hits)  # ฟิลด์ที่พบคำต้องห้าม (ตัดออกหรือไม่ขึ้นกับ on-fail)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_json(self):
+        return json.dumps(self.output, ensure_ascii=False)
+
+
+def extract_json_object(raw):
+    """หา JSON object ในข้อความดิบ คืน (dict หรือ None, [การซ่อมที่ทำ])"""
+    repairs = []
+    text = (raw or "").strip()
+    if "```" in text:
+        text = _FENCE.sub("", text).strip()
+        repairs.append("fence")
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None, repairs
+    if start > 0 or end < len(text) - 1:
+        repairs.append("surrounding_text")
+    text = text[start:end + 1]
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = None
+        fixed = _TRAILING_COMMA.sub(r"\1", text)
+        try:
+            value = json.loads(fixed)
+            repairs.append("trailing_comma")
+        except ValueError:
+            try:
+                value = ast.literal_eval(fixed)
+                repairs.append("python_literal")
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                return None, repairs
+    return (value if isinstance(value, dict) else None), repairs
+
+
+def redact_forbidden(text, spec):
+    """ตัดบรรทัดที่มีคำต้องห้ามออก คืนข้อความที่เหลือ (อาจเป็นสตริงว่าง)"""
+    kept = [line for line in text.split("\n") if not spec.find_forbidden(line)]
+    return "\n".join(kept).strip()
+
+
+class LocalValidator:
+    def __init__(self, spec):
+        self.spec = spec
+
+    @classmethod
+    def from_rail(cls, path):
+        return cls(OutputSpec.from_rail(path))
+
+    def check(self, raw):
+        value, repairs = extract_json_object(raw)
+        if value is None:
+            return CheckResult(repairs=repairs, error="no_json")
+        output, hits = {}, []
+        for field in self.spec.fields:
+            item = value.get(field)
+            if item is None:
+                return CheckResult(repairs=repairs, error=f"missing:{field}")
+            if not isinstance(item, str):
+                item = json.dumps(item, ensure_ascii=False) if isinstance(item, (list, dict)) else str(item)
+                repairs.append("coerce_string")
+            if self.spec.find_forbidden(item):
+                hits.append(field)
+                if self.spec.redact_forbidden:
+                    item = redact_forbidden(item, self.spec)
+                    repairs.append("redact")
+                    if not item and self.spec.forbidden_on_fail == "reask":
+                        # ไม่เหลือข้อความ ต้องให้ Guard reask เหมือนเดิม
+                        return CheckResult(repairs=repairs, error=f"forbidden:{field}", forbidden_hits=hits)
+            output[field] = item
+        if len(value) != len(output):
+            repairs.append("extra_fields")
+        saves_reask = bool(_REASK_REPAIRS.intersection(repairs)) or (
+            "redact" in repairs and self.spec.forbidden_on_fail == "reask"
+        )
+        return CheckResult(output, repairs, saves_reask=saves_reask, forbidden_hits=hits)
+
+
+class ValidationStats:
+    """ตัวนับรวมทั้งโปรเซส: ผ่านเลย / ซ่อมได้ / ส่งต่อ Guard และจำนวนการเรียก Guard / LLM ที่ประหยัดได้"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._repairs = Counter()
+
+    def record(self, result, escalated, escalation_llm_calls=0, guard_called=None):
+        """guard_called: เรียก Guard.parse หรือไม่ (ค่าเริ่มต้น = escalated)"""
+        guard_called = escalated if guard_called is None else guard_called
+        with self._lock:
+            self._counts["requests"] += 1
+            if not guard_called:
+                self._counts["guard_calls_saved"] += 1
+            if result.forbidden_hits:
+                self._counts["forbidden_hits"] += 1
+            if not result.ok:
+                self._counts["local_failed"] += 1
+            elif result.repairs:
+                self._counts["repaired"] += 1
+                if result.saves_reask:
+                    self._counts["reasks_saved"] += 1
+            else:
+                self._counts["clean"] += 1
+            if escalated:
+                self._counts["escalated"] += 1
+                self._counts["escalation_llm_calls"] += escalation_llm_calls
+            self._repairs.update(set(result.repairs))
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._repairs.clear()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            repairs = dict(self._repairs)
+        requests = counts.get("requests", 0)
+
+        def per_1k(name):
+            return round(counts.get(name, 0) * 1000 / requests, 1) if requests else 0.0
+
+        return {
+            "requests": requests,
+            "clean": counts.get("clean", 0),
+            "repaired": counts.get("repaired", 0),
+            "local_failed": counts.get("local_failed", 0),
+            "escalated": counts.get("escalated", 0),
+            "reasks_saved": counts.get("reasks_saved", 0),
+            # reask หนึ่งรอบ = เรียก LLM หนึ่งครั้ง
+            "llm_calls_saved": counts.get("reasks_saved", 0),
+            # คำขอที่ตอบได้โดยไม่สร้าง / เรียก Guard.parse เลย
+            "guard_calls_saved": counts.get("guard_calls_saved", 0),
+            "forbidden_hits": counts.get("forbidden_hits", 0),
+            "escalation_llm_calls": counts.get("escalation_llm_calls", 0),
+            "reasks_saved_per_1k": per_1k("reasks_saved"),
+            "llm_calls_saved_per_1k": per_1k("reasks_saved"),
+            "guard_calls_saved_per_1k": per_1k("guard_calls_saved"),
+            "calls_saved_per_1k": round(per_1k("reasks_saved") + per_1k("guard_calls_saved"), 1),
+            "escalated_per_1k": per_1k("escalated"),
+            "repairs": repairs,
+        }
+
+
+validation_stats = ValidationStats()
+
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+def get_validator(rail):
+    with _validators_lock:
+        validator = _validators.get(rail)
+        if validator is None:
+            validator = LocalValidator.from_rail(rail)
+            _validators[rail] = validator
+        return validator
+
+
+def _llm_calls(guard):
+    # จำนวนครั้งที่ Guard เรียก LLM ในการ parse ล่าสุด (iteration แรกใช้ข้อความที่ส่งไป ไม่ได้เรียก LLM)
+    try:
+        return max(0, len(guard.history.last.iterations) - 1)
+    except (AttributeError, IndexError, TypeError):
+        return 0
+
+
+def _guard_output(result, response):
+    """
+    ผลจาก Guard.parse: ส่ง JSON ที่ตรวจแล้วไป Guard ตรวจ validator ที่เหลือ ถ้าผ่านให้คืนค่าเดียวกับทางในโปรเซส
+    (Guard ไม่ได้แก้ค่าที่ตัดคำต้องห้ามแล้วหรือคงไว้ตาม on-fail อีก) ถ้าซ่อมเองไม่ได้ใช้ผลของ Guard (reask) ตามเดิม
+    """
+    output = response.validated_output
+    if not output:
+        return {}
+    if result.ok and isinstance(output, dict):
+        return {field: output.get(field, value) if field not in result.forbidden_hits else value
+                for field, value in result.output.items()}
+    return output
+
+
+def guarded_llm_call(rail, get_guard, prompt, llm_api, llm_params):
+    """
+    เรียก llm_api แล้วตรวจผลในโปรเซสก่อน คืน dict ของฟิลด์ใน rail หรือ {} ถ้าไม่ผ่าน
+    Guard (get_guard) ถูกสร้างและเรียกเฉพาะเมื่อซ่อมเองไม่ได้ หรือ rail มี validator ที่ตรวจเองไม่ได้
+    """
+    with telemetry.span("llm_call"):
+        raw = llm_api(prompt, **llm_params)
+    validator = get_validator(rail)
+    with telemetry.span("local_validation"):
+        result = validator.check(raw)
+    if result.repairs:
+        telemetry.annotate(repairs=result.repairs)
+    if result.forbidden_hits:
+        telemetry.annotate(forbidden_hits=result.forbidden_hits)
+    if result.ok and not validator.spec.guard_validators:
+        validation_stats.record(result, escalated=False)
+        return result.output
+    guard = get_guard()
+    with telemetry.span("guard_validation", escalated=not result.ok):
+        response = guard.parse(result.to_json() if result.ok else raw, llm_api=llm_api, num_reasks=REASK_NUM,
+                           prompt=prompt, llm_params=llm_params)
+    validation_stats.record(result, escalated=not result.ok, escalation_llm_calls=_llm_calls(guard), guard_called=True)
+    return _guard_output(result, response)
+
+
+async def guarded_llm_call_async(rail, get_guard, prompt, llm_api, llm_params):
+    """เหมือน guarded_llm_call สำหรับ llm_api แบบ async และ AsyncGuard"""
+    with telemetry.span("llm_call"):
+        raw = await llm_api(prompt, **llm_params)
+    validator = get_validator(rail)
+    with telemetry.span("local_validation"):
+        result = validator.check(raw)
+    if result.repairs:
+        telemetry.annotate(repairs=result.repairs)
+    if result.forbidden_hits:
+        telemetry.annotate(forbidden_hits=result.forbidden_hits)
+    if result.ok and not validator.spec.guard_validators:
+        validation_stats.record(result, escalated=False)
+        return result.output
+    guard = get_guard()
+    with telemetry.span("guard_validation", escalated=not result.ok):
+        response = await guard.parse(result.to_json() if result.ok else raw, llm_api=llm_api, num_reasks=REASK_NUM,
+                                 prompt=prompt, llm_params=llm_params)
+    validation_stats.record(result, escalated=not result.ok, escalation_llm_calls=_llm_calls(guard), guard_called=True)
+    return _guard_output(result, response)
@@ -0,0 +1,195 @@
+# main.py
+# Back-end FastAPI ของแชตบอท: uvicorn main:app --reload
+import asyncio
+import io
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Union
+
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from PIL import Image, UnidentifiedImageError
+from pydantic import BaseModel
+
+import chatbot
+from chatbot_async import ask_bot_async, ask_bot_async_stream
+from lazy_resources import resource_status
+from local_validation import validation_stats
+import telemetry
+from session_store import get_session_store
+from skin_cache import get_skin_result_cache
+from skin_inference_service import get_skin_inference_service
+from symptom_session import session_symptoms
+
+@asynccontextmanager
+async def lifespan(app):
+    # WARM_UP=1 / background โหลด Guard ตารางอาการ และโมเดลล่วงหน้า (ไม่ตั้ง = โหลดตอนคำขอแรก)
+    chatbot.start_warm_up()
+    # ฐานความรู้ (ตารางอาการ + index) โหลดเสมอก่อนรับคำขอ ในเธรดแยก คำขอแรกจะไม่บล็อก event loop
+    await asyncio.to_thread(chatbot.get_knowledge_base)
+    await asyncio.to_thread(get_session_store)
+    yield
+
+
+app = FastAPI(title="AI Health Symptom Advisor", lifespan=lifespan)
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+    n_results: int = 1
+    mode: Optional[str] = None  # sequential / speculative / fast
+    reset_symptoms: bool = False  # ล้างอาการที่สะสมไว้ใน session ก่อนตอบ
+
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    reply: str
+    timings: Optional[Dict[str, Union[float, str]]] = None
+    symptoms: List[str] = []  # อาการที่สะสมไว้ใน session หลังเทิร์นนี้
+
+
+class MessageItem(BaseModel):
+    seq: int
+    role: str
+    content: str
+    created_at: float
+
+
+class HistoryResponse(BaseModel):
+    session_id: str
+    messages: List[MessageItem]
+    has_more: bool
+    next_before: Optional[int] = None  # ส่งเป็น before เพื่ออ่านหน้าก่อนหน้า
+
+
+class SkinResponse(BaseModel):
+    predicted_class: str
+    confidence: float
+    cached: Optional[str] = None  # exact / near ถ้าได้ผลจากแคชภาพ (skin_cache.py)
+
+
+def check_mode(mode):
+    if mode is not None and mode not in chatbot.CHAIN_MODES:
+        raise HTTPException(status_code=422, detail=f"mode ต้องเป็นหนึ่งใน {list(chatbot.CHAIN_MODES)}")
+
+
+def health_status():
+    return {
+        "status": "ok",
+        "symptoms": len(chatbot.known_symptoms),
+        "diseases": len(chatbot.known_diseases),
+        "sessions": get_session_store().stats(),
+        "response_cache": chatbot.response_cache.stats(),
+        "single_flight": chatbot.llm_flight.stats(),
+        "validation": validation_stats.stats(),
+        "llm": chatbot.get_llm_client().stats(),
+        "knowledge_base": chatbot.get_knowledge_base().status(),
+        "resources": resource_status(),
+    }
+
+
+@app.get("/health")
+async def health():
+    # สถิติ session store (SQLite) และฐานความรู้อาจต้องอ่านไฟล์ ทำในเธรดแยก
+    return await asyncio.to_thread(health_status)
+
+
+@app.post("/knowledge/reload")
+async def reload_knowledge():
+    """ตรวจไฟล์ฐานความรู้ทันที (ไม่ต้องรอ watcher) สร้างชุดใหม่ในเธรดแยก คำขออื่นทำงานต่อได้ระหว่างนั้น"""
+    kb = chatbot.get_knowledge_base()
+    snapshot = await asyncio.to_thread(kb.reload)
+    return {"reloaded": snapshot is not None, **kb.status()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus: เวลาแต่ละขั้น (histogram), token, แคช hit/miss, เหตุการณ์ของไคลเอนต์ LLM และโมเดลผิวหนัง"""
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    check_mode(req.mode)
+    session_id = req.session_id or uuid.uuid4().hex
+    # สถานะต่อ session อยู่ใน session store (SESSION_STORE_DB = SQLite ใช้ร่วมกันทุก worker) ดู session_store.py
+    # การอ่าน/เขียน store ทำในเธรดแยก ไม่บล็อก event loop
+    store = get_session_store()
+    state = await asyncio.to_thread(store.load_state, session_id)
+    state.pop("timings", None)
+    await asyncio.to_thread(store.append_message, session_id, "user", req.message)
+    reply = await ask_bot_async(req.message, n_results=req.n_results, greeted=state["greeted"], state=state,
+                                mode=req.mode, reset=req.reset_symptoms)
+    state["greeted"] = True
+    await asyncio.to_thread(store.save_state, session_id, state)
+    await asyncio.to_thread(store.append_message, session_id, "ai", reply)
+    return ChatResponse(session_id=session_id, reply=reply, timings=state.get("timings"),
+                        symptoms=session_symptoms(state))
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """สตรีมคำตอบเป็น text/plain ทีละส่วน (session id อยู่ใน header X-Session-Id)"""
+    check_mode(req.mode)
+    session_id = req.session_id or uuid.uuid4().hex
+    store = get_session_store()
+    state = await asyncio.to_thread(store.load_state, session_id)
+    await asyncio.to_thread(store.append_message, session_id, "user", req.message)
+
+    async def body():
+        parts = []
+        try:
+            async for text in ask_bot_async_stream(req.message, n_results=req.n_results,
+                                                   greeted=state["greeted"], state=state, mode=req.mode,
+                                                   reset=req.reset_symptoms):
+                parts.append(text)
+                yield text
+        finally:
+            state["greeted"] = True
+            await asyncio.to_thread(store.save_state, session_id, state)
+            if parts:
+                await asyncio.to_thread(store.append_message, session_id, "ai", "".join(parts))
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8",
+                             headers={"X-Session-Id": session_id})
+
+
+@app.post("/skin", response_model=SkinResponse)
+async def skin(file: UploadFile = File(...)):
+    """วิเคราะห์ภาพผิวหนัง (ส่งเข้าบริการ batch ตัวเดียวกับ Streamlit)"""
+    data = await file.read()
+    try:
+        # อ่านแค่ header ถอดรหัสจริง (แบบย่อขนาดสำหรับ JPEG) ทำในบริการ
+        image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=400, detail="ไฟล์ไม่ใช่รูปภาพที่รองรับ")
+    # ภาพซ้ำ / ใกล้เคียงมากไม่ต้องเข้าคิวโมเดล (perceptual hash ต้องถอดรหัสภาพ จึงทำในเธรดแยก)
+    skin_cache = get_skin_result_cache()
+    cached, fingerprint = await asyncio.to_thread(skin_cache.lookup, data)
+    if cached is not None:
+        return SkinResponse(predicted_class=cached["predicted_class"], confidence=cached["confidence"],
+                            cached=cached["match"])
+    predicted_class, confidence = await get_skin_inference_service().predict_async(image)
+    await asyncio.to_thread(skin_cache.store, fingerprint, predicted_class, confidence)
+    return SkinResponse(predicted_class=predicted_class, confidence=confidence)
+
+
+@app.get("/skin/metrics")
+async def skin_metrics():
+    return {**get_skin_inference_service().metrics(), "cache": get_skin_result_cache().stats()}
+
+
+@app.get("/sessions/{session_id}/messages", response_model=HistoryResponse)
+async def session_messages(session_id: str, limit: int = Query(20, ge=1, le=200), before: Optional[int] = None):
+    """ประวัติทีละหน้า (หน้าล่าสุดก่อน ในหน้าเรียงเก่า -> ใหม่ ถ้า has_more ส่ง before=next_before เพื่ออ่านหน้าก่อนหน้า)"""
+    messages, has_more = await asyncio.to_thread(get_session_store().messages, session_id, limit=limit, before=before)
+    return HistoryResponse(session_id=session_id, messages=messages, has_more=has_more,
+                           next_before=messages[0]["seq"] if has_more and messages else None)
+
+
+@app.delete("/sessions/{session_id}")
+async def reset_session(session_id: str):
+    await asyncio.to_thread(get_session_store().delete, session_id)
+    return {"session_id": session_id, "reset": True}
@@ -0,0 +1,276 @@
+# phrase_index.py
+"""
+ดัชนีค้นหาประโยคตัวอย่างอาการ ("อาการโดยสังเขป" ใน symptoms_data.json) ด้วย TF-IDF ของ character n-gram
+
+ข้อความภาษาไทยไม่เว้นวรรคจึงใช้ n-gram ของตัวอักษร (ค่าเริ่มต้น 2-3) ไม่ต้องตัดคำ แต่ละประโยคเป็นเวกเตอร์
+TF-IDF (tf แบบ log) ที่ normalize แล้ว เก็บเป็น inverted index (n-gram -> รายการ (ประโยค, น้ำหนัก))
+การค้นหาคือ cosine similarity: รวมน้ำหนักจาก posting ของ n-gram ในข้อความด้วย numpy แล้วเลือก top-k
+ด้วย argpartition เวลาต่อคำค้นขึ้นกับจำนวน posting ที่แตะ ไม่ได้ไล่เทียบทุกประโยค
+
+artifact (ค่าเริ่มต้น <โฟลเดอร์ JSON>/.phrase_index/<ชื่อไฟล์ JSON>/) สร้างล่วงหน้าได้ และเปิดแบบ mmap
+ไฟล์ข้อมูลอยู่ในโฟลเดอร์ย่อยต่อเวอร์ชัน (ดู write_version_dir ใน symptom_table_cache.py) meta.json ชี้ไปด้วยฟิลด์ data:
+    ptr.npy      ตำแหน่งเริ่ม posting ของแต่ละ n-gram (int64, ยาว V+1)
+    ids.npy      รหัสประโยคใน posting (int32)
+    weights.npy  น้ำหนัก TF-IDF ใน posting (float32)
+    idf.npy      idf ของแต่ละ n-gram (float32)
+    labels.npy   รหัสโรคของแต่ละประโยค (int32)
+    phrases.json ประโยคตัวอย่าง
+    meta.json    (ระดับบนสุด) n-gram ทั้งหมด (ลำดับ = รหัส) รายชื่อโรค sha256 ของ JSON ต้นทาง และโฟลเดอร์ข้อมูล
+                 (เขียนเป็นไฟล์สุดท้าย)
+
+สร้างล่วงหน้า (build step):
+    python phrase_index.py ./symptoms_data.json
+"""
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+from knowledge_context import DISEASE_KEY, EXAMPLES_KEY
+from symptom_table_cache import file_sha256, prune_versions, write_atomic, write_version_dir
+
+ARTIFACT_VERSION = 2
+CACHE_DIR_NAME = ".phrase_index"
+NGRAM_RANGE = (2, 3)
+
+_SPACE_RE = re.compile(r"[\s,.!?;:()\"'“”]+")
+
+
+def normalize(text):
+    return " " + _SPACE_RE.sub(" ", str(text).lower()).strip() + " "
+
+
+def char_ngrams(text, ngram_range=NGRAM_RANGE):
+    text = normalize(text)
+    low, high = ngram_range
+    return Counter(text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1))
+
+
+def _tf(counts):
+    return 1.0 + np.log(counts)
+
+
+class PhraseIndex:
+    def __init__(self, vocab, ptr, ids, weights, idf, labels, phrases, diseases, ngram_range=NGRAM_RANGE,
+                 content_hash=None):
+        self.vocab = vocab if isinstance(vocab, dict) else {gram: i for i, gram in enumerate(vocab)}
+        self.ptr = ptr
+        self.ids = ids
+        self.weights = weights
+        self.idf = idf
+        self.labels = labels
+        self.phrases = phrases
+        self.diseases = list(diseases)
+        self.ngram_range = tuple(ngram_range)
+        self.content_hash = content_hash
+
+    def __len__(self):
+        return len(self.phrases)
+
+    @classmethod
+    def build(cls, entries, ngram_range=NGRAM_RANGE):
+        """สร้างจาก [{"โรค": ..., "อาการโดยสังเขป": [...]}, ...] (ประโยคซ้ำในโรคเดียวกันนับครั้งเดียว)"""
+        phrases, labels, diseases, disease_index = [], [], [], {}
+        seen = set()
+        for entry in entries:
+            disease = str(entry.get(DISEASE_KEY, "")).strip()
+            if not disease:
+                continue
+            code = disease_index.setdefault(disease, len(diseases))
+            if code == len(diseases):
+                diseases.append(disease)
+            for phrase in entry.get(EXAMPLES_KEY, []):
+                phrase = str(phrase).strip()
+                if phrase and (code, phrase) not in seen:
+                    seen.add((code, phrase))
+                    phrases.append(phrase)
+                    labels.append(code)
+
+        vocab = {}
+        rows, cols, counts = [], [], []
+        for row, phrase in enumerate(phrases):
+            for gram, count in char_ngrams(phrase, ngram_range).items():
+                rows.append(row)
+                cols.append(vocab.setdefault(gram, len(vocab)))
+                counts.append(count)
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int64)
+        n_docs = len(phrases)
+        df = np.bincount(cols, minlength=len(vocab))
+        idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+        weights = _tf(np.asarray(counts, dtype=np.float32)) * idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=n_docs))
+        weights = (weights / np.maximum(norms[rows], 1e-12)).astype(np.float32)
+
+        order = np.argsort(cols, kind="stable")
+        ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=ptr[1:])
+        return cls(vocab, ptr, rows[order], weights[order], idf, np.asarray(labels, dtype=np.int32), phrases,
+                   diseases, ngram_range)
+
+    @classmethod
+    def from_json(cls, path, ngram_range=NGRAM_RANGE):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.build(json.load(f), ngram_range)
+
+    # ================= ค้นหา =================
+    def _query(self, text):
+        grams = char_ngrams(text, self.ngram_range)
+        cols, counts = [], []
+        for gram, count in grams.items():
+            col = self.vocab.get(gram)
+            if col is not None:
+                cols.append(col)
+                counts.append(count)
+        if not cols:
+            return None, None
+        cols = np.asarray(cols, dtype=np.int64)
+        q = _tf(np.asarray(counts, dtype=np.float32)) * self.idf[cols]
+        # normalize ด้วย n-gram ทั้งหมดของข้อความ (n-gram ที่ไม่มีในดัชนีก็ทำให้คล้ายน้อยลง)
+        unseen = sum(1.0 for gram in grams if gram not in self.vocab)
+        norm = math.sqrt(float(np.dot(q, q)) + unseen * float(self.idf.max()) ** 2)
+        return cols, q / norm
+
+    def scores(self, text):
+        """(รหัสประโยคที่มี n-gram ร่วม, cosine similarity) ไม่เรียงลำดับ"""
+        cols, q = self._query(text)
+        if cols is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        starts, ends = self.ptr[cols], self.ptr[cols + 1]
+        lengths = ends - starts
+        # ดึง posting ทุก n-gram ในคราวเดียว (ไม่วนลูปต่อ n-gram ด้วย Python)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        ids = self.ids[offsets]
+        contrib = self.weights[offsets] * np.repeat(q, lengths)
+        if len(ids) * 8 < len(self.phrases):
+            # แตะไม่กี่ประโยค รวมเฉพาะประโยคที่พบ
+            touched, inverse = np.unique(ids, return_inverse=True)
+            return touched, np.bincount(inverse, weights=contrib)
+        totals = np.bincount(ids, weights=contrib, minlength=len(self.phrases))
+        touched = np.flatnonzero(totals)
+        return touched, totals[touched]
+
+    def search(self, text, k=5, min_score=0.0):
+        """ประโยคตัวอย่างที่ใกล้ที่สุด k ประโยค: [(phrase, disease, score), ...] เรียงจากมากไปน้อย"""
+        touched, values = self.scores(text)
+        if len(touched) == 0 or k <= 0:
+            return []
+        if len(touched) > k:
+            top = np.argpartition(-values, k - 1)[:k]
+        else:
+            top = np.arange(len(touched))
+        top = top[np.argsort(-values[top], kind="stable")]
+        return [(self.phrases[touched[i]], self.diseases[self.labels[touched[i]]], round(float(values[i]), 4))
+                for i in top if values[i] > min_score]
+
+    def disease_scores(self, text, k=10, min_score=0.2):
+        """คะแนนโรคจากประโยคใกล้เคียง k ประโยค (ผลรวม similarity ต่อโรค หารด้วยผลรวมทั้งหมด) {โรค: 0..1}"""
+        totals = {}
+        for _, disease, score in self.search(text, k, min_score):
+            totals[disease] = totals.get(disease, 0.0) + score
+        grand = sum(totals.values())
+        return {disease: value / grand for disease, value in totals.items()} if grand else {}
+
+    def memory_usage(self):
+        arrays = (self.ptr, self.ids, self.weights, self.idf, self.labels)
+        return {
+            "arrays": int(sum(a.nbytes for a in arrays)),
+            "vocab": len(self.vocab),
+            "phrases": len(self.phrases),
+        }
+
+
+# ================= artifact บนดิสก์ =================
+def default_artifact_dir(json_path):
+    json_path = os.path.abspath(json_path)
+    return os.path.join(os.path.dirname(json_path), CACHE_DIR_NAME, os.path.basename(json_path))
+
+
+def compile_phrase_index(json_path, artifact_dir=None, ngram_range=NGRAM_RANGE):
+    """สร้างดัชนีจาก JSON แล้วเขียน artifact คืน meta"""
+    artifact_dir = artifact_dir or default_artifact_dir(json_path)
+    os.makedirs(artifact_dir, exist_ok=True)
+    stat = os.stat(json_path)
+    sha256 = file_sha256(json_path)
+    index = PhraseIndex.from_json(json_path, ngram_range)
+
+    def write_files(directory):
+        for name, array in (("ptr", index.ptr), ("ids", index.ids), ("weights", index.weights),
+                            ("idf", index.idf), ("labels", index.labels)):
+            with open(os.path.join(directory, f"{name}.npy"), "wb") as f:
+                np.save(f, array)
+        with open(os.path.join(directory, "phrases.json"), "w", encoding="utf-8") as f:
+            json.dump(index.phrases, f, ensure_ascii=False)
+
+    data = f"v{ARTIFACT_VERSION}-{sha256[:16]}-{ngram_range[0]}{ngram_range[1]}"
+    write_version_dir(artifact_dir, data, write_files)
+    meta = {
+        "version": ARTIFACT_VERSION,
+        "data": data,
+        "sha256": sha256,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "ngram_range": list(ngram_range),
+        "diseases": index.diseases,
+        "vocab": list(index.vocab),
+        "phrases": len(index.phrases),
+    }
+    write_atomic(os.path.join(artifact_dir, "meta.json"),
+                 lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+    prune_versions(artifact_dir, data)
+    # ไฟล์รูปแบบเดิม (ARTIFACT_VERSION 1) ที่วางไว้ระดับบนสุด
+    for name in ("ptr.npy", "ids.npy", "weights.npy", "idf.npy", "labels.npy", "phrases.json"):
+        try:
+            os.remove(os.path.join(artifact_dir, name))
+        except OSError:
+            pass
+    return meta
+
+
+def _read_meta(artifact_dir, json_path, ngram_range):
+    try:
+        with open(os.path.join(artifact_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != ARTIFACT_VERSION or tuple(meta.get("ngram_range", ())) != tuple(ngram_range):
+        return None
+    if not os.path.isdir(os.path.join(artifact_dir, meta["data"])):
+        return None
+    stat = os.stat(json_path)
+    if stat.st_size == meta["size"] and stat.st_mtime_ns == meta["mtime_ns"]:
+        return meta
+    # mtime เปลี่ยนแต่เนื้อไฟล์เดิม (เช่น checkout ใหม่) ยังใช้ artifact ได้
+    if stat.st_size == meta["size"] and file_sha256(json_path) == meta["sha256"]:
+        return meta
+    return None
+
+
+def load_phrase_index(json_path, artifact_dir=None, rebuild=True, ngram_range=NGRAM_RANGE):
+    """โหลดดัชนีจาก artifact แบบ mmap (สร้างใหม่อัตโนมัติเมื่อ JSON เปลี่ยน)"""
+    artifact_dir = artifact_dir or default_artifact_dir(json_path)
+    meta = _read_meta(artifact_dir, json_path, ngram_range)
+    if meta is None:
+        if not rebuild:
+            raise FileNotFoundError(f"ไม่พบ artifact ที่ตรงกับ {json_path} ใน {artifact_dir}")
+        meta = compile_phrase_index(json_path, artifact_dir, ngram_range)
+    data_dir = os.path.join(artifact_dir, meta["data"])
+    arrays = {name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+              for name in ("ptr", "ids", "weights", "idf", "labels")}
+    with open(os.path.join(data_dir, "phrases.json"), "r", encoding="utf-8") as f:
+        phrases = json.load(f)
+    return PhraseIndex(meta["vocab"], arrays["ptr"], arrays["ids"], arrays["weights"], np.asarray(arrays["idf"]),
+                       arrays["labels"], phrases, meta["diseases"], meta["ngram_range"], content_hash=meta["sha256"])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python phrase_index.py <symptoms_data.json> [artifact_dir]")
+        sys.exit(1)
+    result = compile_phrase_index(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"compiled {sys.argv[1]}: {result['phrases']} phrases, {len(result['vocab'])} n-grams, "
+          f"{len(result['diseases'])} diseases, sha256 {result['sha256'][:12]}")
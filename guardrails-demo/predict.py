@@ -1,9 +1,154 @@
 # predict.py
-import pandas as pd
-from rapidfuzz import process
-from collections import defaultdict
+import argparse
+import json
+import sys
+import weakref
+
+import numpy as np
+
+from symptom_extractor import get_symptom_extractor
+
+
+class SymptomScorer:
+    """
+    ตัวคำนวณคะแนนโรคที่ถูกคอมไพล์ไว้ล่วงหน้าจากตาราง one-hot
+
+    เก็บเมทริกซ์ เคส x อาการ (column-major เพื่อให้ดึงเฉพาะคอลัมน์อาการที่ผู้ใช้แจ้งได้เร็ว)
+    พร้อมรหัสกลุ่มโรคของแต่ละแถว การให้คะแนนจึงเหลือแค่ matrix-vector product
+    ตามด้วยค่าเฉลี่ยรายกลุ่ม แทนการวนลูปทีละแถวด้วย Python
+    """
+
+    def __init__(self, matrix, row_codes, diseases, symptoms, content_hash=None):
+        self.matrix = matrix
+        self.row_codes = row_codes
+        self.diseases = list(diseases)
+        self.symptoms = list(symptoms)
+        self.symptom_index = {s: i for i, s in enumerate(self.symptoms)}
+        self.case_counts = np.bincount(row_codes, minlength=len(self.diseases))
+        # sha256 ของ CSV ต้นทาง (มีเมื่อโหลดจาก artifact ที่คอมไพล์ไว้)
+        self.content_hash = content_hash
+        self._profile = None
+
+    @classmethod
+    def from_dataframe(cls, df, disease_col, symptoms=None):
+        if symptoms is None:
+            symptoms = [col for col in df.columns if col != disease_col and not col.startswith("Unnamed")]
+        values = df[symptoms].to_numpy()
+        # one-hot ปกติเป็น 0/1 จึงเก็บเป็น uint8 ได้ ถ้ามีค่าอื่นปนอยู่ให้คงเป็น float64 เพื่อผลลัพธ์เท่าเดิม
+        if values.size and np.issubdtype(values.dtype, np.integer) and values.min() >= 0 and values.max() <= 255:
+            values = values.astype(np.uint8)
+        else:
+            values = values.astype(np.float64)
+        matrix = np.asfortranarray(values)
+        # เรียงกลุ่มโรคตามลำดับที่พบครั้งแรกในไฟล์ ให้ลำดับตอนเสมอกันตรงกับของเดิม
+        import pandas as pd
+        row_codes, diseases = pd.factorize(df[disease_col], sort=False, use_na_sentinel=False)
+        return cls(matrix, row_codes.astype(np.intp), list(diseases), symptoms)
+
+    def _query_columns(self, symptom_list):
+        # อาการซ้ำนับซ้ำเหมือนเดิม อาการที่ไม่มีในตารางนับเป็น 0 แต่ยังนับรวมในตัวหาร
+        weights = {}
+        for symptom in symptom_list:
+            idx = self.symptom_index.get(symptom)
+            if idx is not None:
+                weights[idx] = weights.get(idx, 0) + 1
+        cols = np.fromiter(weights.keys(), dtype=np.intp, count=len(weights))
+        mult = np.fromiter(weights.values(), dtype=np.int64, count=len(weights))
+        return cols, mult
+
+    def _rank(self, total_match, max_total, top_k=None):
+        avg = (total_match / self.case_counts) * 100
+        n = len(self.diseases)
+        if top_k is not None and top_k < n:
+            if top_k <= 0:
+                return []
+            # partial sort: เลือกเฉพาะผู้สมัครที่อาจติด top-k (round เป็นฟังก์ชันไม่ลด จึงเผื่อช่วงไว้ 0.01)
+            kth = np.partition(avg, n - top_k)[n - top_k]
+            candidates = np.flatnonzero(avg >= kth - 0.01).tolist()
+        else:
+            candidates = range(n)
+        results = [(self.diseases[i], round(float(avg[i]), 2), max_total) for i in candidates]
+        # เรียงจากโรคที่ตรงกับอาการมากที่สุด
+        results = sorted(results, key=lambda x: x[1], reverse=True)
+        return results if top_k is None else results[:top_k]
+
+    def score(self, symptom_list, top_k=None):
+        max_total = len(symptom_list)
+        if max_total == 0 or not self.diseases:
+            return []
+        cols, mult = self._query_columns(symptom_list)
+        if len(cols):
+            matched = self.matrix[:, cols] @ mult
+        else:
+            matched = np.zeros(len(self.row_codes), dtype=np.int64)
+        # bincount บวกสะสมตามลำดับแถว จึงได้ผลรวมทศนิยมเท่ากับการวนบวกทีละแถวแบบเดิมทุกบิต
+        total_match = np.bincount(self.row_codes, weights=matched / max_total, minlength=len(self.diseases))
+        return self._rank(total_match, max_total, top_k)
+
+    def disease_profile(self):
+        """
+        เมทริกซ์ อาการ x โรค: จำนวนเคสของแต่ละโรคที่มีอาการนั้น (สร้างครั้งแรกที่ขอ)
+        ผลรวมของแถวอาการที่ผู้ใช้มีคือตัวนับต่อโรคที่ score_counts ใช้ เพิ่ม/ถอนอาการจึงแค่บวก/ลบทีละแถว
+        """
+        if self._profile is None:
+            dtype = np.int64 if np.issubdtype(self.matrix.dtype, np.integer) else np.float64
+            profile = np.empty((len(self.symptoms), len(self.diseases)), dtype=dtype)
+            for j in range(len(self.symptoms)):
+                profile[j] = np.bincount(self.row_codes, weights=self.matrix[:, j], minlength=len(self.diseases))
+            self._profile = profile
+        return self._profile
+
+    def score_counts(self, counts, max_total, top_k=None):
+        """
+        จัดอันดับจากตัวนับต่อโรคที่สะสมไว้ ได้ผลเท่ากับ score ของชุดอาการเดียวกันที่ไม่ซ้ำ
+        (ต่างได้ 0.01 เฉพาะค่าที่อยู่บนขอบการปัดพอดี เพราะตัวนับเป็นจำนวนเต็มไม่มีเศษจากการบวกทีละแถว)
+        """
+        if max_total == 0 or not self.diseases:
+            return []
+        return self._rank(np.asarray(counts, dtype=np.float64) / max_total, max_total, top_k)
+
+    def score_batch(self, symptom_lists, top_k=None, chunk_size=256):
+        """ให้คะแนนหลายชุดอาการพร้อมกันด้วย matrix-matrix product เดียวต่อ chunk"""
+        rankings = []
+        for start in range(0, len(symptom_lists), chunk_size):
+            chunk = symptom_lists[start:start + chunk_size]
+            queries = [self._query_columns(symptoms) for symptoms in chunk]
+            used = sorted({c for cols, _ in queries for c in cols.tolist()})
+            position = {c: i for i, c in enumerate(used)}
+            q = np.zeros((len(used), len(chunk)), dtype=np.int64)
+            for j, (cols, mult) in enumerate(queries):
+                for c, m in zip(cols.tolist(), mult.tolist()):
+                    q[position[c], j] = m
+            matched = self.matrix[:, used] @ q if used else np.zeros((len(self.row_codes), len(chunk)), dtype=np.int64)
+            for j, symptoms in enumerate(chunk):
+                max_total = len(symptoms)
+                if max_total == 0 or not self.diseases:
+                    rankings.append([])
+                    continue
+                total_match = np.bincount(self.row_codes, weights=matched[:, j] / max_total, minlength=len(self.diseases))
+                rankings.append(self._rank(total_match, max_total, top_k))
+        return rankings
+
+
+# เก็บ scorer ของแต่ละ DataFrame ไว้ สร้างครั้งเดียวแล้วลบทิ้งอัตโนมัติเมื่อ DataFrame ถูกเก็บกวาด
+_scorers = {}
+
+
+def get_symptom_scorer(df, disease_col):
+    if isinstance(df, SymptomScorer):
+        return df
+    key = (id(df), disease_col)
+    scorer = _scorers.get(key)
+    if scorer is None:
+        scorer = SymptomScorer.from_dataframe(df, disease_col)
+        _scorers[key] = scorer
+        weakref.finalize(df, _scorers.pop, key, None)
+    return scorer
+
 
 def load_symptom_data(csv_path):
+    # import pandas เฉพาะตอนอ่าน CSV (การโหลดจาก artifact ใน symptom_table_cache ไม่ต้องใช้)
+    import pandas as pd
     df = pd.read_csv(csv_path, encoding='utf-8-sig')
     # ค้นหาคอลัมน์โรคที่แท้จริง
     disease_col = None
@@ -15,42 +160,103 @@ def load_symptom_data(csv_path):
         raise ValueError("ไม่พบคอลัมน์ diagnosis/disease/โรค ในไฟล์ CSV")
     # อาการทั้งหมดคือทุกคอลัมน์ที่ไม่ใช่โรค
     known_symptoms = [col for col in df.columns if col != disease_col and not col.startswith("Unnamed")]
+    # คอมไพล์ตารางคะแนนไว้ครั้งเดียวตอนโหลด
+    get_symptom_scorer(df, disease_col)
     return df, known_symptoms, disease_col
 
 def extract_symptoms_from_text(user_text, known_symptoms, threshold=80):
-    words = user_text.replace('และ', ' ').replace(',', ' ').split()
-    matched = set()
-    for word in words:
-        res = process.extractOne(word, known_symptoms, score_cutoff=threshold)
-        if res is not None:
-            match = res[0]
-            matched.add(match)
-    return list(matched)
-
-def predict_disease_percent(symptom_list, df, disease_col):
-    summary = defaultdict(lambda: {"total_match": 0, "case_count": 0, "max_symptom": 0})
-    for _, row in df.iterrows():
-        disease = row[disease_col]
-        matched = sum([row[symptom] for symptom in symptom_list if symptom in df.columns])
-        max_total = len(symptom_list)
-        if max_total > 0:
-            summary[disease]["total_match"] += matched / max_total
-            summary[disease]["case_count"] += 1
-            summary[disease]["max_symptom"] = max_total
-    results = []
-    for disease, stats in summary.items():
-        avg_percent = round((stats["total_match"] / stats["case_count"]) * 100, 2) if stats["case_count"] > 0 else 0.0
-        results.append((disease, avg_percent, stats["max_symptom"]))
-    # เรียงจากโรคที่ตรงกับอาการมากที่สุด
-    return sorted(results, key=lambda x: x[1], reverse=True)
+    return get_symptom_extractor(known_symptoms, threshold).extract(user_text)
+
+def extract_symptom_mentions(user_text, known_symptoms, threshold=80):
+    """[(อาการ, start, end), ...] ลำดับและอาการเหมือน extract_symptoms_from_text"""
+    return get_symptom_extractor(known_symptoms, threshold).mentions(user_text)
+
+def predict_disease_percent(symptom_list, df, disease_col, top_k=None):
+    return get_symptom_scorer(df, disease_col).score(symptom_list, top_k=top_k)
+
+def extract_symptoms_batch(user_texts, known_symptoms, threshold=80):
+    return [extract_symptoms_from_text(text, known_symptoms, threshold) for text in user_texts]
+
+def predict_disease_percent_batch(symptom_lists, df, disease_col, top_k=None):
+    """ให้คะแนน N ชุดอาการในรอบเดียว คืนลิสต์ผลจัดอันดับ N ชุด (รูปแบบเดียวกับ predict_disease_percent)"""
+    return get_symptom_scorer(df, disease_col).score_batch(list(symptom_lists), top_k=top_k)
+
+def predict_messages_batch(user_texts, known_symptoms, df, disease_col, top_k=None, threshold=80):
+    """ดึงอาการและจัดอันดับโรคของ N ข้อความ คืน [(matched_symptoms, ranking), ...]"""
+    symptom_lists = extract_symptoms_batch(user_texts, known_symptoms, threshold)
+    rankings = predict_disease_percent_batch(symptom_lists, df, disease_col, top_k=top_k)
+    return list(zip(symptom_lists, rankings))
+
+def _iter_jsonl_chunks(lines, chunk_size):
+    chunk = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        chunk.append(json.loads(line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_batch_jsonl(in_file, out_file, df, known_symptoms, disease_col, top_k=5, chunk_size=256):
+    """
+    อ่าน JSONL ทีละ chunk แล้วเขียนผลจัดอันดับออกเป็น JSONL ตามลำดับเดิม
+
+    แต่ละบรรทัดอินพุตต้องมี "text" (ข้อความผู้ใช้) หรือ "symptoms" (ลิสต์อาการ) และอาจมี "id"
+    """
+    count = 0
+    for chunk in _iter_jsonl_chunks(in_file, chunk_size):
+        symptom_lists = [
+            record["symptoms"] if "symptoms" in record
+            else extract_symptoms_from_text(record.get("text", ""), known_symptoms)
+            for record in chunk
+        ]
+        rankings = predict_disease_percent_batch(symptom_lists, df, disease_col, top_k=top_k)
+        for record, symptoms, ranking in zip(chunk, symptom_lists, rankings):
+            out = {
+                "id": record.get("id"),
+                "symptoms": symptoms,
+                "ranking": [
+                    {"disease": disease, "percent": percent, "max_symptom": max_symptom}
+                    for disease, percent, max_symptom in ranking
+                ],
+            }
+            out_file.write(json.dumps(out, ensure_ascii=False) + "\n")
+        count += len(chunk)
+    return count
 
 if __name__ == "__main__":
-    csv_path = '/guardrails-demo/data/full_onehot_disease.csv'
-    df, known_symptoms, disease_col = load_symptom_data(csv_path)
+    parser = argparse.ArgumentParser(description="วิเคราะห์โรคจากอาการ")
+    parser.add_argument("--csv", default='/guardrails-demo/data/full_onehot_disease.csv')
+    parser.add_argument("--batch", metavar="INPUT_JSONL",
+                        help="โหมด batch: อ่าน JSONL ({\"id\", \"text\"} หรือ {\"id\", \"symptoms\"}) ใช้ - แทน stdin")
+    parser.add_argument("--output", default="-", help="ไฟล์ JSONL ผลลัพธ์ (ค่าเริ่มต้น stdout)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args()
+
+    df, known_symptoms, disease_col = load_symptom_data(args.csv)
+
+    if args.batch:
+        in_file = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        out_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            n = run_batch_jsonl(in_file, out_file, df, known_symptoms, disease_col,
+                                top_k=args.top_k, chunk_size=args.chunk_size)
+        finally:
+            if in_file is not sys.stdin:
+                in_file.close()
+            if out_file is not sys.stdout:
+                out_file.close()
+        print(f"วิเคราะห์แล้ว {n} ข้อความ", file=sys.stderr)
+        sys.exit(0)
+
     user_text = input("โปรดพิมพ์อาการของคุณเป็นประโยค: ")
     matched_symptoms = extract_symptoms_from_text(user_text, known_symptoms)
     print("\nอาการที่ระบบเข้าใจ:", matched_symptoms)
-    results = predict_disease_percent(matched_symptoms, df, disease_col)
+    results = predict_disease_percent(matched_symptoms, df, disease_col, top_k=args.top_k)
     print("\nระบบวิเคราะห์ว่าอาจเป็นโรคต่อไปนี้:")
-    for i, (disease, percent, max_symptom) in enumerate(results[:5]):
+    for i, (disease, percent, max_symptom) in enumerate(results):
         print(f"{i+1}. {disease}: {percent}% (จากอาการทั้งหมด {max_symptom})")
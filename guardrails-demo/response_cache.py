@@ -0,0 +1,275 @@
+# response_cache.py
+"""
+แคชผลลัพธ์ของเชน LLM (AI1 / AI2 / AI3) สำหรับอินพุตที่ซ้ำกัน
+
+ผู้ใช้ส่วนใหญ่แจ้งอาการชุดเดิมๆ (ไข้ ปวดหัว ไอ) ถ้าอาการ (เรียงแล้ว) อันดับโรค template และพารามิเตอร์
+ของโมเดลเหมือนเดิม ก็ใช้ผลเดิมได้โดยไม่ต้องเรียก Typhoon ซ้ำ
+
+- ชั้นหน่วยความจำ: LRU + TTL
+- ชั้นดิสก์ (ไม่บังคับ): SQLite อยู่รอดข้ามการรีสตาร์ต และใช้ร่วมกันได้หลาย worker
+- ตอน miss ถ้าส่ง flight (single_flight.SingleFlight) มา คำขอคีย์เดียวกันที่เข้ามาระหว่างรอ LLM
+  ใช้การเรียกครั้งเดียวกัน และผลถูกเก็บลงแคชครั้งเดียวโดยคนที่เรียกจริง
+
+ตั้งค่าผ่าน env:
+    RESPONSE_CACHE_SIZE  จำนวนรายการในหน่วยความจำ (0 = ปิดแคช, ค่าเริ่มต้น 1024)
+    RESPONSE_CACHE_TTL   อายุของผลลัพธ์ (วินาที, ค่าเริ่มต้น 86400)
+    RESPONSE_CACHE_DB    path ไฟล์ SQLite (ไม่ตั้ง = ไม่ใช้ชั้นดิสก์)
+    RESPONSE_CACHE_PURGE_INTERVAL  ลบรายการหมดอายุในไฟล์ SQLite ทุกกี่วินาที (ค่าเริ่มต้น 300)
+
+ชั้นดิสก์ใช้ lock แยกจากชั้นหน่วยความจำ (hit ในหน่วยความจำไม่ต้องรอ SQLite) ฝั่ง async
+(call_async / stream_async) อ่าน/เขียน SQLite ผ่าน asyncio.to_thread ไม่บล็อก event loop
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import telemetry
+
+_MISSING = object()
+
+
+def make_key(stage, *parts):
+    """สร้างคีย์แคชจากชื่อขั้นและอินพุตที่มีผลต่อคำตอบ (ต้อง serialize เป็น JSON ได้)"""
+    payload = json.dumps([stage, *parts], ensure_ascii=False, sort_keys=True, default=str)
+    return f"{stage}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def is_cacheable(value):
+    # ไม่เก็บผลว่าง (guard validate ไม่ผ่าน / LLM ตอบว่าง) จะได้ลองใหม่ในครั้งหน้า
+    return value is not None and value != {} and value != ""
+
+
+class ResponseCache:
+    def __init__(self, max_size=1024, ttl=86400, db_path=None, flight=None, purge_interval=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self.flight = flight
+        self.purge_interval = purge_interval
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._misses = Counter()
+        self._disk_hits = Counter()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._last_purge = 0.0
+        if db_path and self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            self._purge_expired()
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls, flight=None):
+        return cls(
+            max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "86400")),
+            db_path=os.getenv("RESPONSE_CACHE_DB") or None,
+            flight=flight,
+            purge_interval=float(os.getenv("RESPONSE_CACHE_PURGE_INTERVAL", "300")),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _stage(self, key):
+        return key.split(":", 1)[0]
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return default
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is _MISSING and self._db is not None:
+            value = self._get_disk(key, now)
+        return self._result(key, value, default)
+
+    async def get_async(self, key, default=None):
+        """เหมือน get แต่อ่านชั้นดิสก์ในเธรดแยก"""
+        if not self.enabled:
+            return default
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is _MISSING and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key, now)
+        return self._result(key, value, default)
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return _MISSING
+            if item[0] > now:
+                self._items.move_to_end(key)
+                self._hits[self._stage(key)] += 1
+                telemetry.record_cache(self._stage(key), True)
+                return item[1]
+            del self._items[key]
+            return _MISSING
+
+    def _get_disk(self, key, now):
+        with self._db_lock:
+            row = self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return _MISSING
+        value = json.loads(row[0])
+        stage = self._stage(key)
+        with self._lock:
+            self._put(key, value, row[1])
+            self._hits[stage] += 1
+            self._disk_hits[stage] += 1
+        telemetry.record_cache(stage, True)
+        return value
+
+    def _result(self, key, value, default):
+        if value is not _MISSING:
+            return value
+        stage = self._stage(key)
+        with self._lock:
+            self._misses[stage] += 1
+        telemetry.record_cache(stage, False)
+        return default
+
+    def _put(self, key, value, expires_at):
+        self._items[key] = (expires_at, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def _set_memory(self, key, value):
+        """เก็บในหน่วยความจำ คืนเวลาหมดอายุ หรือ None ถ้าไม่เก็บ"""
+        if not self.enabled or not is_cacheable(value):
+            return None
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put(key, value, expires_at)
+        return expires_at
+
+    def set(self, key, value):
+        expires_at = self._set_memory(key, value)
+        if expires_at is not None and self._db is not None:
+            self._write_disk(key, value, expires_at)
+
+    async def set_async(self, key, value):
+        """เหมือน set แต่เขียนชั้นดิสก์ในเธรดแยก"""
+        expires_at = self._set_memory(key, value)
+        if expires_at is not None and self._db is not None:
+            await asyncio.to_thread(self._write_disk, key, value, expires_at)
+
+    def _write_disk(self, key, value, expires_at):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+            if time.time() - self._last_purge >= self.purge_interval:
+                self._purge_expired()
+            self._db.commit()
+
+    def _purge_expired(self):
+        # เรียกโดยถือ _db_lock (หรือตอนสร้าง) ใช้ index บน expires_at ไม่ต้องสแกนทั้งตาราง
+        self._last_purge = time.time()
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (self._last_purge,))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._hits.clear()
+            self._misses.clear()
+            self._disk_hits.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            stages = sorted(set(self._hits) | set(self._misses))
+            return {
+                "enabled": self.enabled,
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "disk": self.db_path,
+                "hits": hits,
+                "misses": misses,
+                "disk_hits": sum(self._disk_hits.values()),
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "stages": {s: {"hits": self._hits[s], "misses": self._misses[s]} for s in stages},
+            }
+
+    def call(self, key, fn, *args):
+        """คืนผลจากแคช ถ้าไม่มีก็เรียก fn(*args) แล้วเก็บผลไว้"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.flight is not None:
+            return self.flight.call(key, self._fill, key, fn, *args)
+        return self._fill(key, fn, *args)
+
+    def _fill(self, key, fn, *args):
+        value = fn(*args)
+        self.set(key, value)
+        return value
+
+    async def call_async(self, key, fn, *args):
+        value = await self.get_async(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.flight is not None:
+            return await self.flight.call_async(key, self._fill_async, key, fn, *args)
+        return await self._fill_async(key, fn, *args)
+
+    async def _fill_async(self, key, fn, *args):
+        value = await fn(*args)
+        await self.set_async(key, value)
+        return value
+
+    def stream(self, key, fn, *args):
+        """เหมือน call แต่สำหรับ generator ข้อความ: hit คืนทั้งก้อน miss สตรีมตามปกติแล้วเก็บเมื่อจบครบ"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            yield value
+            return
+        if self.flight is not None:
+            yield from self.flight.stream(key, self._fill_stream, key, fn, *args)
+        else:
+            yield from self._fill_stream(key, fn, *args)
+
+    def _fill_stream(self, key, fn, *args):
+        parts = []
+        for text in fn(*args):
+            parts.append(text)
+            yield text
+        self.set(key, "".join(parts))
+
+    async def stream_async(self, key, fn, *args):
+        value = await self.get_async(key, _MISSING)
+        if value is not _MISSING:
+            yield value
+            return
+        chunks = (self.flight.stream_async(key, self._fill_stream_async, key, fn, *args) if self.flight is not None
+                  else self._fill_stream_async(key, fn, *args))
+        async for text in chunks:
+            yield text
+
+    async def _fill_stream_async(self, key, fn, *args):
+        parts = []
+        async for text in fn(*args):
+            parts.append(text)
+            yield text
+        await self.set_async(key, "".join(parts))
@@ -0,0 +1,324 @@
+# session_store.py
+"""
+ที่เก็บสถานะบทสนทนาต่อ session แยกจาก st.session_state / dict ในโปรเซส
+
+ต่อ session เก็บ 2 ส่วน:
+- state: dict ของ greeted, ai1_res / ai2_res / ai3_reply, timings, ผลวิเคราะห์ภาพผิวหนัง ฯลฯ (ต้อง serialize เป็น JSON ได้)
+- ประวัติข้อความ: เก็บเฉพาะ SESSION_MAX_MESSAGES ข้อความล่าสุด แต่ละข้อความมี seq เพิ่มขึ้นเรื่อยๆ ต่อ session
+  อ่านทีละหน้าด้วย messages(session_id, limit, before=seq) ต้นทุนต่อเทิร์นจึงคงที่ไม่โตตามความยาวแชต
+
+หลาย worker / หลายคำขอของ session เดียวกันเขียน state พร้อมกันได้:
+load_state คืน SessionState (dict ที่จำเวอร์ชันและค่าตอนโหลด) save_state เขียนแบบ read-modify-write ที่ atomic
+เฉพาะฟิลด์ที่คำขอนี้เปลี่ยน ถ้ามีคนเขียนฟิลด์เดียวกันไปก่อนและฟิลด์นั้นลงทะเบียน merger ไว้
+(register_state_merger เช่นอาการสะสมใน symptom_session.py) จะรวมค่าแทนการทับ ไม่งั้นคำขอที่เขียนทีหลังชนะเฉพาะฟิลด์นั้น
+
+backend:
+- MemorySessionStore: ในโปรเซส จำกัดจำนวน session แบบ LRU (ค่าเริ่มต้น)
+- SQLiteSessionStore: อยู่รอดข้ามการรีสตาร์ต และหลาย worker / หลาย process ใช้ไฟล์เดียวกันได้ (WAL)
+
+ตั้งค่าผ่าน env:
+    SESSION_STORE_DB      path ไฟล์ SQLite (ไม่ตั้ง = เก็บในหน่วยความจำ)
+    SESSION_MAX_MESSAGES  จำนวนข้อความล่าสุดที่เก็บต่อ session (ค่าเริ่มต้น 200)
+    SESSION_MAX_SESSIONS  จำนวน session สูงสุดในหน่วยความจำ (ค่าเริ่มต้น 10000)
+    SESSION_TTL           session ที่ไม่มีความเคลื่อนไหวเกินกี่วินาทีจะถูกลบ (ค่าเริ่มต้น 7 วัน)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from lazy_resources import lazy
+
+DEFAULT_STATE = {"greeted": False}
+
+_mergers = {}
+
+
+def register_state_merger(key, merge):
+    """merge(current, base, mine) -> ค่าที่จะเขียน ใช้เมื่อคำขออื่นเขียน state[key] ไปก่อนระหว่างเทิร์นนี้"""
+    _mergers[key] = merge
+
+
+def _new_state():
+    return dict(DEFAULT_STATE)
+
+
+def _to_json_dict(state):
+    return json.loads(json.dumps(dict(state), ensure_ascii=False, default=str))
+
+
+class SessionState(dict):
+    """state ที่โหลดจาก store: จำเวอร์ชันและค่าตอนโหลด save_state จึงเขียนเฉพาะฟิลด์ที่เปลี่ยน"""
+
+    def __init__(self, data=None, version=0):
+        super().__init__(data if data is not None else _new_state())
+        self.version = version
+        self.base = _to_json_dict(self)
+
+
+def _apply_changes(current, state):
+    """
+    ฟิลด์ที่ state เปลี่ยนจากตอนโหลด ทับบน current (state ล่าสุดใน store) คืน dict ใหม่
+    state ที่ไม่ใช่ SessionState (dict ธรรมดา) เขียนทับทั้งก้อน
+    """
+    payload = _to_json_dict(state)
+    base = getattr(state, "base", None)
+    if base is None:
+        return payload
+    merged = dict(current)
+    for key, value in payload.items():
+        if key in base and base[key] == value:
+            continue
+        if key in _mergers and current.get(key) != base.get(key):
+            value = _mergers[key](current.get(key), base.get(key), value)
+        merged[key] = value
+    for key in base:
+        if key not in payload:
+            merged.pop(key, None)
+    return merged
+
+
+def _saved(state, merged, version):
+    # ให้ผู้เรียกเห็นค่าที่รวมแล้ว และเซฟครั้งถัดไปเทียบกับเวอร์ชันนี้
+    if isinstance(state, SessionState):
+        state.clear()
+        state.update(merged)
+        state.version = version
+        state.base = _to_json_dict(merged)
+
+
+class MemorySessionStore:
+    def __init__(self, max_messages=200, max_sessions=10000, ttl=7 * 86400):
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id -> {"state", "messages": deque, "seq", "updated_at"}
+        self._lock = threading.Lock()
+
+    def _get(self, session_id, create=True):
+        now = time.time()
+        item = self._sessions.get(session_id)
+        if item is not None and item["updated_at"] + self.ttl <= now:
+            del self._sessions[session_id]
+            item = None
+        if item is None:
+            if not create:
+                return None
+            item = {"state": _new_state(), "version": 0, "messages": deque(maxlen=self.max_messages), "seq": 0,
+                    "updated_at": now}
+            self._sessions[session_id] = item
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            item["updated_at"] = now
+            self._sessions.move_to_end(session_id)
+        return item
+
+    def load_state(self, session_id):
+        """สำเนาของ state (แก้แล้วต้อง save_state ถึงจะมีผล)"""
+        with self._lock:
+            item = self._get(session_id, create=False)
+            if item is None:
+                return SessionState()
+            return SessionState(json.loads(json.dumps(item["state"])), item["version"])
+
+    def save_state(self, session_id, state):
+        with self._lock:
+            item = self._get(session_id)
+            item["state"] = _apply_changes(item["state"], state)
+            item["version"] += 1
+            merged, version = json.loads(json.dumps(item["state"])), item["version"]
+        _saved(state, merged, version)
+
+    def append_message(self, session_id, role, content):
+        """เพิ่มข้อความต่อท้ายประวัติ คืน seq ของข้อความ (ข้อความเก่ากว่า max_messages ถูกตัดทิ้ง)"""
+        with self._lock:
+            item = self._get(session_id)
+            item["seq"] += 1
+            item["messages"].append({"seq": item["seq"], "role": role, "content": content, "created_at": time.time()})
+            return item["seq"]
+
+    def messages(self, session_id, limit=20, before=None):
+        """
+        หน้าหนึ่งของประวัติ เรียงเก่า -> ใหม่ คืน (messages, has_more)
+        before=None คือหน้าล่าสุด หน้าก่อนหน้าใช้ before=seq ของข้อความแรกในหน้าปัจจุบัน
+        """
+        with self._lock:
+            item = self._get(session_id, create=False)
+            if item is None:
+                return [], False
+            candidates = [m for m in item["messages"] if before is None or m["seq"] < before]
+        page = candidates[-limit:] if limit > 0 else []
+        return [dict(m) for m in page], len(candidates) > len(page)
+
+    def message_count(self, session_id):
+        with self._lock:
+            item = self._get(session_id, create=False)
+            return len(item["messages"]) if item is not None else 0
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        return {"backend": "memory", "sessions": len(self), "max_messages": self.max_messages}
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore:
+    def __init__(self, db_path, max_messages=200, ttl=7 * 86400):
+        self.db_path = db_path
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        if "version" not in {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}:
+            self._db.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages (session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+
+    def _touch(self, session_id, now):
+        """สร้าง session ถ้ายังไม่มี (ตอนสร้างใหม่ลบ session ที่หมดอายุไปด้วย) คืน True ถ้าสร้างใหม่"""
+        created = self._db.execute(
+            "INSERT INTO sessions (id, state, updated_at) VALUES (?, ?, ?) ON CONFLICT(id) DO NOTHING",
+            (session_id, json.dumps(DEFAULT_STATE), now),
+        ).rowcount == 1
+        if created:
+            self._purge_expired(now)
+        else:
+            self._db.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+        return created
+
+    def _purge_expired(self, now):
+        expired = [row[0] for row in self._db.execute(
+            "SELECT id FROM sessions WHERE updated_at <= ?", (now - self.ttl,)).fetchall()]
+        for session_id in expired:
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _is_expired(self, session_id, now):
+        row = self._db.execute("SELECT updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row is not None and row[0] + self.ttl <= now
+
+    def load_state(self, session_id):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT state, updated_at, version FROM sessions WHERE id = ?",
+                                   (session_id,)).fetchone()
+        if row is None or row[1] + self.ttl <= now:
+            return SessionState()
+        return SessionState(json.loads(row[0]), row[2])
+
+    def save_state(self, session_id, state):
+        """
+        อ่าน state ล่าสุด + version รวมฟิลด์ที่เปลี่ยน แล้วเขียนพร้อม version + 1 ในธุรกรรมเดียว
+        (BEGIN IMMEDIATE ถือ write lock ของไฟล์ worker อื่นเขียนแทรกระหว่างอ่านกับเขียนไม่ได้)
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT state, updated_at, version FROM sessions WHERE id = ?",
+                                       (session_id,)).fetchone()
+                current = json.loads(row[0]) if row is not None and row[1] + self.ttl > now else _new_state()
+                version = (row[2] if row is not None else 0) + 1
+                merged = _apply_changes(current, state)
+                self._db.execute(
+                    "INSERT INTO sessions (id, state, updated_at, version) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at, "
+                    "version = excluded.version",
+                    (session_id, json.dumps(merged, ensure_ascii=False), now, version),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        _saved(state, merged, version)
+
+    def append_message(self, session_id, role, content):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._is_expired(session_id, now):
+                    self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                    self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._touch(session_id, now)
+                # seq คำนวณในคำสั่งเดียวภายใต้ write lock ของ SQLite หลาย worker ต่อท้าย session เดียวกันได้
+                seq = self._db.execute(
+                    "INSERT INTO messages (session_id, seq, role, content, created_at) "
+                    "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM messages WHERE session_id = ? RETURNING seq",
+                    (session_id, role, content, now, session_id),
+                ).fetchone()[0]
+                self._db.execute("DELETE FROM messages WHERE session_id = ? AND seq <= ?",
+                                 (session_id, seq - self.max_messages))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return seq
+
+    def messages(self, session_id, limit=20, before=None):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, role, content, created_at FROM messages WHERE session_id = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (session_id, before if before is not None else 2 ** 62, max(0, limit) + 1),
+            ).fetchall()
+        has_more = len(rows) > limit
+        page = [{"seq": r[0], "role": r[1], "content": r[2], "created_at": r[3]} for r in reversed(rows[:limit])]
+        return page, has_more
+
+    def message_count(self, session_id):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def delete(self, session_id):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.execute("COMMIT")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions WHERE updated_at > ?",
+                                    (time.time() - self.ttl,)).fetchone()[0]
+
+    def stats(self):
+        return {"backend": "sqlite", "sessions": len(self), "max_messages": self.max_messages, "db_path": self.db_path}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_session_store(db_path=None, max_messages=None, max_sessions=None, ttl=None):
+    """สร้าง store ตาม env (ค่าที่ส่งมาโดยตรงมีผลก่อน env)"""
+    db_path = db_path or os.getenv("SESSION_STORE_DB") or None
+    max_messages = max_messages if max_messages is not None else int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+    ttl = ttl if ttl is not None else float(os.getenv("SESSION_TTL", str(7 * 86400)))
+    if db_path:
+        return SQLiteSessionStore(db_path, max_messages=max_messages, ttl=ttl)
+    max_sessions = max_sessions if max_sessions is not None else int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+    return MemorySessionStore(max_messages=max_messages, max_sessions=max_sessions, ttl=ttl)
+
+
+# store ตัวเดียวต่อ process (FastAPI และ Streamlit ใช้ร่วมกัน)
+get_session_store = lazy("session_store", create_session_store)
@@ -0,0 +1,282 @@
+# single_flight.py
+"""
+รวมการเรียก LLM ที่เหมือนกันซึ่งกำลังทำงานอยู่พร้อมกันให้เหลือการเรียกจริงครั้งเดียว (single-flight)
+
+ช่วงที่มีคนพิมพ์อาการชุดเดียวกันเข้ามาพร้อมๆ กัน แต่ละคำขอจะ render prompt เดียวกันและยิง Typhoon
+พร้อมกันหลายครั้ง แคชคำตอบ (response_cache.py) ช่วยไม่ได้เพราะยังไม่มีใครได้ผลกลับมา
+คีย์ใช้คีย์เดียวกับแคช (ชื่อขั้น + template + อินพุตที่ใช้ render prompt + พารามิเตอร์โมเดล)
+
+- call / call_async: คนแรก (leader) เรียกจริง คนที่ตามมาระหว่างนั้นรอผลเดียวกัน
+  ถ้าการเรียกจริง raise ทุกคนได้ exception เดียวกัน
+- stream / stream_async: การสตรีมจริงทำงานแยก (เธรด / task) เก็บข้อความทุกชิ้นไว้
+  คนที่ตามมาทีหลังได้ชิ้นที่ผ่านมาแล้วก่อน แล้วรับชิ้นใหม่ไปพร้อมกัน
+- การยกเลิก: ผู้รอคนหนึ่งยกเลิก (client ตัดการเชื่อมต่อ / task ถูก cancel) ไม่กระทบคนอื่น
+  เมื่อผู้รอทุกคนยกเลิกแล้วจึงยกเลิกการเรียกจริง ฝั่งเธรดถ้า leader ถูกขัดจังหวะ (KeyboardInterrupt ฯลฯ)
+  คนที่รออยู่จะเรียกใหม่เองแทนการรับ error ที่ไม่เกี่ยวกับตัวเอง
+
+ตั้งค่าผ่าน env:
+    LLM_SINGLE_FLIGHT  0 = ปิด (ทุกคำขอเรียก LLM เอง, ค่าเริ่มต้น 1)
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from collections import Counter
+
+import telemetry
+
+
+class _Call:
+    """การเรียกจริงหนึ่งครั้งฝั่งเธรด (ใช้ทั้ง call และ stream)"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.done = False
+        self.abandoned = False
+        self.value = None
+        self.error = None
+        self.parts = []
+        self.consumers = 0
+
+
+class _AsyncCall:
+    """การเรียกจริงหนึ่งครั้งฝั่ง asyncio (task ผูกกับ event loop ที่สร้าง)"""
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.done = False
+        self.error = None
+        self.parts = []
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {}           # key -> _Call
+        self._streams = {}         # key -> _Call
+        self._async_calls = {}     # (key, loop) -> _AsyncCall
+        self._async_streams = {}   # (key, loop) -> _AsyncCall
+        self._upstream = Counter()
+        self._coalesced = Counter()
+        self._errors = Counter()
+        self._cancelled = Counter()
+
+    @classmethod
+    def from_env(cls):
+        return cls(enabled=os.getenv("LLM_SINGLE_FLIGHT", "1") != "0")
+
+    def _stage(self, key):
+        return key.split(":", 1)[0]
+
+    def _join(self, flights, key, stage, new):
+        """คืน (flight, leader) ต้องถือ self._lock อยู่"""
+        flight = flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = flights[key] = new()
+            self._upstream[stage] += 1
+        else:
+            self._coalesced[stage] += 1
+            telemetry.inc("llm_coalesced_total", 1, "จำนวนคำขอที่ใช้การเรียก LLM ร่วมกับคำขอที่กำลังทำงานอยู่",
+                          stage=stage)
+            telemetry.annotate(coalesced=True)
+        return flight, leader
+
+    def _forget(self, flights, key, flight):
+        with self._lock:
+            if flights.get(key) is flight:
+                del flights[key]
+
+    def _record_end(self, stage, error=None, cancelled=False):
+        with self._lock:
+            if cancelled:
+                self._cancelled[stage] += 1
+            elif error is not None:
+                self._errors[stage] += 1
+
+    # ===== เธรด
+    def call(self, key, fn, *args):
+        """คืน fn(*args) ถ้ามีการเรียกคีย์เดียวกันค้างอยู่ รอผลของการเรียกนั้นแทน"""
+        if not self.enabled:
+            return fn(*args)
+        with self._lock:
+            flight, leader = self._join(self._calls, key, self._stage(key), _Call)
+        if not leader:
+            with flight.cond:
+                flight.cond.wait_for(lambda: flight.done)
+            if flight.abandoned:
+                return self.call(key, fn, *args)
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fn(*args)
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.abandoned = True
+            raise
+        finally:
+            self._forget(self._calls, key, flight)
+            self._record_end(self._stage(key), flight.error, flight.abandoned)
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+        return flight.value
+
+    def stream(self, key, fn, *args):
+        """เหมือน call สำหรับ generator ข้อความ ทุกคนได้ข้อความชุดเดียวกันครบตั้งแต่ชิ้นแรก"""
+        if not self.enabled:
+            yield from fn(*args)
+            return
+        with self._lock:
+            flight, leader = self._join(self._streams, key, self._stage(key), _Call)
+            flight.consumers += 1
+        if leader:
+            # การสตรีมจริงไม่ผูกกับผู้รอคนใด (leader เลิกอ่านกลางทาง คนอื่นยังได้ต่อ)
+            # copy_context: span ของการเรียกยังอยู่ใน trace ของคำขอที่เริ่ม
+            threading.Thread(target=contextvars.copy_context().run, args=(self._pump, key, flight, fn, args),
+                             name="single-flight-stream", daemon=True).start()
+        try:
+            seen = 0
+            while True:
+                with flight.cond:
+                    flight.cond.wait_for(lambda: len(flight.parts) > seen or flight.done)
+                    new = flight.parts[seen:]
+                    finished = flight.done
+                for text in new:
+                    yield text
+                seen += len(new)
+                if finished and seen == len(flight.parts):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            with self._lock:
+                flight.consumers -= 1
+                abandon = flight.consumers == 0 and not flight.done
+                if abandon and self._streams.get(key) is flight:
+                    del self._streams[key]  # เอาออกก่อนปล่อย lock คำขอใหม่จะไม่มาต่อท้ายการเรียกที่กำลังถูกทิ้ง
+            if abandon:
+                with flight.cond:
+                    flight.abandoned = True
+
+    def _pump(self, key, flight, fn, args):
+        chunks = fn(*args)
+        try:
+            for text in chunks:
+                with flight.cond:
+                    if flight.abandoned:
+                        break
+                    flight.parts.append(text)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            if flight.abandoned:
+                chunks.close()  # ไม่มีใครรอแล้ว ปิดการสตรีมจาก LLM
+            self._forget(self._streams, key, flight)
+            self._record_end(self._stage(key), flight.error, flight.abandoned)
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    # ===== asyncio
+    async def call_async(self, key, fn, *args):
+        """เหมือน call สำหรับ coroutine function (ผู้รอแต่ละคนยกเลิกได้โดยไม่กระทบคนอื่น)"""
+        if not self.enabled:
+            return await fn(*args)
+        loop = asyncio.get_running_loop()
+        flight_key = (key, loop)
+        with self._lock:
+            flight, leader = self._join(self._async_calls, flight_key, self._stage(key), _AsyncCall)
+            if leader:
+                flight.task = loop.create_task(fn(*args))
+                flight.task.add_done_callback(lambda task: self._async_done(self._async_calls, flight_key, flight))
+            flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave_async(self._async_calls, flight_key, flight)
+
+    async def stream_async(self, key, fn, *args):
+        """เหมือน stream สำหรับ async generator"""
+        if not self.enabled:
+            async for text in fn(*args):
+                yield text
+            return
+        loop = asyncio.get_running_loop()
+        flight_key = (key, loop)
+        with self._lock:
+            flight, leader = self._join(self._async_streams, flight_key, self._stage(key), _AsyncCall)
+            if leader:
+                flight.task = loop.create_task(self._pump_async(flight, fn, args))
+                flight.task.add_done_callback(lambda task: self._async_done(self._async_streams, flight_key, flight))
+            flight.waiters += 1
+        try:
+            seen = 0
+            while True:
+                changed = flight.changed
+                if seen < len(flight.parts):
+                    seen += 1
+                    yield flight.parts[seen - 1]
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            self._leave_async(self._async_streams, flight_key, flight)
+
+    async def _pump_async(self, flight, fn, args):
+        try:
+            async for text in fn(*args):
+                flight.parts.append(text)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+
+    def _async_done(self, flights, flight_key, flight):
+        self._forget(flights, flight_key, flight)
+        task = flight.task
+        error = None if task.cancelled() else task.exception() or flight.error
+        self._record_end(self._stage(flight_key[0]), error, task.cancelled())
+
+    def _leave_async(self, flights, flight_key, flight):
+        with self._lock:
+            flight.waiters -= 1
+            cancel = flight.waiters == 0 and not flight.task.done()
+            if cancel and flights.get(flight_key) is flight:
+                del flights[flight_key]
+        if cancel:
+            # ผู้รอทุกคนยกเลิกไปแล้ว ยกเลิกการเรียกจริงด้วย (คำขอใหม่หลังจากนี้จะเริ่มการเรียกใหม่)
+            flight.task.cancel()
+
+    def stats(self):
+        with self._lock:
+            upstream = sum(self._upstream.values())
+            coalesced = sum(self._coalesced.values())
+            stages = sorted(set(self._upstream) | set(self._coalesced))
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._calls) + len(self._streams) + len(self._async_calls) + len(self._async_streams),
+                "upstream_calls": upstream,
+                "coalesced": coalesced,
+                "coalesce_rate": round(coalesced / (upstream + coalesced), 4) if upstream + coalesced else 0.0,
+                "errors": sum(self._errors.values()),
+                "cancelled": sum(self._cancelled.values()),
+                "stages": {s: {"upstream_calls": self._upstream[s], "coalesced": self._coalesced[s],
+                               "errors": self._errors[s], "cancelled": self._cancelled[s]} for s in stages},
+            }
@@ -0,0 +1,358 @@
+# skin_cache.py
+"""
+แคชผลวิเคราะห์ภาพผิวหนัง ((predicted_class, confidence) และคำแนะนำจากแพทย์ AI) ต่อภาพ
+
+Streamlit rerun หรือผู้ใช้อัปโหลดรูปเดิมซ้ำ (หรือรูปเดิมที่ถูกบีบอัด/ย่อขนาดใหม่) ไม่ต้องรันโมเดล CNN และเรียก LLM ใหม่
+
+- ชั้นแรก: sha256 ของไบต์ไฟล์ ตรงกันเป๊ะ ไม่ต้องถอดรหัสภาพ
+- ชั้นสอง: perceptual hash (DCT 64 บิต) ของภาพที่ normalize เป็น 224x224 แบบเดียวกับอินพุตโมเดล
+  ถือว่าเป็นภาพเดียวกันเมื่อ Hamming distance <= SKIN_CACHE_PHASH_DISTANCE และ thumbnail grayscale 32x32
+  ต่างกันเฉลี่ยไม่เกิน SKIN_CACHE_MAX_PIXEL_DIFF (กันแผลคนละแผลที่ hash บังเอิญใกล้กัน)
+  ปรับให้เข้มขึ้นได้ทั้งสองค่า หรือปิดชั้นนี้ด้วย SKIN_CACHE_PHASH_DISTANCE=-1
+- LRU จำกัดจำนวนรายการในหน่วยความจำ ชั้นดิสก์ SQLite (ไม่บังคับ) อยู่รอดข้ามการรีสตาร์ตและใช้ร่วมกันหลาย worker
+- ผลผูกกับ namespace (ไฟล์โมเดล + template คำแนะนำ + โมเดล LLM) เปลี่ยนอย่างใดอย่างหนึ่งแล้วจะไม่ใช้ผลเดิม
+
+ตั้งค่าผ่าน env:
+    SKIN_CACHE_SIZE            จำนวนภาพในหน่วยความจำ (0 = ปิดแคช, ค่าเริ่มต้น 256)
+    SKIN_CACHE_DB              path ไฟล์ SQLite (ไม่ตั้ง = ไม่ใช้ชั้นดิสก์)
+    SKIN_CACHE_PHASH_DISTANCE  Hamming distance สูงสุดของภาพที่ถือว่าซ้ำ (ค่าเริ่มต้น 4 จาก 64 บิต)
+    SKIN_CACHE_MAX_PIXEL_DIFF  ค่าต่างเฉลี่ยสูงสุดของ thumbnail 32x32 (0-255, ค่าเริ่มต้น 6)
+    SKIN_CACHE_DISK_SCAN       ชั้นดิสก์หาภาพใกล้เคียงจากกี่รายการล่าสุด (ค่าเริ่มต้น 4096, 0 = เฉพาะ phash ตรงกัน)
+"""
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from health_prompt_template import template_versions
+from lazy_resources import lazy
+from skin_inference_service import IMAGE_SIZE, MODEL_PATH, TFLITE_MODEL_PATH, load_skin_pixels
+import telemetry
+
+HASH_SIZE = 8       # ใช้สัมประสิทธิ์ DCT ความถี่ต่ำ 8x8 = 64 บิต
+THUMB_SIZE = 32     # ภาพ 224x224 เฉลี่ยเป็นบล็อก 7x7 เหลือ 32x32 ก่อนทำ DCT
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _popcount(values):
+    """จำนวนบิต 1 ของแต่ละค่า uint64 (np.bitwise_count มีตั้งแต่ numpy 2 เท่านั้น)"""
+    values = np.asarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values[..., None].view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)).astype(np.float32)
+
+
+_DCT = _dct_matrix(THUMB_SIZE)
+
+
+def perceptual_hash(pixels):
+    """
+    คืน (phash 64 บิตเป็น int, thumbnail uint8 32x32) จาก pixels 224x224 ของ load_skin_pixels
+    บิตคือสัมประสิทธิ์ DCT ความถี่ต่ำ 8x8 ที่มากกว่ามัธยฐาน (ไม่นับ DC) ทนต่อการบีบอัด JPEG ใหม่และการย่อขนาด
+    """
+    gray = pixels.astype(np.float32) if pixels.ndim == 2 else pixels.astype(np.float32) @ _LUMA
+    block = IMAGE_SIZE[0] // THUMB_SIZE
+    small = gray.reshape(THUMB_SIZE, block, THUMB_SIZE, block).mean(axis=(1, 3))
+    low = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big"), np.rint(small).astype(np.uint8)
+
+
+class SkinFingerprint:
+    """sha256 ของไฟล์ และ perceptual hash / thumbnail (คำนวณเมื่อใช้ครั้งแรก ต้องถอดรหัสภาพ)"""
+
+    def __init__(self, data):
+        self.data = data
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self._phash = None
+        self._thumb = None
+        self._decoded = False
+
+    def decode(self):
+        """ถอดรหัสภาพครั้งเดียว คืน (phash, thumbnail) หรือ (None, None) ถ้าไม่ใช่ภาพที่อ่านได้"""
+        if not self._decoded:
+            self._decoded = True
+            try:
+                self._phash, self._thumb = perceptual_hash(load_skin_pixels(Image.open(io.BytesIO(self.data))))
+            except Exception:
+                pass  # ไม่ใช่ภาพที่ถอดรหัสได้ ใช้ได้แค่ชั้น sha256
+        return self._phash, self._thumb
+
+    @property
+    def phash(self):
+        return self.decode()[0]
+
+    @property
+    def thumb(self):
+        return self.decode()[1]
+
+
+class _Entry:
+    __slots__ = ("sha256", "phash", "thumb", "predicted_class", "confidence", "reply")
+
+    def __init__(self, sha256, phash, thumb, predicted_class, confidence, reply=None):
+        self.sha256 = sha256
+        self.phash = phash
+        self.thumb = thumb
+        self.predicted_class = predicted_class
+        self.confidence = confidence
+        self.reply = reply
+
+    def result(self, match, distance=0):
+        return {"predicted_class": self.predicted_class, "confidence": self.confidence, "reply": self.reply,
+                "match": match, "distance": distance}
+
+
+def _thumb_diff(a, b):
+    """ค่าต่างเฉลี่ยของ thumbnail สองภาพ (0-255)"""
+    return float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean())
+
+
+def _signed(phash):
+    # SQLite INTEGER เป็น signed 64 บิต
+    return phash - (1 << 64) if phash is not None and phash >= 1 << 63 else phash
+
+
+def default_namespace():
+    """ลายเซ็นของไฟล์โมเดล backend template คำแนะนำ และโมเดล LLM"""
+    parts = [os.getenv("SKIN_MODEL_BACKEND", "auto"), template_versions().get("skin", ""), os.getenv("TYPHOON_MODEL", "")]
+    for path in (TFLITE_MODEL_PATH, MODEL_PATH):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class SkinResultCache:
+    def __init__(self, max_size=256, db_path=None, max_distance=4, max_pixel_diff=6.0, namespace="", disk_scan=4096):
+        self.max_size = max_size
+        self.disk_scan = disk_scan
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self.namespace = namespace
+        self._items = OrderedDict()  # sha256 -> _Entry
+        self._phashes = None         # (อาร์เรย์ uint64, รายการ entry) สร้างใหม่เมื่อรายการเปลี่ยน
+        self._lock = threading.Lock()
+        self._results = Counter()
+        self._reply_hits = 0
+        self._db = None
+        if db_path and self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS skin_results (namespace TEXT NOT NULL, sha256 TEXT NOT NULL, phash INTEGER, "
+                "thumb BLOB, predicted_class TEXT NOT NULL, confidence REAL NOT NULL, reply TEXT, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (namespace, sha256))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS skin_results_phash ON skin_results (namespace, phash)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS skin_results_recent ON skin_results (namespace, updated_at)")
+            self._db.commit()
+            self._warm_from_disk()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_size=int(os.getenv("SKIN_CACHE_SIZE", "256")),
+            db_path=os.getenv("SKIN_CACHE_DB") or None,
+            max_distance=int(os.getenv("SKIN_CACHE_PHASH_DISTANCE", "4")),
+            max_pixel_diff=float(os.getenv("SKIN_CACHE_MAX_PIXEL_DIFF", "6")),
+            namespace=default_namespace(),
+            disk_scan=int(os.getenv("SKIN_CACHE_DISK_SCAN", "4096")),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _warm_from_disk(self):
+        """โหลดรายการล่าสุดจากดิสก์เข้าหน่วยความจำ ภาพใกล้เคียงจึงหาเจอหลังรีสตาร์ตด้วย"""
+        rows = self._db.execute(
+            "SELECT sha256, phash, thumb, predicted_class, confidence, reply FROM skin_results "
+            "WHERE namespace = ? ORDER BY updated_at DESC LIMIT ?", (self.namespace, self.max_size)).fetchall()
+        for row in reversed(rows):
+            self._put(self._row_entry(row))
+
+    @staticmethod
+    def _row_entry(row):
+        sha256, phash, thumb, predicted_class, confidence, reply = row
+        if phash is not None and phash < 0:
+            phash += 1 << 64
+        thumb = np.frombuffer(thumb, dtype=np.uint8).reshape(THUMB_SIZE, THUMB_SIZE) if thumb else None
+        return _Entry(sha256, phash, thumb, predicted_class, confidence, reply)
+
+    def _put(self, entry):
+        self._items[entry.sha256] = entry
+        self._items.move_to_end(entry.sha256)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        self._phashes = None
+
+    def _near(self, fingerprint):
+        """รายการที่ phash ใกล้และ thumbnail ใกล้ที่สุด คืน (entry, distance) หรือ (None, None)"""
+        if self.max_distance < 0 or fingerprint.phash is None:
+            return None, None
+        if self._phashes is None:
+            entries = [e for e in self._items.values() if e.phash is not None]
+            self._phashes = (np.array([e.phash for e in entries], dtype=np.uint64), entries)
+        hashes, entries = self._phashes
+        if not entries:
+            return None, None
+        distances = _popcount(hashes ^ np.uint64(fingerprint.phash))
+        candidates = np.flatnonzero(distances <= self.max_distance)
+        for i in candidates[np.argsort(distances[candidates], kind="stable")]:
+            if _thumb_diff(entries[i].thumb, fingerprint.thumb) <= self.max_pixel_diff:
+                return entries[i], int(distances[i])
+        return None, None
+
+    def _disk_lookup(self, fingerprint):
+        row = self._db.execute(
+            "SELECT sha256, phash, thumb, predicted_class, confidence, reply FROM skin_results "
+            "WHERE namespace = ? AND sha256 = ?", (self.namespace, fingerprint.sha256)).fetchone()
+        if row is not None:
+            return self._row_entry(row), "exact"
+        if self.max_distance < 0 or fingerprint.phash is None:
+            return None, None
+        # phash ตรงกัน (มี index) ก่อน แล้วสแกน Hamming distance ของ disk_scan รายการล่าสุด (อ่านแค่คอลัมน์ phash)
+        rows = self._db.execute("SELECT rowid FROM skin_results WHERE namespace = ? AND phash = ?",
+                                (self.namespace, _signed(fingerprint.phash))).fetchall()
+        if self.disk_scan > 0 and self.max_distance > 0:
+            scanned = self._db.execute(
+                "SELECT rowid, phash FROM skin_results WHERE namespace = ? AND phash IS NOT NULL "
+                "ORDER BY updated_at DESC LIMIT ?", (self.namespace, self.disk_scan)).fetchall()
+            if scanned:
+                hashes = np.array([phash for _, phash in scanned], dtype=np.int64).view(np.uint64)
+                distances = _popcount(hashes ^ np.uint64(fingerprint.phash))
+                order = np.argsort(distances, kind="stable")
+                rows += [(scanned[i][0],) for i in order if distances[i] <= self.max_distance]
+        seen = set()
+        for (rowid,) in rows:
+            if rowid in seen:
+                continue
+            seen.add(rowid)
+            entry = self._row_entry(self._db.execute(
+                "SELECT sha256, phash, thumb, predicted_class, confidence, reply FROM skin_results WHERE rowid = ?",
+                (rowid,)).fetchone())
+            if entry.thumb is not None and _thumb_diff(entry.thumb, fingerprint.thumb) <= self.max_pixel_diff:
+                return entry, "near"
+        return None, None
+
+    def lookup(self, data):
+        """
+        คืน (result, fingerprint) result เป็น dict (predicted_class, confidence, reply, match, distance) หรือ None
+        reply เป็น None ถ้ายังไม่เคยสร้างคำแนะนำให้ภาพนี้ ส่ง fingerprint กลับมาใน store / set_reply
+        """
+        fingerprint = SkinFingerprint(data)
+        if not self.enabled:
+            return None, fingerprint
+        with telemetry.span("skin_cache"):
+            result = self._lookup(fingerprint)
+        match = result["match"] if result is not None else "miss"
+        with self._lock:
+            self._results[match] += 1
+            if result is not None and result["reply"]:
+                self._reply_hits += 1
+        telemetry.inc("skin_cache_requests_total", 1, "ผลแคชการวิเคราะห์ภาพผิวหนัง", result=match)
+        telemetry.annotate(skin_cache=match)
+        return result, fingerprint
+
+    def _lookup(self, fingerprint):
+        with self._lock:
+            entry = self._items.get(fingerprint.sha256)
+            if entry is not None:
+                self._items.move_to_end(entry.sha256)
+                return entry.result("exact")
+        fingerprint.decode()  # ไม่ตรงเป๊ะ: ถอดรหัสภาพหา phash นอก lock
+        with self._lock:
+            entry, distance = self._near(fingerprint)
+            if entry is not None:
+                self._items.move_to_end(entry.sha256)
+                return entry.result("near", distance)
+            if self._db is None:
+                return None
+            entry, match = self._disk_lookup(fingerprint)
+            if entry is None:
+                return None
+            self._put(entry)
+            return entry.result(match, 0 if match == "exact" else int(_popcount(entry.phash ^ fingerprint.phash)))
+
+    def store(self, fingerprint, predicted_class, confidence, reply=None):
+        """เก็บผลของภาพ (คำแนะนำใส่ทีหลังด้วย set_reply ได้)"""
+        if not self.enabled:
+            return
+        entry = _Entry(fingerprint.sha256, fingerprint.phash, fingerprint.thumb, predicted_class, float(confidence),
+                       reply)
+        with self._lock:
+            self._put(entry)
+            self._write(entry)
+
+    def set_reply(self, fingerprint, reply):
+        """ผูกคำแนะนำจากแพทย์ AI กับภาพที่ store ไว้แล้ว (และภาพที่ตรงกันแบบใกล้เคียงที่ lookup เจอ)"""
+        if not self.enabled or not reply:
+            return
+        with self._lock:
+            entry = self._items.get(fingerprint.sha256)
+            if entry is None:
+                entry, _ = self._near(fingerprint)
+            if entry is not None:
+                entry.reply = reply
+                self._write(entry)
+
+    def _write(self, entry):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO skin_results (namespace, sha256, phash, thumb, predicted_class, confidence, reply, "
+            "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.namespace, entry.sha256, _signed(entry.phash), entry.thumb.tobytes() if entry.thumb is not None
+             else None, entry.predicted_class, entry.confidence, entry.reply, time.time()),
+        )
+        self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._phashes = None
+            self._results.clear()
+            self._reply_hits = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM skin_results WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self._results["exact"] + self._results["near"]
+            total = hits + self._results["miss"]
+            return {
+                "enabled": self.enabled,
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "disk": self.db_path,
+                "namespace": self.namespace,
+                "max_distance": self.max_distance,
+                "max_pixel_diff": self.max_pixel_diff,
+                "disk_scan": self.disk_scan,
+                "exact_hits": self._results["exact"],
+                "near_hits": self._results["near"],
+                "misses": self._results["miss"],
+                "reply_hits": self._reply_hits,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
+
+
+# แคชตัวเดียวต่อ process (Streamlit ทุก session และ FastAPI ใช้ร่วมกัน)
+get_skin_result_cache = lazy("skin_result_cache", SkinResultCache.from_env)
@@ -0,0 +1,334 @@
+# skin_inference_service.py
+"""
+บริการวิเคราะห์ภาพผิวหนังแบบรวม batch อยู่เบื้องหลัง ใช้ได้ทั้งจาก Streamlit (sidebar) และ FastAPI (/skin)
+
+แต่ละคำขอถอดรหัส/ย่อภาพเป็น uint8 ในเธรดของผู้เรียก แล้วเข้าคิว เธรด dispatcher จะรวบคำขอไว้
+ไม่เกิน SKIN_BATCH_WAIT_MS มิลลิวินาที หรือครบ SKIN_BATCH_SIZE ภาพ แล้วส่งเข้าโมเดลครั้งเดียว
+บน worker pool (SKIN_WORKERS เธรด) โดย normalize ลง batch buffer ที่จองไว้ของ worker นั้น ผลของแต่ละภาพคืนผ่าน Future
+"""
+import asyncio
+import logging
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from lazy_resources import lazy
+import telemetry
+
+MODEL_PATH = './custom_cnn_dfu_model.h5'
+# สร้างด้วย python skin_model_export.py
+TFLITE_MODEL_PATH = os.getenv("SKIN_TFLITE_PATH", "./custom_cnn_dfu_model.tflite")
+CLASS_NAMES = ['Abnormal(Ulcer)', 'Normal(Healthy skin)']
+IMAGE_SIZE = (224, 224)
+# auto: ใช้ TFLite ถ้ามีไฟล์และมี interpreter ไม่งั้นใช้ Keras / tflite / keras: บังคับ backend
+SKIN_MODEL_BACKENDS = ("auto", "tflite", "keras")
+
+logger = logging.getLogger(__name__)
+
+
+def load_keras_model(model_path=MODEL_PATH):
+    """โหลดโมเดล Keras (ไม่ compile เพื่อลด warning) import keras ตอนใช้จริงเท่านั้น"""
+    from keras.models import load_model
+    model = load_model(model_path, compile=False)
+    model.backend_name = "keras"
+    return model
+
+
+def _tflite_interpreter_class():
+    # runtime เบาๆ ก่อน (ไม่ต้องมี TensorFlow) แล้วค่อย tf.lite
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteSkinModel:
+    """ครอบ TFLite Interpreter ให้มี predict_on_batch แบบเดียวกับโมเดล Keras"""
+
+    backend_name = "tflite"
+
+    def __init__(self, model_path=TFLITE_MODEL_PATH, num_threads=None):
+        self.model_path = model_path
+        self._interpreter = _tflite_interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        # interpreter หนึ่งตัวรันพร้อมกันหลายเธรดไม่ได้
+        self._lock = threading.Lock()
+
+    def _quantize(self, inputs):
+        scale, zero_point = self._input["quantization"]
+        if self._input["dtype"] == np.float32 or not scale:
+            return inputs.astype(self._input["dtype"], copy=False)
+        info = np.iinfo(self._input["dtype"])
+        return np.clip(np.round(inputs / scale + zero_point), info.min, info.max).astype(self._input["dtype"])
+
+    def _dequantize(self, outputs):
+        scale, zero_point = self._output["quantization"]
+        if outputs.dtype == np.float32 or not scale:
+            return outputs.astype(np.float32, copy=False)
+        return (outputs.astype(np.float32) - zero_point) * scale
+
+    def predict_on_batch(self, inputs):
+        inputs = np.asarray(inputs, dtype=np.float32)
+        with self._lock:
+            if self._batch_size != len(inputs):
+                self._interpreter.resize_tensor_input(self._input["index"], [len(inputs), *inputs.shape[1:]])
+                self._interpreter.allocate_tensors()
+                self._batch_size = len(inputs)
+            self._interpreter.set_tensor(self._input["index"], self._quantize(inputs))
+            self._interpreter.invoke()
+            return self._dequantize(self._interpreter.get_tensor(self._output["index"]))
+
+
+def load_skin_model_backend(backend=None):
+    """โหลดโมเดลตาม SKIN_MODEL_BACKEND (auto ถ้า TFLite ใช้ไม่ได้จะถอยไปใช้ Keras)"""
+    backend = backend or os.getenv("SKIN_MODEL_BACKEND", "auto")
+    if backend not in SKIN_MODEL_BACKENDS:
+        raise ValueError(f"ไม่รู้จัก SKIN_MODEL_BACKEND={backend!r} (ใช้ได้: {', '.join(SKIN_MODEL_BACKENDS)})")
+    if backend == "keras":
+        return load_keras_model()
+    if backend == "tflite":
+        return TFLiteSkinModel(TFLITE_MODEL_PATH)
+    if os.path.exists(TFLITE_MODEL_PATH):
+        try:
+            return TFLiteSkinModel(TFLITE_MODEL_PATH)
+        except Exception as e:
+            logger.warning("โหลด TFLite %s ไม่ได้ (%s) ใช้ Keras แทน", TFLITE_MODEL_PATH, e)
+    return load_keras_model()
+
+
+def load_skin_pixels(img_pil: Image.Image, draft=True):
+    """
+    ถอดรหัสภาพเป็น uint8 ขนาด 224x224 ((H, W, 3) หรือ (H, W) ถ้าเป็น grayscale)
+
+    JPEG ที่ยังไม่ถูกโหลดจะใช้ draft ให้ตัวถอดรหัสย่อขนาดระหว่าง decode (1/2, 1/4, 1/8) ให้ใกล้ 224 ก่อน
+    ไม่ต้องถอดรหัสภาพมือถือ 12MP เต็มขนาด แล้วค่อย resize ที่เหลือ (ภาพที่โหลดแล้ว draft จะไม่มีผล)
+    """
+    if draft and img_pil.format == "JPEG":
+        img_pil.draft(img_pil.mode, IMAGE_SIZE)
+    if img_pil.mode not in ("RGB", "L"):
+        # RGBA / palette / CMYK แปลงเหมือนที่ UI เคยทำ (convert("RGB") ก่อน resize)
+        img_pil = img_pil.convert("RGB")
+    # grayscale ย่อทีละช่องเดียว แล้วค่อยกระจายเป็น 3 ช่องตอน normalize
+    return np.asarray(img_pil.resize(IMAGE_SIZE))
+
+
+def normalize_skin_pixels(pixels, out):
+    """เขียน pixels / 255 (float32) ลง out ขนาด (224, 224, 3) โดยตรง ไม่สร้างอาร์เรย์ชั่วคราว"""
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]  # view, broadcast ตอนหาร
+    np.divide(pixels, np.float32(255), out=out)
+    return out
+
+
+def preprocess_skin_image(img_pil: Image.Image, out=None):
+    """ปรับขนาดและ normalize ภาพเป็นอาร์เรย์ float32 ขนาด (224, 224, 3) (ส่ง out เพื่อเขียนลง buffer ที่มีอยู่)"""
+    if out is None:
+        out = np.empty((*IMAGE_SIZE[::-1], 3), dtype=np.float32)
+    return normalize_skin_pixels(load_skin_pixels(img_pil), out)
+
+
+def decode_skin_prediction(prediction):
+    """แปลงผลของโมเดลหนึ่งภาพเป็น (predicted_class, confidence)"""
+    return CLASS_NAMES[int(np.argmax(prediction))], float(np.max(prediction))
+
+
+class SkinInferenceService:
+    def __init__(self, model_loader=load_skin_model_backend, max_batch_size=16, max_wait_ms=5.0, workers=1,
+                 metrics_window=1000):
+        self.model_loader = model_loader
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="skin-infer")
+        # ปิด batch ใหม่เมื่อมี worker ว่างเท่านั้น ระหว่างที่ worker ทุกตัวไม่ว่าง คำขอจะสะสมในคิวเป็น batch ที่ใหญ่ขึ้น
+        self._free_workers = threading.Semaphore(workers)
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        # metrics
+        self._buffers = threading.local()  # batch buffer float32 ของแต่ละ worker ใช้ซ้ำทุก batch
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=metrics_window)
+        self._inference_times = deque(maxlen=metrics_window)
+
+    # ---------- lifecycle ----------
+    def start(self):
+        with self._start_lock:
+            if self._closed:
+                raise RuntimeError("SkinInferenceService ถูกปิดไปแล้ว")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch_loop, name="skin-dispatch", daemon=True)
+                self._thread.start()
+        return self
+
+    def close(self):
+        with self._start_lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        self._pool.shutdown(wait=True)
+
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.model_loader()
+        return self._model
+
+    # ---------- API ----------
+    def submit(self, img_pil: Image.Image) -> Future:
+        """ส่งภาพเข้าคิว คืน Future ที่ให้ผล (predicted_class, confidence)"""
+        if self._thread is None:
+            self.start()
+        future = Future()
+        try:
+            pixels = load_skin_pixels(img_pil)
+        except Exception as e:
+            future.set_exception(e)
+            return future
+        if self._closed:
+            future.set_exception(RuntimeError("SkinInferenceService ถูกปิดไปแล้ว"))
+            return future
+        self._queue.put((pixels, future, time.perf_counter()))
+        return future
+
+    def predict(self, img_pil: Image.Image, timeout=None):
+        with telemetry.span("skin_inference"):
+            return self.submit(img_pil).result(timeout=timeout)
+
+    async def predict_async(self, img_pil: Image.Image):
+        with telemetry.span("skin_inference"):
+            # แปลงภาพในเธรดแยก ไม่บล็อก event loop
+            future = await asyncio.to_thread(self.submit, img_pil)
+            return await asyncio.wrap_future(future)
+
+    # ---------- worker ----------
+    def _dispatch_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._free_workers.acquire()
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # ให้รอบถัดไปออกจากลูปหลังส่ง batch นี้
+                    break
+                batch.append(item)
+            self._pool.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            self._predict_batch(batch)
+        finally:
+            self._free_workers.release()
+
+    def _predict_batch(self, batch):
+        started = time.perf_counter()
+        futures = [future for _, future, _ in batch]
+        # ข้ามคำขอที่ผู้เรียกยกเลิกไปแล้ว
+        live = [(pixels, future) for pixels, future, _ in batch if future.set_running_or_notify_cancel()]
+        waits = [started - queued_at for _, _, queued_at in batch]
+        try:
+            if live:
+                inputs = self._batch_buffer()[:len(live)]
+                for slot, (pixels, _) in enumerate(live):
+                    normalize_skin_pixels(pixels, inputs[slot])
+                predictions = np.asarray(self.model().predict_on_batch(inputs))
+                for (_, future), prediction in zip(live, predictions):
+                    future.set_result(decode_skin_prediction(prediction))
+            error = False
+        except Exception as e:
+            error = True
+            for _, future in live:
+                future.set_exception(e)
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._requests += len(futures)
+            self._errors += len(live) if error else 0
+            self._batch_sizes[len(batch)] += 1
+            self._queue_waits.extend(waits)
+            self._inference_times.append(elapsed)
+        telemetry.observe("skin_batch_seconds", elapsed, "เวลา inference ต่อ batch ของโมเดลผิวหนัง")
+        telemetry.observe("skin_batch_size", len(batch), "ขนาด batch ของโมเดลผิวหนัง", telemetry.SIZE_BUCKETS)
+        for wait in waits:
+            telemetry.observe("skin_queue_wait_seconds", wait, "เวลารอในคิวก่อนเข้า batch")
+
+    def _batch_buffer(self):
+        buffer = getattr(self._buffers, "batch", None)
+        if buffer is None:
+            buffer = np.empty((self.max_batch_size, *IMAGE_SIZE[::-1], 3), dtype=np.float32)
+            self._buffers.batch = buffer
+        return buffer
+
+    def metrics(self):
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            waits = sorted(self._queue_waits)
+            times = list(self._inference_times)
+            return {
+                "requests": self._requests,
+                "errors": self._errors,
+                "batches": batches,
+                "queue_depth": self._queue.qsize(),
+                "mean_batch_size": round(self._requests / batches, 3) if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_ms_p50": round(_percentile(waits, 0.5) * 1000, 3),
+                "queue_wait_ms_p95": round(_percentile(waits, 0.95) * 1000, 3),
+                "inference_ms_mean": round(statistics.mean(times) * 1000, 3) if times else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "backend": getattr(self._model, "backend_name", None),
+            }
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _create_service():
+    return SkinInferenceService(
+        max_batch_size=int(os.getenv("SKIN_BATCH_SIZE", "16")),
+        max_wait_ms=float(os.getenv("SKIN_BATCH_WAIT_MS", "5")),
+        workers=int(os.getenv("SKIN_WORKERS", "1")),
+    ).start()
+
+
+# บริการตัวเดียวต่อ process (Streamlit ทุก session และ FastAPI ใช้ร่วมกัน)
+get_skin_inference_service = lazy("skin_inference_service", _create_service)
+# โมเดลโหลดตอนภาพแรกเข้ามา หรือตอน warm_up
+get_skin_model = lazy("skin_model", lambda: get_skin_inference_service().model())
@@ -0,0 +1,71 @@
+# skin_model_export.py
+"""
+แปลงโมเดลผิวหนัง (custom_cnn_dfu_model.h5) เป็น TFLite สำหรับรันบน CPU โดยไม่ต้องโหลด TensorFlow/Keras เต็มตัว
+
+    python skin_model_export.py                                   # float32
+    python skin_model_export.py --int8 --calibration-dir ./samples # int8 post-training quantization
+
+--int8 ใช้ภาพตัวอย่าง (png/jpg) ในโฟลเดอร์ calibration เพื่อกำหนดช่วงค่าของ activation
+input/output ของโมเดลยังเป็น float32 เหมือนเดิม จึงใช้ preprocess เดิมได้ทันที
+หลัง export แล้ว predict_skin_disease จะเลือกใช้ไฟล์ .tflite เอง (ดู SKIN_MODEL_BACKEND ใน skin_inference_service.py)
+"""
+import argparse
+import os
+
+import numpy as np
+from PIL import Image
+
+from skin_inference_service import MODEL_PATH, TFLITE_MODEL_PATH, preprocess_skin_image
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def iter_calibration_images(calibration_dir, limit=200):
+    names = sorted(n for n in os.listdir(calibration_dir) if n.lower().endswith(IMAGE_EXTENSIONS))
+    if not names:
+        raise FileNotFoundError(f"ไม่พบภาพตัวอย่างใน {calibration_dir}")
+    for name in names[:limit]:
+        with Image.open(os.path.join(calibration_dir, name)) as img:
+            yield preprocess_skin_image(img.convert("RGB"))
+
+
+def export_tflite(model_path=MODEL_PATH, output_path=TFLITE_MODEL_PATH, int8=False, calibration_dir=None,
+                  calibration_limit=200):
+    """แปลงโมเดล Keras เป็น TFLite คืน path ของไฟล์ที่เขียน"""
+    import tensorflow as tf
+    from skin_inference_service import load_keras_model
+
+    model = load_keras_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if int8:
+        if not calibration_dir:
+            raise ValueError("--int8 ต้องระบุ --calibration-dir (ภาพตัวอย่างสำหรับ calibrate)")
+
+        def representative_dataset():
+            for array in iter_calibration_images(calibration_dir, calibration_limit):
+                yield [np.expand_dims(array, axis=0)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    tflite_model = converter.convert()
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(tflite_model)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="export โมเดลผิวหนังเป็น TFLite")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=TFLITE_MODEL_PATH)
+    parser.add_argument("--int8", action="store_true", help="ทำ int8 post-training quantization")
+    parser.add_argument("--calibration-dir", help="โฟลเดอร์ภาพตัวอย่างสำหรับ calibrate int8")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    args = parser.parse_args()
+
+    path = export_tflite(args.model, args.output, args.int8, args.calibration_dir, args.calibration_limit)
+    print(f"exported {args.model} -> {path} ({os.path.getsize(path) / 1024:.0f} KB, "
+          f"{'int8' if args.int8 else 'float32'})")
@@ -1,18 +1,21 @@
-from keras.models import load_model
-import numpy as np
 from PIL import Image
 import streamlit as st
 
-MODEL_PATH = './custom_cnn_dfu_model.h5'
-CLASS_NAMES = ['Abnormal(Ulcer)', 'Normal(Healthy skin)']
-IMAGE_SIZE = (224, 224)
+from skin_inference_service import CLASS_NAMES, IMAGE_SIZE, MODEL_PATH, get_skin_inference_service
+
+# MODEL_PATH / CLASS_NAMES / IMAGE_SIZE เดิมประกาศในโมดูลนี้ ย้ายไป skin_inference_service แล้ว
+# re-export ไว้ให้โค้ดที่ import จากที่นี่ยังใช้ได้
+__all__ = [
+    "MODEL_PATH", "CLASS_NAMES", "IMAGE_SIZE",
+    "load_skin_model", "predict_skin_disease", "get_skin_condition_description",
+]
 
 @st.cache_resource
 def load_skin_model():
     """โหลดโมเดล AI สำหรับวิเคราะห์ผิวหนัง"""
     try:
-        # ✅ แก้ไขตรงนี้: ไม่ compile โมเดลเพื่อลด warning
-        model = load_model(MODEL_PATH, compile=False)
+        # ใช้โมเดลตัวเดียวกับบริการ batch ไม่โหลดซ้ำ
+        model = get_skin_inference_service().model()
         return model
     except Exception as e:
         st.error(f"ไม่สามารถโหลดโมเดลได้: {str(e)}")
@@ -28,32 +31,9 @@ def predict_skin_disease(img_pil: Image.Image):
     Returns:
         Tuple[str, float]: (predicted_class, confidence)
     """
-    model = load_skin_model()
-
-    if model is None:
-        raise Exception("ไม่สามารถโหลดโมเดลได้")
-
+    # ส่งเข้าบริการที่รวมภาพจากหลาย session เป็น batch เดียว (ดู skin_inference_service.py)
     try:
-        # ปรับขนาดและ normalize
-        img = img_pil.resize(IMAGE_SIZE)
-        img_array = np.array(img).astype('float32') / 255.0
-
-        # รองรับ grayscale และ alpha channel
-        if img_array.ndim == 2:
-            img_array = np.stack([img_array]*3, axis=-1)
-        elif img_array.shape[2] == 4:
-            img_array = img_array[:, :, :3]
-
-        # เพิ่มมิติ batch
-        img_array = np.expand_dims(img_array, axis=0)
-
-        # ทำนาย
-        prediction = model.predict(img_array, verbose=0)
-        predicted_class = CLASS_NAMES[np.argmax(prediction)]
-        confidence = float(np.max(prediction))
-
-        return predicted_class, confidence
-
+        return get_skin_inference_service().predict(img_pil)
     except Exception as e:
         raise Exception(f"เกิดข้อผิดพลาดในการวิเคราะห์ภาพ: {str(e)}")
 
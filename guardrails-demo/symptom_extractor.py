@@ -0,0 +1,217 @@
+# symptom_extractor.py
+import re
+from collections import deque
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+
+class KeywordAutomaton:
+    """
+    Aho–Corasick automaton สำหรับหาคำหลายคำในข้อความรอบเดียว
+
+    ใช้กับข้อความภาษาไทยที่ไม่มีการเว้นวรรคได้ เพราะไม่ต้องตัดคำก่อน
+    เวลาค้นหาเป็นเชิงเส้นตามความยาวข้อความ (+ จำนวนคำที่เจอ)
+    """
+
+    def __init__(self, keywords):
+        self.keywords = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for keyword in keywords:
+            self.add(keyword)
+        self._build()
+
+    def add(self, keyword):
+        if not keyword:
+            return
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(len(self.keywords))
+        self.keywords.append(keyword)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text):
+        """คืน (start, end, keyword_id) ของทุกคำที่พบ รวมคำที่ซ้อนทับกัน"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for kid in out[node]:
+                yield i + 1 - len(self.keywords[kid]), i + 1, kid
+
+    def longest_matches(self, text):
+        """คืนคำที่พบแบบไม่ซ้อนทับ เลือกคำที่ยาวที่สุดจากซ้ายไปขวา"""
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        chosen = []
+        last_end = 0
+        for start, end, kid in matches:
+            if start >= last_end:
+                chosen.append((start, end, kid))
+                last_end = end
+        return chosen
+
+
+_TOKEN_RE = re.compile(r"[^\s,]+")
+
+# คำพูดที่ผู้ใช้มักใช้ -> ชื่อคอลัมน์อาการในตาราง (ใช้เฉพาะคู่ที่อาการปลายทางมีอยู่จริง)
+# แมปเฉพาะคำที่ความหมายทางอาการเหมือนกัน ("มึนหัว" = เวียนศีรษะ ไม่ใช่ปวดหัว, "คอแห้ง" ไม่ใช่กระหายน้ำ
+# ตารางยังไม่มีคอลัมน์ของอาการเหล่านี้ จึงไม่แมป)
+DEFAULT_SYMPTOM_SYNONYMS = {
+    "ตัวร้อน": "ไข้",
+    "ตัวรุมๆ": "ไข้",
+    "มีน้ำมูก": "น้ำมูกไหล",
+    "หายใจไม่ออก": "หายใจลำบาก",
+    "หายใจไม่สะดวก": "หายใจลำบาก",
+    "หายใจวี้ด": "หายใจมีเสียง",
+    "ฉี่บ่อย": "ปัสสาวะบ่อย",
+    "หิวน้ำบ่อย": "กระหายน้ำ",
+    "ตามัว": "สายตาพร่ามัว",
+    "ผอมลง": "น้ำหนักลด",
+    "ไม่อยากอาหาร": "เบื่ออาหาร",
+    "กินไม่ลง": "เบื่ออาหาร",
+    "ไม่มีแรง": "อ่อนเพลีย",
+    "เพลีย": "อ่อนเพลีย",
+    "หอบเหนื่อย": "เหนื่อยง่าย",
+    "แสบอก": "แสบร้อนหน้าอก",
+    "เรอเปรี้ยว": "แสบร้อนหน้าอก",
+    "เสียงแห้ง": "เสียงแหบ",
+    "คันตามตัว": "คัน",
+    "ตุ่มใส": "ผื่นตุ่มน้ำ",
+}
+
+
+class SymptomExtractor:
+    """
+    ดึงอาการจากข้อความผู้ใช้
+
+    1. exact match ด้วย Aho–Corasick กับชื่ออาการและคำพ้องทั้งหมด (รองรับภาษาไทยไม่เว้นวรรค)
+    2. คำที่ไม่เจอ exact match เลย ค่อยทำ fuzzy match แบบเดิม (WRatio) แต่เทียบเฉพาะอาการที่มี
+       character n-gram ร่วมกับคำนั้น และคำนวณทุกคำใน process.cdist ครั้งเดียว
+    """
+
+    def __init__(self, known_symptoms, synonyms=None, threshold=80, ngram=2):
+        self.known_symptoms = list(known_symptoms)
+        self.threshold = threshold
+        self.ngram = ngram
+        # keyword -> ชื่ออาการมาตรฐาน
+        self._canonical = {}
+        for symptom in self.known_symptoms:
+            self._canonical.setdefault(symptom.lower(), symptom)
+        known = set(self.known_symptoms)
+        for synonym, symptom in (synonyms or {}).items():
+            if symptom in known:
+                self._canonical.setdefault(synonym.lower(), symptom)
+        self.automaton = KeywordAutomaton(self._canonical)
+        self._keyword_symptom = [self._canonical[k] for k in self.automaton.keywords]
+        # n-gram blocking index: n-gram -> index ของอาการ
+        self._blocks = {}
+        for idx, symptom in enumerate(self.known_symptoms):
+            for gram in self._grams(symptom):
+                self._blocks.setdefault(gram, set()).add(idx)
+
+    def _grams(self, text):
+        n = self.ngram if len(text) >= self.ngram else 1
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def _candidates(self, token):
+        found = set()
+        for gram in self._grams(token):
+            found |= self._blocks.get(gram, set())
+        if len(token) < self.ngram:
+            # คำสั้นกว่า n-gram ใช้ unigram ของอาการแทน
+            for idx, symptom in enumerate(self.known_symptoms):
+                if token in symptom:
+                    found.add(idx)
+        return found
+
+    def extract(self, user_text):
+        return [symptom for symptom, _, _ in self.mentions(user_text)]
+
+    def mentions(self, user_text):
+        """เหมือน extract แต่คืน (อาการ, start, end) ตำแหน่งที่พบครั้งแรกในข้อความ (ใช้ดูคำปฏิเสธรอบๆ)"""
+        text = user_text.lower()
+        matched = []
+        seen = set()
+        covered = []
+        for start, end, kid in self.automaton.longest_matches(text):
+            covered.append((start, end))
+            symptom = self._keyword_symptom[kid]
+            if symptom not in seen:
+                seen.add(symptom)
+                matched.append((symptom, start, end))
+
+        # แทน 'และ' ด้วยช่องว่างความยาวเท่ากัน เพื่อให้ตำแหน่งคำตรงกับข้อความเดิม
+        spaced = user_text.replace('และ', '   ')
+        leftovers = []
+        spans = []
+        for m in _TOKEN_RE.finditer(spaced):
+            if any(s < m.end() and e > m.start() for s, e in covered):
+                continue
+            leftovers.append(m.group())
+            spans.append(m.span())
+        if not leftovers or not self.known_symptoms:
+            return matched
+
+        token_candidates = [self._candidates(token) for token in leftovers]
+        union = sorted(set().union(*token_candidates))
+        if not union:
+            return matched
+        choices = [self.known_symptoms[i] for i in union]
+        scores = process.cdist(leftovers, choices, scorer=fuzz.WRatio,
+                               score_cutoff=self.threshold, dtype=np.float64)
+        position = {idx: j for j, idx in enumerate(union)}
+        for row, candidates, (start, end) in zip(scores, token_candidates, spans):
+            if not candidates:
+                continue
+            mask = np.zeros(len(union), dtype=bool)
+            mask[[position[i] for i in candidates]] = True
+            masked = np.where(mask, row, 0.0)
+            best = int(np.argmax(masked))
+            if masked[best] >= self.threshold and masked[best] > 0:
+                symptom = choices[best]
+                if symptom not in seen:
+                    seen.add(symptom)
+                    matched.append((symptom, start, end))
+        return matched
+
+
+# cache ตัวดึงอาการตามลิสต์อาการ (เก็บอ้างอิงลิสต์ไว้ด้วย id จึงไม่ถูกใช้ซ้ำ)
+# จำกัดจำนวน ไม่ให้ตัวดึงของฐานความรู้ชุดเก่าค้างอยู่หลัง reload หลายครั้ง
+_extractors = {}
+MAX_EXTRACTORS = 8
+
+
+def get_symptom_extractor(known_symptoms, threshold=80, synonyms=DEFAULT_SYMPTOM_SYNONYMS):
+    key = (id(known_symptoms), threshold, id(synonyms))
+    cached = _extractors.get(key)
+    if cached is not None and cached[0] is known_symptoms and len(cached[1].known_symptoms) == len(known_symptoms):
+        return cached[1]
+    extractor = SymptomExtractor(known_symptoms, synonyms=synonyms, threshold=threshold)
+    _extractors.pop(key, None)
+    while len(_extractors) >= MAX_EXTRACTORS:
+        del _extractors[next(iter(_extractors))]
+    _extractors[key] = (known_symptoms, extractor, synonyms)
+    return extractor
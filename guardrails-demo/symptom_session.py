@@ -0,0 +1,178 @@
+# symptom_session.py
+"""
+อาการสะสมข้ามเทิร์นของหนึ่ง session (เช่น เทิร์นแรกบอกว่ามีไข้ เทิร์นถัดไปบอกว่าไอ -> จัดอันดับจาก ไข้ + ไอ)
+
+- แต่ละเทิร์นดึงอาการจากข้อความใหม่เท่านั้น ไม่สแกนประวัติซ้ำ
+- อาการที่มีคำปฏิเสธนำหน้า/ตามหลัง ("ไม่มีไข้", "หายไอแล้ว") ถือว่าผู้ใช้ถอนอาการนั้น
+- เก็บตัวนับต่อโรค (ผลรวมแถวของ SymptomScorer.disease_profile ของอาการที่มี) ไว้ใน state
+  เพิ่ม/ถอนอาการ = บวก/ลบแถวเดียว ต้นทุนต่อเทิร์นจึงเป็น O(อาการใหม่ x จำนวนโรค) ไม่โตตามความยาวแชต
+- ตัวนับผูกกับเวอร์ชันฐานความรู้ ถ้าฐานความรู้ถูก reload จะคำนวณใหม่จากรายชื่ออาการที่สะสมไว้ครั้งเดียว
+
+ข้อมูลอยู่ใน state[STATE_KEY] (serialize เป็น JSON ได้ จึงเก็บใน session_store ได้ตรงๆ)
+"""
+import numpy as np
+
+from session_store import register_state_merger
+
+STATE_KEY = "symptom_session"
+
+# คำปฏิเสธหน้าอาการ (ติดกับอาการ หรือมีแค่คำเชื่อมใน NEGATION_FILLERS คั่น) เรียงจากยาวไปสั้น
+NEGATION_PREFIXES = ("ไม่มีอาการ", "ไม่มี", "ไม่ได้", "ไม่เป็น", "ไม่", "หายจาก", "หาย")
+# คำหลังอาการที่บอกว่าหายแล้ว
+NEGATION_SUFFIXES = ("หายแล้ว", "หายดีแล้ว", "หายไปแล้ว", "ไม่มีแล้ว", "ดีขึ้นแล้ว")
+# คำที่ขั้นระหว่างคำปฏิเสธกับอาการได้ เช่น "ไม่มีอาการไข้"
+NEGATION_FILLERS = ("อาการ", "เลย")
+# คำที่นำหน้าคำปฏิเสธได้เมื่อคำปฏิเสธแยกวรรคจากอาการ เช่น "ยังไม่มี ไข้"
+NEGATION_LEADS = ("ยัง", "ก็")
+# "ไม่หาย" / "ยังไม่หาย" = ยังเป็นอยู่ ไม่ใช่การปฏิเสธ
+NOT_RECOVERED = "ไม่"
+# ช่องว่างก็ถือว่าขึ้นวลีใหม่ (ดู is_negated)
+CLAUSE_BREAKS = (",", "\n", ".", "แต่", "และ")
+
+
+def _strip_fillers(word):
+    stripped = True
+    while stripped:
+        stripped = False
+        for filler in NEGATION_FILLERS:
+            if word.endswith(filler):
+                word = word[:-len(filler)]
+                stripped = True
+    return word
+
+
+def _negation_prefix(word):
+    """คำปฏิเสธที่ท้าย word (ไม่นับ "หาย" ที่อยู่หลัง "ไม่") คืน (คำปฏิเสธ, ส่วนที่อยู่ก่อน) หรือ None"""
+    for prefix in NEGATION_PREFIXES:
+        if word.endswith(prefix):
+            rest = word[:-len(prefix)]
+            if prefix.startswith("หาย") and rest.endswith(NOT_RECOVERED):
+                return None
+            return prefix, rest
+    return None
+
+
+def is_negated(text, start, end):
+    """
+    อาการที่อยู่ที่ text[start:end] ถูกปฏิเสธหรือไม่
+
+    คำปฏิเสธต้องติดกับอาการ ("ไม่มีไข้", "หายไอ") หรือเป็นคำโดดๆ ก่อนหน้าที่คั่นด้วยช่องว่าง ("ไม่มี ไข้")
+    ช่องว่างถือว่าขึ้นวลีใหม่ "ไข้ยังไม่หาย ปวดหัว" / "ไข้หาย ปวดหัว" จึงไม่ปฏิเสธปวดหัว
+    """
+    before = text[:start].lower()
+    for sep in CLAUSE_BREAKS:
+        before = before.rsplit(sep, 1)[-1]
+    words = before.split()
+    attached = bool(before) and not before[-1].isspace()
+    while words:
+        word = _strip_fillers(words[-1])
+        if word:
+            match = _negation_prefix(word)
+            if match is not None and (attached or match[1] in ("",) + NEGATION_LEADS):
+                return True
+            break
+        words.pop()  # มีแค่คำเชื่อม เช่น "ไม่มี อาการ ไข้" ดูคำก่อนหน้าต่อ
+        attached = False
+    return text[end:].lstrip().lower().startswith(NEGATION_SUFFIXES)
+
+
+def split_negated(text, mentions):
+    """แยก [(อาการ, start, end)] เป็น (อาการที่ผู้ใช้มี, อาการที่ผู้ใช้ปฏิเสธ/บอกว่าหายแล้ว)"""
+    present, negated = [], []
+    for symptom, start, end in mentions:
+        (negated if is_negated(text, start, end) else present).append(symptom)
+    return present, negated
+
+
+class SymptomAccumulator:
+    """อาการสะสมของ session หนึ่งพร้อมตัวนับต่อโรค"""
+
+    def __init__(self, scorer, symptoms=(), counts=None):
+        self.scorer = scorer
+        self.profile = scorer.disease_profile()
+        self.symptoms = []
+        self.counts = np.zeros(len(scorer.diseases), dtype=self.profile.dtype)
+        if counts is not None and len(counts) == len(scorer.diseases):
+            self.symptoms = [s for s in symptoms if s in scorer.symptom_index]
+            self.counts = np.asarray(counts, dtype=self.profile.dtype)
+        else:
+            for symptom in symptoms:
+                self.add(symptom)
+
+    @classmethod
+    def from_state(cls, scorer, data, version):
+        """สร้างจาก state[STATE_KEY] (ตัวนับของฐานความรู้เวอร์ชันอื่นไม่ใช้ คำนวณใหม่จากรายชื่ออาการ)"""
+        data = data or {}
+        counts = data.get("counts") if data.get("version") == version else None
+        return cls(scorer, data.get("symptoms", ()), counts)
+
+    def to_state(self, version):
+        return {"symptoms": list(self.symptoms), "counts": self.counts.tolist(), "version": version}
+
+    def add(self, symptom):
+        idx = self.scorer.symptom_index.get(symptom)
+        if idx is None or symptom in self.symptoms:
+            return False
+        self.counts += self.profile[idx]
+        self.symptoms.append(symptom)
+        return True
+
+    def retract(self, symptom):
+        if symptom not in self.symptoms:
+            return False
+        self.counts -= self.profile[self.scorer.symptom_index[symptom]]
+        self.symptoms.remove(symptom)
+        return True
+
+    def update(self, present=(), negated=()):
+        """ถอนอาการที่ถูกปฏิเสธแล้วเพิ่มอาการใหม่ คืน (added, retracted) เฉพาะที่เปลี่ยนจริง"""
+        retracted = [s for s in negated if self.retract(s)]
+        added = [s for s in present if self.add(s)]
+        return added, retracted
+
+    def rank(self, top_k=None):
+        return self.scorer.score_counts(self.counts, len(self.symptoms), top_k)
+
+    def with_symptoms(self, symptoms):
+        """สำเนาที่เพิ่มอาการชั่วคราว (เช่นอาการจากประโยคตัวอย่าง) ไม่เขียนกลับ state ของ session"""
+        copy = SymptomAccumulator(self.scorer, self.symptoms, self.counts.copy())
+        copy.update(symptoms)
+        return copy
+
+
+def update_session_symptoms(state, scorer, version, present=(), negated=()):
+    """โหลดอาการสะสมจาก state ปรับตามเทิร์นนี้แล้วเขียนกลับ คืน accumulator"""
+    accumulator = SymptomAccumulator.from_state(scorer, state.get(STATE_KEY), version)
+    added, retracted = accumulator.update(present, negated)
+    state[STATE_KEY] = dict(accumulator.to_state(version), added=added, retracted=retracted)
+    return accumulator
+
+
+def merge_session_symptoms(current, base, mine):
+    """
+    อีกคำขอของ session เดียวกันเขียนอาการสะสมไปก่อนระหว่างเทิร์นนี้ (เช่นอีก worker):
+    ใช้รายชื่อล่าสุดแล้วถอน/เพิ่มเฉพาะอาการที่เทิร์นนี้เปลี่ยน ตัวนับคำนวณใหม่จากรายชื่อในเทิร์นถัดไป
+    """
+    if not mine or not current:
+        return mine
+    added, retracted = mine.get("added", []), mine.get("retracted", [])
+    symptoms = [s for s in current.get("symptoms", []) if s not in retracted]
+    symptoms += [s for s in added if s not in symptoms]
+    return {"symptoms": symptoms, "counts": None, "version": None, "added": added, "retracted": retracted}
+
+
+register_state_merger(STATE_KEY, merge_session_symptoms)
+
+
+def clear_session_symptoms(state):
+    if state is not None:
+        state.pop(STATE_KEY, None)
+
+
+def session_symptoms(state):
+    """รายชื่ออาการที่สะสมไว้ (สำหรับแสดงผล)"""
+    return list(((state or {}).get(STATE_KEY) or {}).get("symptoms", []))
+
+
+def retracted_last_turn(state):
+    return bool(((state or {}).get(STATE_KEY) or {}).get("retracted"))
@@ -0,0 +1,199 @@
+# symptom_table_cache.py
+"""
+คอมไพล์ตารางอาการ (CSV one-hot) เป็นไฟล์ไบนารีที่ mmap ได้ เพื่อไม่ต้อง parse CSV ด้วย pandas
+ทุกครั้งที่ worker เริ่มทำงานหรือ Streamlit reload สคริปต์
+
+โครงสร้างโฟลเดอร์ artifact (ค่าเริ่มต้น <โฟลเดอร์ CSV>/.symptom_cache/<ชื่อไฟล์ CSV>/):
+    v<เวอร์ชัน>-<sha256 ย่อ>/matrix.npy     เมทริกซ์ เคส x อาการ (uint8, column-major) เปิดแบบ mmap อ่านอย่างเดียว
+    v<เวอร์ชัน>-<sha256 ย่อ>/row_codes.npy  รหัสโรคของแต่ละแถว (int32)
+    meta.json      รายชื่อโรค รายชื่ออาการ คอลัมน์โรค sha256 ของ CSV ต้นทาง และชื่อโฟลเดอร์ข้อมูล (data)
+
+ไฟล์ข้อมูลแต่ละชุดอยู่ในโฟลเดอร์ของตัวเองที่ไม่ถูกเขียนทับ (สร้างในโฟลเดอร์ชั่วคราวแล้ว rename ทีเดียว)
+meta.json เปลี่ยนไปชี้ชุดใหม่ด้วย os.replace worker ที่อ่าน meta เก่าจึงยังเปิดไฟล์ชุดเก่าที่เข้าคู่กันได้เสมอ
+ไม่มีทางได้ meta ชุดหนึ่งกับ matrix อีกชุด เก็บไว้ KEEP_VERSIONS ชุดล่าสุด ที่เก่ากว่านั้นลบทิ้ง
+
+ทุก worker ที่ mmap ไฟล์เดียวกันจะใช้ page cache ชุดเดียวกันของระบบปฏิบัติการ
+
+สร้างล่วงหน้า (build step):
+    python symptom_table_cache.py ./data/full_onehot_disease.csv
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from predict import SymptomScorer, load_symptom_data, get_symptom_scorer
+
+ARTIFACT_VERSION = 2
+CACHE_DIR_NAME = ".symptom_cache"
+KEEP_VERSIONS = 2
+
+
+def default_artifact_dir(csv_path):
+    csv_path = os.path.abspath(csv_path)
+    return os.path.join(os.path.dirname(csv_path), CACHE_DIR_NAME, os.path.basename(csv_path))
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_atomic(path, write):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        # mkstemp สร้างไฟล์สิทธิ์ 0600 ปรับให้ worker ของผู้ใช้อื่นอ่านได้
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_version_dir(artifact_dir, name, write_files):
+    """
+    เขียนไฟล์ข้อมูลชุดหนึ่งลงโฟลเดอร์ชั่วคราวด้วย write_files(โฟลเดอร์) แล้ว rename เป็น <artifact_dir>/<name>
+    ทีเดียว ถ้ามีโฟลเดอร์ชื่อนี้อยู่แล้ว (worker อื่นสร้างชุดเดียวกันเสร็จก่อน) ใช้ของเดิม คืน path ของโฟลเดอร์
+    """
+    final = os.path.join(artifact_dir, name)
+    if os.path.isdir(final):
+        return final
+    tmp_dir = tempfile.mkdtemp(dir=artifact_dir, prefix=".tmp-")
+    try:
+        write_files(tmp_dir)
+        os.chmod(tmp_dir, 0o755)
+        os.rename(tmp_dir, final)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(final):
+            raise
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return final
+
+
+def prune_versions(artifact_dir, current, keep=KEEP_VERSIONS):
+    """ลบโฟลเดอร์ข้อมูลชุดเก่า เหลือ current กับชุดที่ใหม่ที่สุดอีก keep - 1 ชุด (worker ที่ยังอ่าน meta เก่าอยู่)"""
+    try:
+        entries = [e for e in os.scandir(artifact_dir)
+                   if e.is_dir(follow_symlinks=False) and not e.name.startswith(".") and e.name != current]
+    except OSError:
+        return
+    entries.sort(key=lambda e: e.stat(follow_symlinks=False).st_mtime_ns, reverse=True)
+    for entry in entries[max(keep - 1, 0):]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def compile_symptom_table(csv_path, artifact_dir=None):
+    """อ่าน CSV หนึ่งครั้งแล้วเขียน artifact คืน meta ที่เขียนลงไป"""
+    artifact_dir = artifact_dir or default_artifact_dir(csv_path)
+    os.makedirs(artifact_dir, exist_ok=True)
+
+    stat = os.stat(csv_path)
+    sha256 = file_sha256(csv_path)
+    df, known_symptoms, disease_col = load_symptom_data(csv_path)
+    scorer = get_symptom_scorer(df, disease_col)
+
+    def write_files(directory):
+        with open(os.path.join(directory, "matrix.npy"), "wb") as f:
+            np.save(f, np.asfortranarray(scorer.matrix))
+        with open(os.path.join(directory, "row_codes.npy"), "wb") as f:
+            np.save(f, scorer.row_codes.astype(np.int32))
+
+    data = f"v{ARTIFACT_VERSION}-{sha256[:16]}"
+    write_version_dir(artifact_dir, data, write_files)
+    meta = {
+        "version": ARTIFACT_VERSION,
+        "data": data,
+        "sha256": sha256,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "disease_col": disease_col,
+        "diseases": [str(d) for d in scorer.diseases],
+        "symptoms": known_symptoms,
+        "shape": list(scorer.matrix.shape),
+        "dtype": str(scorer.matrix.dtype),
+    }
+    # เขียน meta.json เป็นไฟล์สุดท้าย สลับไปชี้โฟลเดอร์ข้อมูลชุดใหม่ในครั้งเดียว
+    write_atomic(os.path.join(artifact_dir, "meta.json"),
+                  lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+    prune_versions(artifact_dir, data)
+    # ไฟล์รูปแบบเดิม (ARTIFACT_VERSION 1) ที่วางไว้ระดับบนสุด
+    for name in ("matrix.npy", "row_codes.npy"):
+        try:
+            os.remove(os.path.join(artifact_dir, name))
+        except OSError:
+            pass
+    return meta
+
+
+def _read_meta(artifact_dir):
+    try:
+        with open(os.path.join(artifact_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != ARTIFACT_VERSION or not os.path.isdir(os.path.join(artifact_dir, meta["data"])):
+        return None
+    return meta
+
+
+def _is_fresh(csv_path, artifact_dir, meta):
+    """เช็ก size/mtime ก่อน (ถูก) ถ้าไม่ตรงค่อยเทียบ sha256 ของเนื้อไฟล์"""
+    stat = os.stat(csv_path)
+    if stat.st_size == meta["size"] and stat.st_mtime_ns == meta["mtime_ns"]:
+        return True
+    if stat.st_size != meta["size"] or file_sha256(csv_path) != meta["sha256"]:
+        return False
+    # เนื้อไฟล์เหมือนเดิม แค่ mtime เปลี่ยน (เช่น checkout ใหม่) อัปเดต meta ไว้ครั้งหน้าจะได้ไม่ต้อง hash อีก
+    meta = dict(meta, mtime_ns=stat.st_mtime_ns)
+    try:
+        write_atomic(os.path.join(artifact_dir, "meta.json"),
+                      lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+    except OSError:
+        pass
+    return True
+
+
+def load_symptom_table(csv_path, artifact_dir=None, rebuild=True):
+    """
+    โหลดตารางอาการจาก artifact แบบ mmap (คอมไพล์ใหม่อัตโนมัติเมื่อ CSV เปลี่ยน)
+
+    Returns:
+        Tuple[SymptomScorer, List[str], str]: (symptom_table, known_symptoms, disease_col)
+        symptom_table ส่งเข้า predict_disease_percent แทน DataFrame ได้เลย
+    """
+    artifact_dir = artifact_dir or default_artifact_dir(csv_path)
+    meta = _read_meta(artifact_dir)
+    if meta is None or not _is_fresh(csv_path, artifact_dir, meta):
+        if not rebuild:
+            raise FileNotFoundError(f"ไม่พบ artifact ที่ตรงกับ {csv_path} ใน {artifact_dir}")
+        meta = compile_symptom_table(csv_path, artifact_dir)
+
+    # ไฟล์ข้อมูลมาจากโฟลเดอร์ที่ meta ฉบับที่อ่านได้ชี้ไว้ (ไม่ถูกเขียนทับ) จึงเข้าคู่กับ meta เสมอ
+    data_dir = os.path.join(artifact_dir, meta["data"])
+    matrix = np.load(os.path.join(data_dir, "matrix.npy"), mmap_mode="r")
+    row_codes = np.load(os.path.join(data_dir, "row_codes.npy")).astype(np.intp)
+    table = SymptomScorer(matrix, row_codes, meta["diseases"], meta["symptoms"], content_hash=meta["sha256"])
+    return table, list(meta["symptoms"]), meta["disease_col"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python symptom_table_cache.py <csv_path> [artifact_dir]")
+        sys.exit(1)
+    result = compile_symptom_table(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"compiled {sys.argv[1]}: {result['shape'][0]} cases x {result['shape'][1]} symptoms, "
+          f"{len(result['diseases'])} diseases, sha256 {result['sha256'][:12]}")
@@ -0,0 +1,312 @@
+# telemetry.py
+"""
+วัดเวลาแต่ละขั้นของหนึ่งเทิร์น (ดึงอาการ จัดอันดับโรค บริบทความรู้ AI1/AI2/AI3 ตรวจผล Guard ภาพผิวหนัง โหลดทรัพยากร)
+
+- span("ชื่อขั้น"): จับเวลาและเก็บลง histogram chatbot_stage_duration_seconds{stage=...}
+  ถ้าอยู่ใน trace ของคำขอจะถูกบันทึกเป็น span ของ trace นั้นด้วย (ทำงานข้าม asyncio task และ thread ที่
+  submit ผ่าน contextvars.copy_context().run)
+- record_tokens / record_cache: จำนวน token จาก usage ของ completion และผลแคช hit/miss ต่อขั้น
+- render_prometheus(): ข้อความรูปแบบ Prometheus สำหรับ GET /metrics
+- trace("ชื่อ"): trace ในโปรเซสต่อคำขอ ถ้าตั้ง TELEMETRY_TRACE_FILE จะเขียนต่อท้ายเป็น JSONL หนึ่งบรรทัดต่อคำขอ
+
+TELEMETRY=0 ปิดทั้งหมด span/trace คืนอ็อบเจกต์ว่างตัวเดียวกันทุกครั้ง (ต้นทุนเหลือแค่เรียกฟังก์ชัน)
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+
+ENABLED = os.getenv("TELEMETRY", "1").lower() not in ("0", "false", "no", "off")
+TRACE_FILE = os.getenv("TELEMETRY_TRACE_FILE") or None
+METRIC_PREFIX = "chatbot_"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+_current_trace = contextvars.ContextVar("telemetry_trace", default=None)
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+
+
+def set_enabled(enabled):
+    global ENABLED
+    ENABLED = bool(enabled)
+
+
+# ================= metrics =================
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # ช่องสุดท้าย = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}  # ชื่อ -> (ชนิด, คำอธิบาย)
+        self._counters = {}  # (ชื่อ, labels) -> ค่า
+        self._histograms = {}  # (ชื่อ, labels) -> Histogram
+
+    def inc(self, name, value=1, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, help="", buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._meta.setdefault(name, ("histogram", help))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._meta.clear()
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help) in sorted(self._meta.items()):
+                full = METRIC_PREFIX + name
+                if help:
+                    lines.append(f"# HELP {full} {help}")
+                lines.append(f"# TYPE {full} {kind}")
+                if kind == "counter":
+                    for (n, labels), value in sorted(self._counters.items()):
+                        if n == name:
+                            lines.append(f"{full}{_label_text(labels)} {value}")
+                    continue
+                for (n, labels), h in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{full}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{full}_sum{_label_text(labels)} {h.sum}")
+                    lines.append(f"{full}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def inc(name, value=1, help="", **labels):
+    if ENABLED:
+        metrics.inc(name, value, help, **labels)
+
+
+def observe(name, value, help="", buckets=DEFAULT_BUCKETS, **labels):
+    if ENABLED:
+        metrics.observe(name, value, help, buckets, **labels)
+
+
+def render_prometheus():
+    return metrics.render()
+
+
+# ================= spans / traces =================
+class _NoopSpan:
+    """คืนแทน Span/Trace เมื่อปิด telemetry"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "stage", "attrs", "start", "duration", "parent", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.stage = name
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        # ขั้นของ span ย่อย (เช่น llm_call ใน ai1) นับเป็นขั้นของ span นอกสุด ใช้เป็น label ของ token
+        if self.parent is not None:
+            self.stage = self.parent.stage
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:  # ปิดใน context อื่น (เช่น generator ที่ถูกปิดจากอีก task)
+            _current_span.set(self.parent)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+            metrics.inc("stage_errors_total", 1, "จำนวนขั้นที่จบด้วย exception", stage=self.name)
+        metrics.observe("stage_duration_seconds", self.duration, "เวลาแต่ละขั้นของเทิร์น", stage=self.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin):
+        return {
+            "name": self.name,
+            "parent": self.parent.name if self.parent is not None else None,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+
+
+class Trace:
+    _write_lock = threading.Lock()
+
+    def __init__(self, name, attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.start = None
+        self.started_at = None
+        self.duration = None
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_trace.reset(self._token)
+        except ValueError:
+            _current_trace.set(None)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        metrics.observe("request_duration_seconds", self.duration, "เวลารวมต่อคำขอ", kind=self.name)
+        if TRACE_FILE:
+            line = json.dumps(self.to_dict(), ensure_ascii=False, default=str)
+            with self._write_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "attrs": self.attrs,
+            "spans": [s.to_dict(self.start) for s in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+
+def span(name, **attrs):
+    """with span("ai1"): ... (ปิด telemetry = ไม่ทำอะไร)"""
+    return Span(name, attrs) if ENABLED else _NOOP
+
+
+def trace(name, **attrs):
+    """trace ของหนึ่งคำขอ ถ้ามี trace อยู่แล้ว (เรียกซ้อน) span ทั้งหมดเข้า trace เดิม"""
+    if not ENABLED or _current_trace.get() is not None:
+        return _NOOP
+    return Trace(name, attrs)
+
+
+def current_trace():
+    return _current_trace.get() if ENABLED else None
+
+
+def traced(name):
+    """decorator: ครอบฟังก์ชันธรรมดา / coroutine / generator / async generator ด้วย trace(name)"""
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with trace(name):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with trace(name):
+                    return await fn(*args, **kwargs)
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with trace(name):
+                    yield from fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with trace(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attrs):
+    """เพิ่มข้อมูลให้ span ปัจจุบัน (ถ้ามี)"""
+    if ENABLED:
+        current = _current_span.get()
+        if current is not None:
+            current.attrs.update(attrs)
+
+
+def record_tokens(prompt_tokens, completion_tokens, model=None):
+    if not ENABLED:
+        return
+    current = _current_span.get()
+    stage = current.stage if current is not None else "unknown"
+    metrics.inc("llm_tokens_total", prompt_tokens or 0, "token จาก usage ของ completion", stage=stage, kind="prompt")
+    metrics.inc("llm_tokens_total", completion_tokens or 0, "token จาก usage ของ completion", stage=stage,
+                kind="completion")
+    if current is not None:
+        current.attrs["prompt_tokens"] = current.attrs.get("prompt_tokens", 0) + (prompt_tokens or 0)
+        current.attrs["completion_tokens"] = current.attrs.get("completion_tokens", 0) + (completion_tokens or 0)
+        if model:
+            current.attrs["model"] = model
+
+
+def record_cache(stage, hit):
+    if not ENABLED:
+        return
+    metrics.inc("cache_requests_total", 1, "ผลแคชคำตอบต่อขั้น", stage=stage, result="hit" if hit else "miss")
+    annotate(cache_hit=hit)
@@ -0,0 +1,72 @@
+import json
+import os
+import re
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from local_validation import FORBIDDEN_ALLOWLIST, LocalValidator, OutputSpec  # noqa: E402
+
+RAIL = os.path.join(HERE, "..", "guardrails_spec.rail")
+
+
+@pytest.fixture(scope="module")
+def spec():
+    return OutputSpec.from_rail(RAIL)
+
+
+def rail_rejects(text):
+    """regex ใน rail (ที่ Guard ใช้) ไม่ผ่าน = มีคำต้องห้ามแบบ substring"""
+    with open(RAIL, "r", encoding="utf-8") as f:
+        pattern = re.search(r'pattern="([^"]+)"', f.read()).group(1)
+    return re.match(pattern, text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "ควรทานยาแก้ปวดค่ะ",
+    "แพทย์จะวินิจฉัยให้",
+    "รักษาด้วยยาปฏิชีวนะ",
+    "ยา พาราเซตามอล 500 มก.",
+    "ไปโรงพยาบาลแล้วควรทานยาตามแพทย์สั่ง",
+    "ห้ามบอก password",
+])
+def test_thai_sentences_with_forbidden_terms(spec, text):
+    assert rail_rejects(text)
+    assert spec.find_forbidden(text)
+
+
+@pytest.mark.parametrize("text", [
+    "ควรไปโรงพยาบาลเพื่อตรวจเพิ่มเติมค่ะ",
+    "พยาบาลจะช่วยวัดความดันให้",
+    "รักษาความสะอาดของแผลเสมอ",
+    "พักผ่อนให้เพียงพอ นอนหลับวันละ 8 ชั่วโมง แล้วกลับมาสังเกตอาการ",
+    "อาการนี้อาจหายยากและเป็นเวลายาวนาน",
+    "ดื่มน้ำมากๆ และพยายามพักผ่อน",
+])
+def test_allowlisted_words_are_not_forbidden(spec, text):
+    assert spec.find_forbidden(text) is None
+
+
+def test_allowlist_entries_contain_a_forbidden_term(spec):
+    for word in FORBIDDEN_ALLOWLIST:
+        assert spec.forbidden.search(word), word
+
+
+def test_redacts_only_lines_with_thai_forbidden_terms():
+    spec = OutputSpec.from_rail(RAIL)
+    spec.forbidden_on_fail = "fix"
+    raw = json.dumps({"answer": "ควรไปโรงพยาบาลค่ะ\nควรทานยาแก้ปวดค่ะ\nพักผ่อนให้เพียงพอ"}, ensure_ascii=False)
+    result = LocalValidator(spec).check(raw)
+    assert result.ok
+    assert result.forbidden_hits == ["answer"]
+    assert result.output["answer"] == "ควรไปโรงพยาบาลค่ะ\nพักผ่อนให้เพียงพอ"
+
+
+def test_noop_rail_records_hit_and_keeps_text(spec):
+    raw = json.dumps({"answer": "แพทย์จะวินิจฉัยให้"}, ensure_ascii=False)
+    result = LocalValidator(spec).check(raw)
+    assert result.forbidden_hits == ["answer"]
+    assert result.output["answer"] == "แพทย์จะวินิจฉัยให้"
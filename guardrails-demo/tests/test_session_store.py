@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from session_store import MemorySessionStore, SQLiteSessionStore  # noqa: E402
+from symptom_session import STATE_KEY  # noqa: E402
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemorySessionStore() if request.param == "memory" else SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    yield store
+    store.close()
+
+
+def symptoms_state(symptoms, added, retracted=()):
+    return {"symptoms": symptoms, "counts": [len(symptoms)], "version": "v1", "added": added,
+            "retracted": list(retracted)}
+
+
+def test_concurrent_turns_keep_both_updates(store):
+    store.save_state("s", {"greeted": False, STATE_KEY: symptoms_state(["ไข้", "ไอ"], ["ไข้", "ไอ"])})
+    first, second = store.load_state("s"), store.load_state("s")
+
+    first["greeted"] = True
+    first["ai1_res"] = {"consistency": "yes"}
+    first[STATE_KEY] = symptoms_state(["ไข้", "ไอ", "ปวดหัว"], ["ปวดหัว"])
+    second["skin_analysis_result"] = {"predicted_class": "Normal"}
+    second[STATE_KEY] = symptoms_state(["ไข้"], [], ["ไอ"])
+    store.save_state("s", first)
+    store.save_state("s", second)
+
+    state = store.load_state("s")
+    assert state["greeted"] is True
+    assert state["ai1_res"] == {"consistency": "yes"}
+    assert state["skin_analysis_result"] == {"predicted_class": "Normal"}
+    assert state[STATE_KEY]["symptoms"] == ["ไข้", "ปวดหัว"]
+    assert dict(second) == dict(state)
+
+
+def test_removed_field_is_deleted(store):
+    store.save_state("s", {"greeted": True, "timings": {"total": 1.0}})
+    state = store.load_state("s")
+    state.pop("timings")
+    store.save_state("s", state)
+    assert "timings" not in store.load_state("s")
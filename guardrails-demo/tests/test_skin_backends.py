@@ -0,0 +1,127 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import skin_inference_service  # noqa: E402
+from skin_inference_service import TFLiteSkinModel, load_skin_model_backend  # noqa: E402
+
+KERAS = object()
+
+
+@pytest.fixture
+def keras_loader(monkeypatch):
+    """แทน load_keras_model ด้วยตัวที่คืน KERAS (ไม่ต้องมีไฟล์ .h5 / Keras)"""
+    calls = []
+
+    def load_keras_model(model_path=skin_inference_service.MODEL_PATH):
+        calls.append(model_path)
+        return KERAS
+
+    monkeypatch.setattr(skin_inference_service, "load_keras_model", load_keras_model)
+    monkeypatch.delenv("SKIN_MODEL_BACKEND", raising=False)
+    return calls
+
+
+def test_unknown_backend_raises(keras_loader):
+    with pytest.raises(ValueError):
+        load_skin_model_backend("onnx")
+    assert not keras_loader
+
+
+def test_unknown_backend_from_env_raises(keras_loader, monkeypatch):
+    monkeypatch.setenv("SKIN_MODEL_BACKEND", "gpu")
+    with pytest.raises(ValueError):
+        load_skin_model_backend()
+
+
+def test_keras_backend(keras_loader, monkeypatch):
+    monkeypatch.setenv("SKIN_MODEL_BACKEND", "keras")
+    assert load_skin_model_backend() is KERAS
+
+
+def test_auto_without_tflite_file_uses_keras(keras_loader, monkeypatch, tmp_path):
+    monkeypatch.setattr(skin_inference_service, "TFLITE_MODEL_PATH", str(tmp_path / "missing.tflite"))
+    assert load_skin_model_backend("auto") is KERAS
+    assert len(keras_loader) == 1
+
+
+def test_auto_with_broken_tflite_falls_back_to_keras(keras_loader, monkeypatch, tmp_path):
+    # ไม่มี interpreter (ImportError) หรือไฟล์เสีย (ValueError) ก็ต้องถอยไปใช้ Keras เหมือนกัน
+    broken = tmp_path / "broken.tflite"
+    broken.write_bytes(b"not a flatbuffer")
+    monkeypatch.setattr(skin_inference_service, "TFLITE_MODEL_PATH", str(broken))
+    assert load_skin_model_backend("auto") is KERAS
+
+
+def test_forced_tflite_does_not_fall_back(keras_loader, monkeypatch, tmp_path):
+    broken = tmp_path / "broken.tflite"
+    broken.write_bytes(b"not a flatbuffer")
+    monkeypatch.setattr(skin_inference_service, "TFLITE_MODEL_PATH", str(broken))
+    with pytest.raises(Exception):
+        load_skin_model_backend("tflite")
+    assert not keras_loader
+
+
+def quantized_model(dtype, scale, zero_point):
+    """TFLiteSkinModel ที่มีแค่รายละเอียด tensor (ไม่สร้าง interpreter)"""
+    model = TFLiteSkinModel.__new__(TFLiteSkinModel)
+    model._input = {"dtype": dtype, "quantization": (scale, zero_point)}
+    model._output = {"dtype": dtype, "quantization": (scale, zero_point)}
+    return model
+
+
+@pytest.mark.parametrize("dtype, scale, zero_point", [
+    (np.uint8, 1 / 255, 0),
+    (np.int8, 1 / 255, -128),
+    (np.int8, 2 / 255, 0),
+])
+def test_quantize_round_trip(dtype, scale, zero_point):
+    model = quantized_model(dtype, scale, zero_point)
+    inputs = np.random.default_rng(0).random((4, 8, 8, 3), dtype=np.float32)
+    if zero_point == 0 and np.issubdtype(dtype, np.signedinteger):
+        inputs = inputs * 2 - 1
+    quantized = model._quantize(inputs)
+    assert quantized.dtype == dtype
+    restored = model._dequantize(quantized)
+    assert restored.dtype == np.float32
+    assert np.abs(restored - inputs).max() <= scale / 2 + 1e-6
+
+
+def test_quantize_clips_out_of_range():
+    model = quantized_model(np.int8, 1 / 255, -128)
+    quantized = model._quantize(np.array([-1.0, 0.0, 1.0, 2.0], dtype=np.float32))
+    assert quantized.tolist() == [-128, -128, 127, 127]
+
+
+def test_float_model_passes_through():
+    model = quantized_model(np.float32, 0.0, 0)
+    inputs = np.linspace(0, 1, 12, dtype=np.float32)
+    assert model._quantize(inputs) is inputs
+    assert model._dequantize(inputs) is inputs
+
+
+def test_tflite_matches_keras(tmp_path):
+    tf = pytest.importorskip("tensorflow")
+    from skin_inference_service import IMAGE_SIZE, decode_skin_prediction, load_keras_model
+    from skin_model_export import export_tflite
+
+    tf.keras.utils.set_random_seed(0)
+    keras_model = tf.keras.Sequential([
+        tf.keras.Input((*IMAGE_SIZE[::-1], 3)),
+        tf.keras.layers.Conv2D(4, 3, strides=4, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(2, activation="softmax"),
+    ])
+    h5_path = str(tmp_path / "model.h5")
+    keras_model.save(h5_path)
+    tflite_path = export_tflite(h5_path, str(tmp_path / "model.tflite"))
+
+    inputs = np.random.default_rng(0).random((5, *IMAGE_SIZE[::-1], 3), dtype=np.float32)
+    expected = np.asarray(load_keras_model(h5_path).predict_on_batch(inputs))
+    actual = TFLiteSkinModel(tflite_path).predict_on_batch(inputs)
+    assert [decode_skin_prediction(p)[0] for p in actual] == [decode_skin_prediction(p)[0] for p in expected]
+    np.testing.assert_allclose(actual, expected, atol=1e-4)
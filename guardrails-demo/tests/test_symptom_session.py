@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from predict import SymptomScorer  # noqa: E402
+from symptom_session import is_negated, session_symptoms, split_negated, update_session_symptoms  # noqa: E402
+
+
+def negated(text, symptom):
+    start = text.rindex(symptom)
+    return is_negated(text, start, start + len(symptom))
+
+
+@pytest.mark.parametrize("text, symptom", [
+    ("ไม่มีไข้", "ไข้"),
+    ("ไม่มี ไข้", "ไข้"),
+    ("ไม่มีอาการไข้", "ไข้"),
+    ("ไม่มี อาการ ไข้", "ไข้"),
+    ("ยังไม่มี ไข้", "ไข้"),
+    ("หายไอแล้ว", "ไอ"),
+    ("ไอหายแล้ว", "ไอ"),
+    ("ไข้ ไม่มีไอ", "ไอ"),
+])
+def test_negated(text, symptom):
+    assert negated(text, symptom)
+
+
+@pytest.mark.parametrize("text, symptom", [
+    ("ไข้ยังไม่หาย ปวดหัว", "ปวดหัว"),
+    ("เป็นไข้มา3วันไม่หาย ไอด้วย", "ไอ"),
+    ("ไข้ยังไม่หาย ปวดหัว", "ไข้"),
+    ("ไข้หาย ปวดหัว", "ปวดหัว"),
+    ("ยังไม่หายไอ", "ไอ"),
+    ("ยังไม่หายจากไข้", "ไข้"),
+    ("ไม่มีไข้ แต่ไอ", "ไอ"),
+    ("ไม่มีไข้ ไอ", "ไอ"),
+])
+def test_not_negated(text, symptom):
+    assert not negated(text, symptom)
+
+
+def mentions(text, symptoms):
+    found = []
+    for symptom in symptoms:
+        start = text.find(symptom)
+        if start >= 0:
+            found.append((symptom, start, start + len(symptom)))
+    return sorted(found, key=lambda m: m[1])
+
+
+def test_not_recovered_keeps_symptoms_across_turns():
+    symptoms = ["ไข้", "ปวดหัว", "ไอ"]
+    matrix = np.asfortranarray(np.array([[1, 1, 0], [1, 0, 1], [0, 1, 1]], dtype=np.uint8))
+    scorer = SymptomScorer(matrix, np.array([0, 1, 2], dtype=np.intp), ["A", "B", "C"], symptoms)
+    state = {}
+    for text in ("เป็นไข้มา3วันไม่หาย", "ไข้ยังไม่หาย ปวดหัว", "ไม่มีไอ"):
+        present, negated_ = split_negated(text, mentions(text, symptoms))
+        update_session_symptoms(state, scorer, "v1", present, negated_)
+    assert session_symptoms(state) == ["ไข้", "ปวดหัว"]
+
+    present, negated_ = split_negated("ไข้หายแล้ว", mentions("ไข้หายแล้ว", symptoms))
+    accumulator = update_session_symptoms(state, scorer, "v1", present, negated_)
+    assert session_symptoms(state) == ["ปวดหัว"]
+    assert accumulator.counts.tolist() == [1, 0, 1]
+
+
+def test_with_symptoms_does_not_touch_session_state():
+    symptoms = ["ไข้", "ปวดหัว", "ไอ"]
+    matrix = np.asfortranarray(np.array([[1, 1, 0], [1, 0, 1], [0, 1, 1]], dtype=np.uint8))
+    scorer = SymptomScorer(matrix, np.array([0, 1, 2], dtype=np.intp), ["A", "B", "C"], symptoms)
+    state = {}
+    accumulator = update_session_symptoms(state, scorer, "v1", ["ไข้"])
+    turn = accumulator.with_symptoms(["ไอ"])
+    assert turn.symptoms == ["ไข้", "ไอ"]
+    assert turn.counts.tolist() == [1, 2, 1]
+    assert accumulator.counts.tolist() == [1, 1, 0]
+    assert session_symptoms(state) == ["ไข้"]